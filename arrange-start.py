@@ -191,8 +191,7 @@ def slot_to_time(slot0_str, slot):
 # Load config
 # ------------------------------------------------------------
 def load_config(session):
-    cfg_rows = session.query(Config).all()
-    return {row.key: row.value for row in cfg_rows}
+    return Config.get_all(session)
 
 
 # ------------------------------------------------------------
@@ -1,16 +1,40 @@
 #!/usr/bin/env python3
 
-from o_event.card_processor import PunchReadout, CardProcessor
-from o_event.printer import PrinterMux
+from o_event.batcher import ReadoutBatcher
 from o_event.db import SessionLocal
+from o_event.metrics import instrument
+from o_event.profiler import SlowReadoutProfiler
+from o_event.replication import replication_router
 
+import asyncio
+import os
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 import traceback
-from pydantic import ValidationError
 
 
-app = FastAPI(title="Card Listener")
+# O_EVENT_JOURNAL lets load-test.py keep its readouts out of the race journal
+JOURNAL_PATH = os.environ.get("O_EVENT_JOURNAL", "readouts-{day}.journal")
+BATCH_INTERVAL = 0.05  # seconds a batch of readouts is collected before commit
+
+profiler = SlowReadoutProfiler.from_env()
+# A different readout for a run that has a card is a DUP for the
+# secretary; the digest tie-break is only for replicated cards
+batcher = ReadoutBatcher(SessionLocal, JOURNAL_PATH, interval=BATCH_INTERVAL, profiler=profiler,
+                         lowest_digest_wins=False)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    batcher.start()
+    yield
+    batcher.stop()
+
+
+app = instrument(FastAPI(title="Card Listener", lifespan=lifespan))
+# Central node for the other finish laptops, see replicate.py
+app.include_router(replication_router(batcher))
 
 
 @app.post("/card")
@@ -18,26 +42,18 @@ async def receive_card(request: Request):
     raw = await request.body()
     print(raw)
 
-    db = SessionLocal()
     try:
-        data = PunchReadout.model_validate_json(raw)
-        with PrinterMux() as printer:
-            result = CardProcessor().handle_readout(db, data, printer)
-            print('\n'.join(printer.get_output()))
-            print(result)
-            return result
-
-        return {"status": "ok", "parsed": data}
-    except ValidationError as e:
-        print("VALIDATION ERROR:", e)
-        return {"error": "validation failed", "details": e.errors()}
+        result, output = await asyncio.wrap_future(batcher.submit(raw))
     except Exception as ex:
-        db.rollback()
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(ex))
 
-    finally:
-        db.close()
+    if "error" in result:
+        print("VALIDATION ERROR:", result["details"])
+    else:
+        print('\n'.join(output))
+        print(result)
+    return result
 
 
 if __name__ == "__main__":
@@ -7,9 +7,10 @@ import traceback
 
 from aop.ble_transport import BleTransport, SerialTransport
 from aop.shell_protocol import ShellProtocol
-from o_event.card_processor import PunchReadout, PunchItem, CardProcessor
-from o_event.printer import PrinterMux
+from o_event.batcher import ReadoutBatcher
+from o_event.card_processor import PunchReadout, PunchItem
 from o_event.db import SessionLocal
+from o_event.profiler import SlowReadoutProfiler
 
 
 USE_BLE = False
@@ -18,12 +19,17 @@ HCI_DEVICE = "hci1"
 STATION_NUMBER = 1
 AOP = f"AOP {STATION_NUMBER}"
 KEEPALIVE_INTERVAL = 60
+JOURNAL_PATH = "readouts-aop-{day}.journal"
 
 CLEAR_STATION = 0
 CHECK_STATION = 1
 START_STATION = 10
 FINISH_STATION = 255
 
+profiler = SlowReadoutProfiler.from_env()
+# A different readout for a run that has a card is a DUP, as in card_service
+batcher = ReadoutBatcher(SessionLocal, JOURNAL_PATH, profiler=profiler, lowest_digest_wins=False)
+
 
 @dataclass
 class RawPunch:
@@ -108,6 +114,7 @@ async def keep_alive(shell):
 
 
 async def main():
+    batcher.start()
     async with get_transport() as transport:
         shell = ShellProtocol(transport)
         keepalive_task = asyncio.create_task(keep_alive(shell))
@@ -116,27 +123,22 @@ async def main():
             print(await shell.execute("card-readout"))
 
             async for notification in shell.notifications():
-                db = SessionLocal()
                 try:
                     data = parse_punch_readout(notification.split(), STATION_NUMBER)
-                    with PrinterMux() as printer:
-                        result = CardProcessor().handle_readout(db, data, printer)
-                        print('\n'.join(printer.get_output()))
-                        print(result)
-                        return result
+                    raw = data.model_dump_json().encode("utf-8")
+                    result, output = await asyncio.wrap_future(batcher.submit(raw))
+                    print('\n'.join(output))
+                    print(result)
 
                 except Exception as e:
                     print("Exception:", e)
-                    db.rollback()
                     traceback.print_exc()
 
-                finally:
-                    db.close()
-
         finally:
             keepalive_task.cancel()
             with contextlib.suppress(asyncio.CancelledError):
                 await keepalive_task
+            batcher.stop()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,16 @@
 #!/usr/bin/env python3
 
 from dataclasses import dataclass
+from functools import cached_property
 from typing import Callable
 
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import WordCompleter
 from prompt_toolkit.formatted_text import HTML
-from tabulate import tabulate
 
-from o_event.db import SessionLocal
-from o_event.models import Config
-
-from app.cli.card_utils import CardUtils
-from app.cli.competitor_utils import CompetitorUtils
-from app.cli.registration import Registration
-from app.cli.summary import Summary
+# The database layer and the command helpers (which pull in rapidfuzz,
+# requests, yaml, pydantic and tabulate) are imported, and the session
+# opened, on first use to keep the time to the first prompt short.
 
 
 @dataclass(frozen=True)
@@ -26,25 +22,24 @@ class Command:
 
 
 class Cli:
-    def __init__(self):
-        self.db = SessionLocal()
-
-        self.session = PromptSession()
+    def __init__(self, **session_args):
+        self.session = PromptSession(**session_args)
+        # Shown in the prompt; loaded right after the first prompt is
+        # rendered, so that doesn't wait for the database
+        self.day = None
+        self.session.app.after_render += self.load_day
         self.running = True
 
-        self.competitors = CompetitorUtils(self.db)
-        self.cards = CardUtils(self.db)
-        self.registration = Registration(self.db)
-        self.summary_util = Summary(self.db)
-
         self.commands = [
             Command("help", "help", "List commands", self.help),
             Command("day", "day <day>", "Set current stage day", self.day),
             Command("ls", "ls <query>", "List competitors matching query", self.ls),
             Command("edit", "edit <competitor_id|query>", "Edit competitor", self.edit),
             Command("add", "add", "Add new competitor", self.add),
+            Command("bulk", "bulk <query>", "Edit all matching competitors at once", self.bulk),
             Command("assign", "assign", "Assign a card for the run", self.assign),
             Command("modify", "modify", "Modify a card", self.modify),
+            Command("course", "course [card number]", "Suggest the course a card was run on", self.course),
             Command("register", "register <query>", "Register competitors for start", self.register),
             Command("summary", "summary <max place>", "Print summary result", self.summary),
             Command("quit", "quit", "Quit the CLI", self.quit),
@@ -60,6 +55,35 @@ class Cli:
             ignore_case=True,
         )
 
+    #
+    # Lazily created session and helpers
+    #
+
+    @cached_property
+    def db(self):
+        from o_event.db import SessionLocal
+        return SessionLocal()
+
+    @cached_property
+    def competitors(self):
+        from app.cli.competitor_utils import CompetitorUtils
+        return CompetitorUtils(self.db)
+
+    @cached_property
+    def cards(self):
+        from app.cli.card_utils import CardUtils
+        return CardUtils(self.db)
+
+    @cached_property
+    def registration(self):
+        from app.cli.registration import Registration
+        return Registration(self.db, self.competitors)
+
+    @cached_property
+    def summary_util(self):
+        from app.cli.summary import Summary
+        return Summary(self.db)
+
     def resolve_command(self, prefix: str) -> str | None:
         matches = [name for name in self.handlers if name.startswith(prefix)]
 
@@ -72,9 +96,11 @@ class Cli:
         return None
 
     def current_day(self):
+        from o_event.models import Config
         return Config.get_current_day(self.db)
 
     def set_current_day(self, day: str):
+        from o_event.models import Config
         try:
             Config.set(self.db, Config.KEY_CURRENT_DAY, int(day))
         except (TypeError, ValueError):
@@ -91,13 +117,21 @@ class Cli:
             except EOFError:
                 break
 
-        self.db.close()
+        if "db" in self.__dict__:
+            self.db.close()
+
+    def load_day(self, app):
+        if "db" not in self.__dict__:
+            self.day = self.current_day()
+            app.invalidate()
+
+    def prompt_message(self):
+        return HTML(f"<ansiblue>E{'?' if self.day is None else self.day}> </ansiblue>")
 
     def prompt_once(self):
-        text = self.session.prompt(
-            HTML(f"<ansiblue>E{self.current_day()}> </ansiblue>"),
-            completer=self.completer,
-        )
+        if "db" in self.__dict__:
+            self.day = self.current_day()
+        text = self.session.prompt(self.prompt_message, completer=self.completer)
 
         if not text.strip():
             return
@@ -117,6 +151,7 @@ class Cli:
     #
 
     def help(self, args: list[str]):
+        from tabulate import tabulate
         print("Commands:")
         print(tabulate([[c.synopsis, c.description] for c in self.commands]))
 
@@ -145,12 +180,21 @@ class Cli:
         if competitor_id is not None:
             self.competitors.edit_competitor(competitor_id)
 
+    def bulk(self, args: list[str]):
+        self.competitors.bulk_edit(" ".join(args) or None)
+
     def assign(self, args: list[str]):
         self.cards.assign_card()
 
     def modify(self, args: list[str]):
         self.cards.modify_card()
 
+    def course(self, args: list[str]):
+        if args and args[0].isdigit():
+            self.cards.suggest_courses(int(args[0]))
+        else:
+            self.cards.suggest_courses()
+
     def register(self, args: list[str]):
         self.registration.register(" ".join(args) or None)
 
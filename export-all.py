@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+from o_event.db import DB_PATH, backup
+
+
+HERE = Path(__file__).resolve().parent
+
+
+def current_day(db_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from o_event.models import Config
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    with sessionmaker(bind=engine)() as db:
+        day = Config.get_current_day(db)
+    engine.dispose()
+    return day
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Take one snapshot of the database and run all the exports on it in parallel")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    Path("out").mkdir(exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "snapshot.db"
+        started = time.perf_counter()
+        with closing(sqlite3.connect(path)) as dst:
+            backup(dst, args.db)
+        print(f"Snapshot of {args.db} taken in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        day = current_day(path)
+        iof_path = Path("out") / f"e{day}-results.xml"
+        env = dict(os.environ, O_EVENT_DB=str(path))
+        with open(iof_path, "w", encoding="utf-8") as iof:
+            jobs = {
+                "export-results.py": subprocess.Popen([sys.executable, HERE / "export-results.py"], env=env),
+                "export-summary.py": subprocess.Popen([sys.executable, HERE / "export-summary.py"], env=env),
+                "IOF XML": subprocess.Popen([sys.executable, "-m", "o_event.iof_exporter", str(day)],
+                                            env=env, stdout=iof),
+            }
+            failed = [name for name, job in jobs.items() if job.wait() != 0]
+
+    if "IOF XML" not in failed:
+        print(f"Generated {iof_path}")
+    for name in failed:
+        print(f"✘ {name} failed")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
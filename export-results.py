@@ -8,7 +8,7 @@ from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 from o_event.models import Run, RunSplit, Competitor, Stage, Course, CourseControl, Status, Config
 from o_event.ranking import Ranking
-from o_event.db import SessionLocal
+from o_event.db import SessionLocal, snapshot
 
 
 # -------------------------------------------------------
@@ -157,12 +157,16 @@ def export_results_tex(db: Session, day: int, cfg):
 
 
 def load_config(db):
-    cfg_rows = db.query(Config).all()
-    return {row.key: row.value for row in cfg_rows}
+    return Config.get_all(db)
 
 
 def main():
-    with SessionLocal() as db:
+    parser = argparse.ArgumentParser(description="Export the current day's results")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Export from an in-memory snapshot instead of the live database")
+    args = parser.parse_args()
+
+    with snapshot() if args.snapshot else SessionLocal() as db:
         day = Config.get_current_day(db)
         if day is None:
             raise RuntimeError("Config.current_day is not set")
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
+import argparse
+
 from sqlalchemy.orm import Session
 from jinja2 import Template
 
-from o_event.models import Competitor
 from o_event.ranking import Ranking
-from o_event.db import SessionLocal
+from o_event.db import SessionLocal, snapshot
 
 
 # Format seconds → "h:mm:ss"
@@ -95,29 +96,10 @@ h2 {
 def generate_reports(session: Session, days_to_calculate: int):
     headers = ["Місце", "Ім’я", "Клуб", "К-ть Е", "Час всього", "Бали"]
 
-    # 1. Fetch all groups
-    groups = (
-        session.query(Competitor.group)
-        .distinct()
-        .order_by(Competitor.group)
-        .all()
-    )
-    groups = [g[0] for g in groups]
-
     # List of tuples: (group_name, rows)
     report_groups = []
 
-    for group in groups:
-        competitors = (
-            session.query(Competitor)
-            .filter(Competitor.group == group)
-            .all()
-        )
-        if not competitors:
-            continue
-
-        ranked = Ranking().rank_multiday(days_to_calculate, competitors)
-
+    for group, ranked in Ranking().rank_multiday_all(session, days_to_calculate).items():
         rows = []
         for idx, (place, result) in enumerate(ranked):
             c = result.competitor
@@ -149,5 +131,10 @@ def generate_reports(session: Session, days_to_calculate: int):
     print(f"✔ Created {fname}")
 
 
-with SessionLocal() as db:
+parser = argparse.ArgumentParser(description="Export the multi-day summary")
+parser.add_argument("--snapshot", action="store_true",
+                    help="Export from an in-memory snapshot instead of the live database")
+args = parser.parse_args()
+
+with snapshot() if args.snapshot else SessionLocal() as db:
     generate_reports(db, days_to_calculate=2)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from o_event.synthetic import SyntheticEvent
+
+
+parser = argparse.ArgumentParser(description="Generate a reproducible synthetic event for scale testing")
+parser.add_argument("out", nargs="?", default="synthetic")
+parser.add_argument("--runners", type=int, default=3000)
+parser.add_argument("--days", type=int, default=4)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--load", action="store_true",
+                    help="Also create race.db from the generated courses and entries")
+args = parser.parse_args()
+
+event = SyntheticEvent(runners=args.runners, days=args.days, seed=args.seed)
+files = event.write(args.out)
+
+for day in sorted(files.courses):
+    print(f"✔ Created {files.courses[day]}")
+print(f"✔ Created {files.entries}")
+for day in sorted(files.readouts):
+    print(f"✔ Created {files.readouts[day]}")
+
+if args.load:
+    from o_event.db import SessionLocal
+
+    with SessionLocal() as session:
+        event.load(session, files)
@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 
+import argparse
+
 from o_event.baz_importer import BazImporter
 from o_event.db import SessionLocal
 from pathlib import Path
 
+
+parser = argparse.ArgumentParser(description="Import competitors from a BAZ entries file")
+parser.add_argument("path", nargs="?", default="baz3982.xml")
+parser.add_argument("--merge", action="store_true",
+                    help="Merge into existing competitors instead of a fresh import")
+args = parser.parse_args()
+
 session = SessionLocal()
 
 
-BazImporter().import_competitors(session, Path('baz3982.xml'))
+BazImporter().import_competitors(session, Path(args.path), merge=args.merge)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+import argparse
+import atexit
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+
+# -------------------------------------------------------
+# Scratch database
+# -------------------------------------------------------
+
+def use_scratch(path, live=None):
+    """
+    Point the in-process service at a scratch database and a temporary
+    journal, so the load never lands on the race. The scratch database is
+    created as a snapshot of the live one if it doesn't exist. Must run
+    before anything imports o_event.db.
+    """
+    live = live or os.environ.get("O_EVENT_DB", "race.db")
+    path = Path(path)
+    if path.resolve() in {Path(live).resolve(), Path("race.db").resolve()}:
+        raise SystemExit(f"Refusing to load test {path}, it's the race database; pass a scratch copy with --db")
+
+    os.environ["O_EVENT_DB"] = str(path)
+    journals = tempfile.mkdtemp(prefix="load-test-")
+    atexit.register(shutil.rmtree, journals, True)
+    os.environ["O_EVENT_JOURNAL"] = str(Path(journals) / "readouts-{day}.journal")
+
+    if not path.exists():
+        import sqlite3
+        from contextlib import closing
+        from o_event.db import backup
+        with closing(sqlite3.connect(path)) as dest:
+            backup(dest, live)
+        print(f"Copied {live} to {path}")
+
+
+# -------------------------------------------------------
+# Payload sources
+# -------------------------------------------------------
+
+def load_payloads(path):
+    """
+    JSON readouts, one per line, as logged by card_service.py
+    (anything that isn't a JSON object line is skipped).
+    """
+    payloads = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("b'{") and line.endswith("}'"):
+                line = line[2:-1]   # print(raw) of the request body
+            if line.startswith("{") and line.endswith("}"):
+                payloads.append(line)
+    return payloads
+
+
+def synthetic_payloads(count, seed=0):
+    """
+    Readouts for registered competitors of the current day, running
+    their own course cleanly at random speed.
+    """
+    from o_event.db import SessionLocal
+    from o_event.models import Competitor, Config, Course, CourseControl, Run, Stage
+
+    rnd = random.Random(seed)
+
+    with SessionLocal() as db:
+        day = Config.get_current_day(db)
+        rows = (
+            db.query(Competitor.sid, CourseControl.control_code)
+            .join(Run, Run.competitor_id == Competitor.id)
+            .join(Stage, Stage.day == Run.day)
+            .join(Course, (Course.stage_id == Stage.id) & (Course.name == Competitor.group))
+            .join(CourseControl, CourseControl.course_id == Course.id)
+            .filter(Run.day == day)
+            .order_by(Competitor.sid, CourseControl.seq)
+            .all()
+        )
+
+    courses = {}
+    for sid, code in rows:
+        if code.isdigit():
+            courses.setdefault(sid, []).append(int(code))
+    if not courses:
+        raise RuntimeError("No competitors with courses for the current day")
+
+    sids = sorted(courses)
+    payloads = []
+    for _ in range(count):
+        sid = rnd.choice(sids)
+        start = rnd.randint(36000, 50000)
+        t = start
+        punches = []
+        for code in courses[sid]:
+            t += rnd.randint(20, 240)
+            punches.append({"cardNumber": sid, "code": code, "time": t})
+        finish = t + rnd.randint(5, 60)
+        payloads.append(json.dumps({
+            "stationNumber": 1,
+            "cardNumber": sid,
+            "startTime": start,
+            "finishTime": finish,
+            "checkTime": start,
+            "punches": punches,
+        }))
+    return payloads
+
+
+# -------------------------------------------------------
+# Senders
+# -------------------------------------------------------
+
+class InProcessSender:
+    """
+    Calls the card_service ASGI app directly, one event loop per request.
+    There's no lifespan, so the readout batcher is started here. Set up a
+    scratch database first, see use_scratch().
+    """
+
+    def __init__(self):
+        from card_service import app, batcher
+        self.app = app
+        batcher.start()
+        atexit.register(batcher.stop)
+
+    async def _call(self, body: bytes):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/card",
+            "raw_path": b"/card",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("127.0.0.1", 12345),
+        }
+        sent = False
+        status = None
+        chunks = []
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                await asyncio.sleep(3600)
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks).decode("utf-8", errors="replace")
+
+    def send(self, payload: str):
+        return asyncio.run(self._call(payload.encode("utf-8")))
+
+
+class HttpSender:
+    def __init__(self, url):
+        import requests
+        self.requests = requests
+        self.url = url
+        self.local = threading.local()
+
+    def send(self, payload: str):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        response = session.post(
+            self.url,
+            data=payload.encode("utf-8"),
+            headers={"Content-Type": "application/json; charset=utf-8"},
+            timeout=60,
+        )
+        return response.status_code, response.text
+
+
+# -------------------------------------------------------
+# Runner
+# -------------------------------------------------------
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile: the smallest value with at least p% of the
+    values at or below it.
+    """
+    if not sorted_values:
+        return None
+    idx = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def run_load(sender, payloads, concurrency=5, rate=None):
+    """
+    Send payloads with the given concurrency. With a rate (requests per
+    second) arrivals are scheduled open-loop and latency is measured from
+    the scheduled arrival, so queueing delay is included.
+    """
+    results = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def one(i, payload):
+        scheduled = started + i / rate if rate else None
+        if scheduled is not None:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        try:
+            status, body = sender.send(payload)
+        except Exception as ex:
+            status, body = None, str(ex)
+        t1 = time.perf_counter()
+
+        outcome = "ERROR"
+        if status == 200:
+            with contextlib.suppress(ValueError, AttributeError):
+                parsed = json.loads(body)
+                outcome = parsed.get("status") or ("INVALID" if "error" in parsed else "ERROR")
+        with lock:
+            results.append({
+                "latency": t1 - (scheduled if scheduled is not None else t0),
+                "service": t1 - t0,
+                "http_status": status,
+                "outcome": outcome,
+                "locked": "database is locked" in (body or ""),
+            })
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, payload in enumerate(payloads):
+            pool.submit(one, i, payload)
+
+    elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def make_report(results, elapsed, args):
+    latencies = sorted(r["latency"] * 1000 for r in results)
+    service = sorted(r["service"] * 1000 for r in results)
+
+    def stats(values):
+        return {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else None,
+            "mean": sum(values) / len(values) if values else None,
+        }
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "mode": "http" if args.url else "in-process",
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed > 0 else None,
+        "latency_ms": stats(latencies),
+        "service_ms": stats(service),
+        "errors": sum(1 for r in results if r["http_status"] != 200),
+        "lock_timeouts": sum(1 for r in results if r["locked"]),
+        "outcomes": dict(Counter(r["outcome"] for r in results)),
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"{report['requests']} requests in {report['elapsed_s']:.2f}s "
+          f"({report['throughput_rps']:.1f}/s), concurrency {report['concurrency']}")
+    for key in ("p50", "p95", "p99", "max"):
+        value = report["latency_ms"][key]
+        line = f"  {key:>4}: {value:9.1f} ms" if value is not None else f"  {key:>4}: -"
+        if baseline and value is not None and baseline["latency_ms"].get(key):
+            old = baseline["latency_ms"][key]
+            line += f"   (was {old:.1f} ms, {100 * (value - old) / old:+.0f}%)"
+        print(line)
+    print(f"  errors: {report['errors']}, lock timeouts: {report['lock_timeouts']}")
+    print(f"  outcomes: {report['outcomes']}")
+
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay card readouts against card_service")
+    parser.add_argument("--log", help="Log/JSONL file with readout payloads (default: synthetic)")
+    parser.add_argument("--count", type=int, default=200,
+                        help="Number of requests (payloads are cycled/generated as needed)")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Arrival rate, requests per second (default: as fast as possible)")
+    parser.add_argument("--url", default=None,
+                        help="Card service URL, e.g. http://localhost:12345/card (default: in-process)")
+    parser.add_argument("--db", default=None,
+                        help="Scratch database for the in-process service, copied from the race "
+                             "database if it doesn't exist (required without --url)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default="load-report.json")
+    parser.add_argument("--compare", default=None, help="Earlier report to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep the service's own output")
+    args = parser.parse_args()
+
+    if not args.url:
+        if not args.db:
+            parser.error("--db SCRATCH is required in-process, the readouts would be stored in the race database")
+        use_scratch(args.db)
+
+    if args.log:
+        source = load_payloads(args.log)
+        if not source:
+            raise SystemExit(f"No payloads in {args.log}")
+        payloads = [source[i % len(source)] for i in range(args.count)]
+    else:
+        payloads = synthetic_payloads(args.count, args.seed)
+
+    sender = HttpSender(args.url) if args.url else InProcessSender()
+
+    out = contextlib.nullcontext() if args.verbose or args.url else contextlib.redirect_stdout(io.StringIO())
+    with out:
+        results, elapsed = run_load(sender, payloads, args.concurrency, args.rate)
+
+    report = make_report(results, elapsed, args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✔ Created {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import argparse
+import cProfile
+import json
+import pstats
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.db import DB_PATH, backup
+from o_event.metrics import record_stages
+from o_event.querylog import log_queries
+
+
+class NullPrinter:
+    def __init__(self):
+        self.parts = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def text(self, t):
+        self.parts.append(t)
+
+
+def show_capture(path: Path, top: int):
+    summary = json.loads((path / "summary.json").read_text(encoding="utf-8"))
+    print(f"Card {summary['card_number']}: {summary['elapsed_ms']:.0f} ms "
+          f"(budget {summary['budget_ms']:.0f} ms), "
+          f"{summary['statements']} statements, {summary['sql_ms']:.0f} ms in SQL")
+    for stage, ms in summary["stages_ms"]:
+        print(f"  {stage:<14} {ms:8.1f} ms")
+    print()
+    pstats.Stats(str(path / "profile.pstats")).sort_stats("cumulative").print_stats(top)
+
+
+def replay(path: Path, db_path: str, top: int):
+    """
+    Run the captured readout again against a copy of the database.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    readout = PunchReadout.model_validate_json((path / "readout.json").read_bytes())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / "race.db"
+        with closing(sqlite3.connect(copy)) as dst:
+            backup(dst, db_path)
+
+        engine = create_engine(f"sqlite:///{copy}", future=True)
+        with sessionmaker(bind=engine, future=True)() as db:
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            with record_stages() as stages, log_queries(f"card {readout.cardNumber}") as queries:
+                profile.enable()
+                result = CardProcessor().handle_readout(db, readout, NullPrinter())
+                profile.disable()
+            elapsed = time.perf_counter() - started
+        engine.dispose()
+
+    print(f"Replayed card {readout.cardNumber}: {result} in {elapsed * 1000:.0f} ms")
+    for stage, seconds in stages:
+        print(f"  {stage:<14} {seconds * 1000:8.1f} ms")
+    print()
+    print(queries.report())
+    print()
+    pstats.Stats(profile).sort_stats("cumulative").print_stats(top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay a slow readout capture")
+    parser.add_argument("capture", help="Capture directory, e.g. profiles/20251115-112233.456789-1234")
+    parser.add_argument("--top", type=int, default=25, help="Number of functions to list")
+    parser.add_argument("--replay", action="store_true",
+                        help="Process the readout again on a copy of the database")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    path = Path(args.capture)
+    if args.replay:
+        replay(path, args.db, args.top)
+    else:
+        show_capture(path, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+from pathlib import Path
+
+from o_event.journal import Journal
+
+
+def read_payloads(path):
+    """
+    Readouts from a journal, or from a card_service log: lines that are
+    a JSON object, or print(raw) of one.
+    """
+    path = Path(path)
+    if path.suffix == ".journal":
+        return [payload for _, payload in Journal.read(path)]
+    payloads = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("b'{") and line.endswith("}'"):
+                line = line[2:-1]
+            if line.startswith("{") and line.endswith("}"):
+                payloads.append(line.encode("utf-8"))
+    return payloads
+
+
+def rebuild(payloads, day, reset):
+    from o_event.db import SessionLocal
+    from o_event.models import Config
+    from o_event.replay import JournalReplay
+
+    with SessionLocal() as db:
+        day = day or Config.get_current_day(db)
+        begin = time.perf_counter()
+        stats = JournalReplay(db, day).run(payloads, reset=reset)
+        db.commit()
+        elapsed = time.perf_counter() - begin
+
+    print(f"Day {day}: {stats.processed} readouts stored, {stats.skipped} duplicates, "
+          f"{stats.errors} errors in {elapsed:.2f}s ({len(payloads) / elapsed:.0f}/s)")
+    for status, count in stats.statuses.most_common():
+        print(f"  {status:10} {count}")
+
+
+def post(payloads, url, step):
+    import requests
+
+    def send(i):
+        print(f"----- Sending request #{i + 1} -----")
+        response = requests.post(url, data=payloads[i],
+                                 headers={"Content-Type": "application/json; charset=utf-8"})
+        print(response.text)
+        print("----------------------------------------")
+
+    index = 0
+    while index < len(payloads):
+        if step:
+            cmd = input("[Enter/n] next, p previous, q quit > ").strip()
+            if cmd == "q":
+                return
+            if cmd == "p":
+                if index:
+                    send(index - 1)
+                else:
+                    print("No previous request to resend.")
+                continue
+            if cmd not in ("", "n"):
+                print("Unknown command.")
+                continue
+        send(index)
+        index += 1
+    print("No more requests.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay card readouts from journals or service logs")
+    parser.add_argument("sources", nargs="*",
+                        help="*.journal files or card_service logs "
+                             "(default: the day's readouts-{day}.journal and readouts-aop-{day}.journal)")
+    parser.add_argument("--day", type=int, default=None, help="Race day (default: the current one)")
+    parser.add_argument("--reset", action="store_true",
+                        help="Clear the day's results and rebuild them from the readouts "
+                             "(default: only store the readouts missing in the database)")
+    parser.add_argument("--url", default=None,
+                        help="Post the readouts to a running card service, e.g. http://localhost:12345/card")
+    parser.add_argument("--step", action="store_true", help="With --url, ask before each request")
+    args = parser.parse_args()
+
+    sources = args.sources
+    if not sources:
+        if args.day is None:
+            from o_event.db import SessionLocal
+            from o_event.models import Config
+            with SessionLocal() as db:
+                args.day = Config.get_current_day(db)
+        sources = [
+            path.format(day=args.day)
+            for path in ("readouts-{day}.journal", "readouts-aop-{day}.journal")
+            if Path(path.format(day=args.day)).exists()
+        ]
+
+    payloads = [payload for source in sources for payload in read_payloads(source)]
+    print(f"{len(payloads)} readouts in {', '.join(map(str, sources)) or 'no sources'}")
+    if not payloads:
+        return
+
+    if args.url:
+        post(payloads, args.url, args.step)
+    else:
+        rebuild(payloads, args.day, args.reset)
+
+
+if __name__ == "__main__":
+    main()
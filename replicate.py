@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from o_event.db import SessionLocal
+from o_event.replication import ReplicationClient
+
+
+parser = argparse.ArgumentParser(description="Push this laptop's card readouts to the central card service")
+parser.add_argument("url", help="Central node, e.g. http://192.168.1.10:12345")
+parser.add_argument("--node", default=None, help="Name of this laptop (default: host name)")
+parser.add_argument("--batch", type=int, default=500, help="Cards per request")
+parser.add_argument("--interval", type=float, default=2.0, help="Seconds between pushes")
+parser.add_argument("--once", action="store_true", help="Push what's pending and exit")
+args = parser.parse_args()
+
+client = ReplicationClient(SessionLocal, args.url, node=args.node, batch_size=args.batch)
+if args.once:
+    print(f"{client.push()} cards pushed")
+else:
+    client.run(args.interval)
@@ -1,91 +1,105 @@
-from sqlalchemy import asc, or_
-import requests
-import subprocess
+from sqlalchemy import desc, or_, select
 
-from o_event.card_processor import CardProcessor
-from o_event.models import Run, Status, Config, Card
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.course_index import course_index
+from o_event.models import Competitor, Run, Status, Config, Card
 from o_event.printer import PrinterMux
 from app.cli.time_utils import TimeUtils
 from app.cli.editor import Editor
+from app.cli.picker import Picker
+from app.cli.run_matcher import RunMatcher
 
 
 class CardUtils:
     def __init__(self, db):
         self.db = db
-
-    def pick_card(self):
-        cards = (
-            self.db.query(Card)
-            .order_by(Card.readout_datetime.asc())
-            .all()
+        self.matcher = RunMatcher()
+
+    def card_lines(self):
+        rows = self.db.execute(
+            select(
+                Card.id,
+                Card.card_number,
+                Card.readout_datetime,
+                Card.start_time,
+                Card.finish_time,
+            )
+            .order_by(Card.readout_datetime.desc(), Card.id.desc()),
+            execution_options={"yield_per": 200},
         )
 
         time_utils = TimeUtils()
 
-        # Prepare the input for fzf
-        lines = []
-        for c in reversed(cards):
-            readout_time = c.readout_datetime.strftime('%H:%M:%S')
-            start = time_utils.format_time(c.start_time)
-            finish = time_utils.format_time(c.finish_time)
-            line = f"{c.id:3} | card={c.card_number:<4} | readout={readout_time:7} | start={start:6} | finish={finish:6}"
-            lines.append(line)
-
-        # Invoke fzf
-        try:
-            out = subprocess.check_output(
-                ["fzf", "--ansi"],
-                input="\n".join(lines),
-                text=True,
-            ).strip()
-        except subprocess.CalledProcessError:
-            return None  # user cancelled with ESC or Ctrl-C
-
-        chosen_id = int(out.split()[0])
-        return chosen_id
-
-    def pick_run(self):
-        current_day = Config.get_current_day(self.db)
+        for id_, card_number, readout_datetime, start_time, finish_time in rows:
+            readout_time = readout_datetime.strftime('%H:%M:%S')
+            start = time_utils.format_time(start_time)
+            finish = time_utils.format_time(finish_time)
+            yield f"{id_:3} | card={card_number:<4} | readout={readout_time:7} | start={start:6} | finish={finish:6}"
+
+    def pick_card(self):
+        return Picker().pick(self.card_lines())
 
-        runs = (
-            self.db.query(Run)
+    def run_lines(self, suggestions=()):
+        """
+        Runs of the current day, the suggested ones first with their match.
+        """
+        current_day = Config.get_current_day(self.db)
+        time_utils = TimeUtils()
+        suggested = {s.run_id: s for s in suggestions}
+
+        query = (
+            select(
+                Run.id,
+                Run.start_slot,
+                Run.status,
+                Run.result,
+                Competitor.group,
+                Competitor.sid,
+                Competitor.name,
+            )
+            .join(Competitor, Run.competitor_id == Competitor.id)
             .filter(Run.day == current_day)
-            .order_by(asc(or_(Run.result == None, Run.status != Status.OK)))    # noqa: E711
-            .all()
         )
 
-        time_utils = TimeUtils()
+        def line(id_, start_slot, status, result, group, sid, name, match=""):
+            start_slot = start_slot or ''
+            return f"{id_:3} | {match:4} | start={start_slot:5} | {group:4} | {sid:4} | {name:20} | {status:3} | {time_utils.format_time(result):5}"
+
+        if suggested:
+            found = {row.id: row for row in self.db.execute(query.filter(Run.id.in_(list(suggested))))}
+            for s in suggestions:
+                if s.run_id in found:
+                    yield line(*found[s.run_id], match=f"{s.score:.0%}")
+
+        rows = self.db.execute(
+            query.order_by(
+                desc(or_(Run.result == None, Run.status != Status.OK)),    # noqa: E711
+                Run.id.desc(),
+            ),
+            execution_options={"yield_per": 200},
+        )
+        for row in rows:
+            if row.id not in suggested:
+                yield line(*row)
+
+    def pick_run(self, suggestions=()):
+        return Picker().pick(self.run_lines(suggestions))
 
-        # Prepare the input for fzf
-        lines = []
-        for r in reversed(runs):
-            name = r.competitor.name
-            start_slot = r.start_slot or ''
-            line = f"{r.id:3} | start={start_slot:5} | {r.competitor.group:4} | {r.competitor.sid:4} | {name:20} | {r.status:3} | {time_utils.format_time(r.result):5}"
-            lines.append(line)
-
-        # Invoke fzf
-        try:
-            out = subprocess.check_output(
-                ["fzf", "--ansi"],
-                input="\n".join(lines),
-                text=True,
-            ).strip()
-        except subprocess.CalledProcessError:
-            return None  # user cancelled with ESC or Ctrl-C
-
-        chosen_id = int(out.split()[0])
-        return chosen_id
+    def suggest_runs(self, card: Card):
+        """
+        Open runs of the current day the card likely belongs to.
+        """
+        return self.matcher.match(self.db, card, Config.get_current_day(self.db))
 
     def assign_card(self):
         card_id = self.pick_card()
         if card_id is None:
             return
-        run_id = self.pick_run()
+        card = self.db.get(Card, card_id)
+        run_id = self.pick_run(self.suggest_runs(card))
         if run_id is None:
             return
 
-        card = self.db.get(Card, card_id)
         run = self.db.get(Run, run_id)
         with PrinterMux() as p:
             status = CardProcessor().handle_card(self.db, card, run, p)
@@ -104,6 +118,7 @@ class CardUtils:
         # TODO: a better way when the card service isn't running?
         edited, changed = Editor().edit_yaml(card.raw_json)
         if changed:
+            import requests
             url = "https://localhost:12345/card"
             response = requests.post(url, json=edited)
             if response.ok:
@@ -112,3 +127,38 @@ class CardUtils:
                 print("Error:", response.status_code, response.text)
         else:
             print("No changes made. Aborted.")
+
+    def suggest_courses(self, card_number=None):
+        if card_number is None:
+            card_id = self.pick_card()
+            card = None if card_id is None else self.db.get(Card, card_id)
+        else:
+            card = (
+                self.db.query(Card)
+                .filter(Card.card_number == card_number)
+                .order_by(Card.id.desc())
+                .first()
+            )
+        if card is None:
+            print("No such card")
+            return
+
+        run = self.db.get(Run, card.run_id) if card.run_id else None
+        day = run.day if run else Config.get_current_day(self.db)
+        readout = PunchReadout.model_validate(card.raw_json)
+        punches = [(p.code, p.time - readout.startTime) for p in readout.punches]
+        suggestions = course_index(self.db, day).suggest(punches, top=5)
+        if not suggestions:
+            print("No course shares controls with this card")
+            return
+
+        from tabulate import tabulate
+        print(tabulate(
+            [
+                [s.name, f"{s.score:.0%}", "OK" if s.ok else "MP",
+                 ", ".join(map(str, s.result.missing)), len(s.result.extra)]
+                for s in suggestions
+            ],
+            headers=["course", "match", "status", "missing", "extra"],
+        ))
+        return suggestions
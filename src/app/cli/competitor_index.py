@@ -0,0 +1,168 @@
+from rapidfuzz import fuzz, process
+from sqlalchemy import func, select
+from typing import Dict, List, Tuple
+
+from o_event.models import ChangeCounter, Competitor
+
+
+class CompetitorIndex:
+    """
+    In-memory search index over competitors for the CLI.
+
+    Every searchable field is kept pre-normalized (lowercased, plus a
+    Latin transliteration of the name) in parallel lists, so a lookup is
+    a handful of batched rapidfuzz calls instead of four partial_ratio
+    calls per competitor. Digits and club regs hit exact fast paths.
+    """
+
+    THRESHOLD = 75
+
+    TRANSLIT = str.maketrans({
+        "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e",
+        "є": "ie", "ж": "zh", "з": "z", "и": "y", "і": "i", "ї": "i", "й": "i",
+        "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+        "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch",
+        "ш": "sh", "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "'": "", "’": "",
+        "ы": "y", "э": "e", "ё": "e", "ъ": "",
+    })
+
+    FIELDS = ("name", "latin", "group", "notes", "reg")
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+        self.sids: Dict[int, List[int]] = {}
+        self.regs: Dict[str, List[int]] = {}
+        self.fields: Dict[str, List[str]] = {f: [] for f in self.FIELDS}
+        self.stamp = None
+
+    def normalize(self, s: str | None) -> str:
+        return (s or "").lower()
+
+    def transliterate(self, s: str) -> str:
+        return s.translate(self.TRANSLIT)
+
+    # ------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------
+    def _stamp(self, db):
+        count, max_id = db.execute(select(func.count(Competitor.id), func.max(Competitor.id))).one()
+        return count, max_id, ChangeCounter.get(db, ChangeCounter.COMPETITORS)
+
+    def _set(self, pos, id_, sid, reg, name, group, notes):
+        name = self.normalize(name)
+        values = {
+            "name": name,
+            "latin": self.transliterate(name),
+            "group": self.normalize(group),
+            "notes": self.normalize(notes),
+            "reg": self.normalize(reg),
+        }
+        for f in self.FIELDS:
+            if pos == len(self.ids):
+                self.fields[f].append(values[f])
+            else:
+                self.fields[f][pos] = values[f]
+
+        if pos == len(self.ids):
+            self.ids.append(id_)
+            self.positions[id_] = pos
+        if sid is not None:
+            self.sids.setdefault(sid, []).append(id_)
+        if values["reg"]:
+            self.regs.setdefault(values["reg"], []).append(id_)
+
+    def _select(self):
+        return select(
+            Competitor.id,
+            Competitor.sid,
+            Competitor.reg,
+            Competitor.name,
+            Competitor.group,
+            Competitor.notes,
+        ).order_by(Competitor.id)
+
+    def _replace(self, id_, sid, reg, name, group, notes):
+        for table in (self.sids, self.regs):
+            for key, ids in list(table.items()):
+                if id_ in ids:
+                    ids.remove(id_)
+                    if not ids:
+                        del table[key]
+
+        pos = self.positions.get(id_, len(self.ids))
+        self._set(pos, id_, sid, reg, name, group, notes)
+
+    def build(self, db):
+        self._reset()
+        for row in db.execute(self._select()):
+            self._set(len(self.ids), *row)
+        self.stamp = self._stamp(db)
+
+    def update(self, db, comp: Competitor):
+        """
+        Refresh a single competitor after it's been edited or added.
+        """
+        if self.stamp is None:
+            return self.build(db)
+
+        self._replace(comp.id, comp.sid, comp.reg, comp.name, comp.group, comp.notes)
+        self.stamp = self._stamp(db)
+
+    def refresh(self, db, ids):
+        """
+        Refresh the given competitors with one query.
+        """
+        if self.stamp is None:
+            return self.build(db)
+        if not ids:
+            return
+
+        for row in db.execute(self._select().where(Competitor.id.in_(list(ids)))):
+            self._replace(*row)
+        self.stamp = self._stamp(db)
+
+    def ensure(self, db):
+        """
+        (Re)build the index if competitors were changed elsewhere.
+        """
+        if self.stamp is None or self.stamp != self._stamp(db):
+            self.build(db)
+
+    # ------------------------------------------------------------
+    # Searching
+    # ------------------------------------------------------------
+    def search(self, query: str | None) -> List[Tuple[int, int]]:
+        """
+        Returns [(score, competitor id)] sorted by score ascending.
+        """
+        if not query:
+            return [(100, id_) for id_ in self.ids]
+
+        q = self.normalize(query).strip()
+
+        # Exact fast paths: card number or club reg
+        if q.isdigit() and int(q) in self.sids:
+            return [(100, id_) for id_ in self.sids[int(q)]]
+        if q in self.regs:
+            return [(100, id_) for id_ in self.regs[q]]
+
+        scores: Dict[int, float] = {}
+        for f in self.FIELDS:
+            matches = process.extract(
+                q,
+                self.fields[f],
+                scorer=fuzz.partial_ratio,
+                score_cutoff=self.THRESHOLD,
+                limit=None,
+            )
+            for _, score, pos in matches:
+                if score > scores.get(pos, 0):
+                    scores[pos] = score
+
+        results = [(scores[pos], self.ids[pos]) for pos in sorted(scores)]
+        results.sort(key=lambda x: x[0])
+        return results
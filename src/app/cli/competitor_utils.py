@@ -1,17 +1,24 @@
-from rapidfuzz import fuzz
+import copy
+from functools import cache
 from typing import Tuple, List
-import subprocess
 
-from o_event.models import Competitor, Run, Status
+from o_event.models import Card, ChangeCounter, Competitor, Run, RunSplit, Status
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import selectinload
+from app.cli.competitor_index import CompetitorIndex
 from app.cli.editor import Editor
+from app.cli.picker import Picker
 
 
 class CompetitorUtils:
     def __init__(self, db):
         self.db = db
+        self.index = CompetitorIndex()
 
-    def get_columns(self, model):
+    @staticmethod
+    @cache
+    def get_columns(model):
         return [c.key for c in inspect(model).mapper.column_attrs]
 
     def competitor_to_dict(self, c: Competitor):
@@ -68,78 +75,206 @@ class CompetitorUtils:
                     r.status = Status(st) if st in Status._value2member_map_ else None
 
         # Remove deleted runs
+        deleted = [r.id for r in comp.runs if r.id is not None and r.id not in seen_existing_ids]
+        kept = self.used_runs(deleted)
         for r in list(comp.runs):
-            if r.id is not None and r.id not in seen_existing_ids:
+            if r.id in deleted and r.id not in kept:
                 self.db.delete(r)
 
         self.db.flush()
+        ChangeCounter.bump(self.db, ChangeCounter.COMPETITORS)
         return comp
 
     def filter_competitors(self, query: str = None) -> List[Tuple[int, Competitor]]:
-        comps = self.db.query(Competitor).all()
-        results = []
+        if not query:
+            return [(100, c) for c in self.db.query(Competitor).order_by(Competitor.id)]
 
-        for c in comps:
-            name = c.name or ""
-            group = c.group or ""
-            notes = c.notes or ""
-            reg = c.reg or ""
-
-            # If no query, include everything
-            if not query:
-                results.append((100, c))  # 100 score to keep original order
-                continue
-
-            # Compute fuzzy score across multiple fields
-            score = max(
-                fuzz.partial_ratio(query.lower(), name.lower()),
-                fuzz.partial_ratio(query.lower(), group.lower()),
-                fuzz.partial_ratio(query.lower(), notes.lower()),
-                fuzz.partial_ratio(query.lower(), reg.lower()),
-            )
+        self.index.ensure(self.db)
+        hits = self.index.search(query)
+        comps = (
+            self.db.query(Competitor)
+            .filter(Competitor.id.in_([id_ for _, id_ in hits]))
+            .all()
+        )
+        by_id = {c.id: c for c in comps}
 
-            if score >= 75:  # threshold for matching
-                results.append((score, c))
-
-        results.sort(key=lambda x: x[0])
-        return results
+        return [(score, by_id[id_]) for score, id_ in hits if id_ in by_id]
 
     def ls_competitors(self, query: str = None):
-        for score, c in self.filter_competitors(query):
+        for c in self.competitor_rows(query):
             name = c.name or ""
             group = c.group or ""
             declared = c.declared_days or []
             notes = c.notes or ''
             print(f"{c.sid:3} | {c.reg or '':6} | {name:20} | {group:6} | {declared} | {notes}")
 
-    def pick_competitor(self, query: str = None) -> Competitor | None:
+    def competitor_rows(self, query: str = None, best_first: bool = False):
         """
-        Show competitors in fzf and return the chosen Competitor.
+        Projected competitor rows matching the query, in search order
+        (best match last) or reversed. Without a query all competitors
+        are streamed by id, without touching the search index.
         """
-        items = self.filter_competitors(query)
+        stmt = select(
+            Competitor.id,
+            Competitor.reg,
+            Competitor.sid,
+            Competitor.name,
+            Competitor.group,
+            Competitor.declared_days,
+            Competitor.notes,
+        )
+        if not query:
+            order = Competitor.id.desc() if best_first else Competitor.id
+            yield from self.db.execute(stmt.order_by(order), execution_options={"yield_per": 200})
+            return
+
+        self.index.ensure(self.db)
+        hits = self.index.search(query)
+        by_id = {row.id: row for row in self.db.execute(stmt.where(Competitor.id.in_([id_ for _, id_ in hits])))}
+        for _, id_ in reversed(hits) if best_first else hits:
+            if id_ in by_id:
+                yield by_id[id_]
 
-        # Prepare the input for fzf
-        lines = []
-        for score, c in reversed(items):
+    def competitor_lines(self, query: str = None):
+        for c in self.competitor_rows(query, best_first=True):
             name = c.name or ""
             group = c.group or ""
             declared = c.declared_days or []
             notes = c.notes or ''
-            line = f"{c.id:3} | {c.reg or '':6} | {c.sid:3} | {name:20} | {group:6} | {declared} | {notes}"
-            lines.append(line)
+            yield f"{c.id:3} | {c.reg or '':6} | {c.sid:3} | {name:20} | {group:6} | {declared} | {notes}"
+
+    def pick_competitor(self, query: str = None) -> int | None:
+        """
+        Show competitors in fzf and return the chosen competitor id.
+        """
+        return Picker().pick(self.competitor_lines(query))
+
+    def used_runs(self, run_ids) -> set:
+        """
+        Of the given runs, those that can't be removed: with a result,
+        splits or an assigned card. Reports them.
+        """
+        if not run_ids:
+            return set()
+        run_ids = list(run_ids)
+        used = set(self.db.execute(
+            select(Run.id).where(Run.id.in_(run_ids), Run.result.is_not(None))
+        ).scalars())
+        used |= set(self.db.execute(
+            select(RunSplit.run_id).where(RunSplit.run_id.in_(run_ids))
+        ).scalars())
+        used |= set(self.db.execute(
+            select(Card.run_id).where(Card.run_id.in_(run_ids))
+        ).scalars())
+        for run_id, day, sid, name in self.db.execute(
+            select(Run.id, Run.day, Competitor.sid, Competitor.name)
+            .join(Competitor, Competitor.id == Run.competitor_id)
+            .where(Run.id.in_(used))
+            .order_by(Competitor.sid, Run.day)
+        ):
+            print(f"{sid} {name}: E{day} already has a result or a card, kept")
+        return used
+
+    def run_values(self, rd: dict) -> dict:
+        values = {col: rd[col] for col in self.get_columns(Run) if col in rd and col != "id"}
+        if "status" in values:
+            st = values["status"]
+            values["status"] = Status(st) if st in Status._value2member_map_ else None
+        return values
+
+    def diff_competitors(self, original: list[dict], edited: list[dict]):
+        """
+        Compute the minimal changeset between two lists of competitor dicts.
+
+        Returns (competitor updates, run updates, new runs, deleted run ids,
+        new competitor dicts). Competitors missing from the edited list are
+        left alone.
+        """
+        originals = {d["id"]: d for d in original}
+        comp_columns = [col for col in self.get_columns(Competitor) if col != "id"]
+
+        comp_updates = []
+        run_updates = []
+        run_inserts = []
+        run_deletes = []
+        new_competitors = []
+
+        for d in edited:
+            orig = originals.get(d.get("id"))
+            if orig is None:
+                new_competitors.append(d)
+                continue
+
+            changes = {col: d[col] for col in comp_columns if col in d and d[col] != orig[col]}
+            if changes:
+                comp_updates.append(dict(changes, id=d["id"]))
+
+            orig_runs = {rd["id"]: rd for rd in orig["runs"]}
+            seen = set()
+            for rd in d.get("runs") or []:
+                orig_run = orig_runs.get(rd.get("id"))
+                if orig_run is None:
+                    run_inserts.append(dict(self.run_values(rd), competitor_id=d["id"]))
+                    continue
+                seen.add(rd["id"])
+                changed = {k: v for k, v in rd.items() if k != "id" and orig_run.get(k) != v}
+                if changed:
+                    run_updates.append(dict(self.run_values(changed), id=rd["id"]))
+
+            run_deletes.extend(id_ for id_ in orig_runs if id_ not in seen)
+
+        return comp_updates, run_updates, run_inserts, run_deletes, new_competitors
+
+    def bulk_edit(self, query: str = None):
+        """
+        Edit all competitors matching the query in one YAML document
+        and apply the changes in a single transaction.
+        """
+        self.index.ensure(self.db)
+        if query:
+            ids = [id_ for _, id_ in self.index.search(query)]
+
+        q = self.db.query(Competitor).options(selectinload(Competitor.runs))
+        if query:
+            q = q.filter(Competitor.id.in_(ids))
+        original = [self.competitor_to_dict(c) for c in q.order_by(Competitor.id)]
+        if not original:
+            print("No competitors found.")
+            return
+
+        edited, changed = Editor().edit_yaml(copy.deepcopy(original))
+        if not changed:
+            print("No changes made. Aborted.")
+            return
+
+        comp_updates, run_updates, run_inserts, run_deletes, new_competitors = \
+            self.diff_competitors(original, edited or [])
+        kept = self.used_runs(run_deletes)
+        run_deletes = [id_ for id_ in run_deletes if id_ not in kept]
 
-        # Invoke fzf
         try:
-            out = subprocess.check_output(
-                ["fzf", "--ansi"],
-                input="\n".join(lines),
-                text=True,
-            ).strip()
-        except subprocess.CalledProcessError:
-            return None  # user cancelled with ESC or Ctrl-C
+            if comp_updates:
+                self.db.execute(update(Competitor), comp_updates)
+                ChangeCounter.bump(self.db, ChangeCounter.COMPETITORS)
+            if run_updates:
+                self.db.execute(update(Run), run_updates)
+            if run_inserts:
+                self.db.execute(insert(Run), run_inserts)
+            if run_deletes:
+                self.db.execute(delete(Run).where(Run.id.in_(run_deletes)))
+            added = [self.update_competitor_from_dict(d).id for d in new_competitors]
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        affected = {u["id"] for u in comp_updates} | set(added)
+        self.index.refresh(self.db, affected)
 
-        chosen_id = int(out.split()[0])
-        return chosen_id
+        print(
+            f"Updated {len(comp_updates)} competitors, added {len(added)}; "
+            f"runs: {len(run_updates)} changed, {len(run_inserts)} added, {len(run_deletes)} removed."
+        )
 
     def edit_competitor(self, cid: int):
         comp = self.db.get(Competitor, cid)
@@ -149,8 +284,9 @@ class CompetitorUtils:
         comp_dict = self.competitor_to_dict(comp)
         edited, changed = Editor().edit_yaml(comp_dict)
         if changed:
-            self.update_competitor_from_dict(edited)
+            comp = self.update_competitor_from_dict(edited)
             self.db.commit()
+            self.index.update(self.db, comp)
             print(f"Competitor {cid} updated.")
         else:
             print("No changes made. Aborted.")
@@ -170,8 +306,9 @@ class CompetitorUtils:
         }
         edited, changed = Editor().edit_yaml(skeleton)
         if changed:
-            self.update_competitor_from_dict(edited)
+            comp = self.update_competitor_from_dict(edited)
             self.db.commit()
+            self.index.update(self.db, comp)
             print("Added new competitor.")
         else:
             print("No changes made. Aborted.")
@@ -0,0 +1,31 @@
+from typing import Iterable
+import contextlib
+import subprocess
+
+
+class Picker:
+    """
+    Feed lines into fzf as they are produced and return the id chosen,
+    i.e. the first whitespace-separated field of the selected line.
+    """
+
+    def pick(self, lines: Iterable[str]) -> int | None:
+        proc = subprocess.Popen(
+            ["fzf", "--ansi"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        # fzf may exit before all rows arrived, e.g. an early selection
+        with contextlib.suppress(BrokenPipeError):
+            for line in lines:
+                proc.stdin.write(line + "\n")
+                proc.stdin.flush()
+        with contextlib.suppress(BrokenPipeError):
+            proc.stdin.close()
+
+        out = proc.stdout.read().strip()
+        if proc.wait() != 0 or not out:
+            return None  # user cancelled with ESC or Ctrl-C
+
+        return int(out.split()[0])
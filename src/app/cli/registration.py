@@ -1,71 +1,105 @@
+from sqlalchemy import select, update
 from tabulate import tabulate
 
 from app.cli.competitor_utils import CompetitorUtils
 from app.cli.editor import Editor
-from o_event.models import Competitor
+from o_event.models import ChangeCounter, Competitor
 from o_event.printer import Printer
 
 
 class Registration:
-    def __init__(self, db):
+    def __init__(self, db, competitors: CompetitorUtils = None):
         self.db = db
+        self.competitors = competitors or CompetitorUtils(db)
+
+    def format_line(self, c: Competitor, money: int) -> str:
+        name = c.name or ""
+        group = c.group or ""
+        declared = c.declared_days or []
+        notes = c.notes or ''
+        representative = c.representative or ''
+        return f"{c.id:3} | {money:5} | {c.reg or '':6} | {c.sid:3} | {name:20} | {group:6} | {declared} | r={representative} | {notes}"
+
+    def parse_line(self, s: str) -> tuple[int, int]:
+        parts = [p.strip() for p in s.split("|")]
+        return int(parts[0]), int(parts[1])
+
+    def load(self, snapshot: dict, ids: list[int]):
+        """
+        Load competitors that aren't in the snapshot yet in one query.
+        """
+        missing = [id_ for id_ in ids if id_ not in snapshot]
+        if not missing:
+            return
+        for comp in self.db.scalars(select(Competitor).where(Competitor.id.in_(missing))):
+            snapshot[comp.id] = comp
+        for id_ in missing:
+            if id_ not in snapshot:
+                raise ValueError(f"Competitor id {id_} not found")
+
+    def print_slip(self, subset: list, total: int):
+        with Printer() as p, p.buffered():
+            for money, comp in subset:
+                p.bold_on()
+                p.text(f'{comp.sid:>3}')
+                p.bold_off()
+                p.text(f' {comp.group:<8}')
+                name = comp.name
+                p.text(f' {name:<21}')
+                p.text(f' {money:>5}')
+                p.text('\n')
+            p.text('\n')
+            summary = f"Всього: {total}"
+            p.bold_on()
+            p.text(f"{summary:>40}")
+            p.bold_off()
+            p.feed(3)
+            p.cut()
 
     def register(self, query: str = None):
-        subset = CompetitorUtils(self.db).filter_competitors(query)
-        updated_money = {}
+        # Snapshot of the competitors being edited, the money entered for
+        # them and their formatted lines; only edited lines get reformatted.
+        snapshot = {c.id: c for _, c in self.competitors.filter_competitors(query)}
+        order = list(snapshot)
+        money = {id_: c.money for id_, c in snapshot.items()}
+        lines = {id_: self.format_line(c, money[id_]) for id_, c in snapshot.items()}
+
         while True:
-            selection = []
-            for _, c in subset:
-                name = c.name or ""
-                group = c.group or ""
-                declared = c.declared_days or []
-                notes = c.notes or ''
-                representative = c.representative or ''
-                money = updated_money.get(c.id, c.money)
-                info = f"{c.id:3} | {money:5} | {c.reg or '':6} | {c.sid:3} | {name:20} | {group:6} | {declared} | r={representative} | {notes}"
-                selection.append(info)
+            selection = [lines[id_] for id_ in order]
             edited, changed = Editor().edit_yaml(selection)
+
+            parsed = [self.parse_line(s) for s in edited]
+            self.load(snapshot, [id_ for id_, _ in parsed])
+
+            order = []
             subset = []
-            for s in edited:
-                parts = [p.strip() for p in s.split("|")]
-                id_ = int(parts[0])
-                comp = self.db.get(Competitor, id_)
-                if comp is None:
-                    raise ValueError(f"Competitor id {id_} not found")
+            for id_, amount in parsed:
+                comp = snapshot[id_]
                 if comp.money_paid is not None:
                     print(f'{comp.sid} {comp.group} {comp.name} вже заплатив {comp.money_paid}!')
-                money = int(parts[1])
-                updated_money[id_] = money
-                subset.append((money, comp))
-            report = [[comp.sid, comp.group, comp.name, money] for money, comp in subset]
+                if id_ not in lines or money.get(id_) != amount:
+                    money[id_] = amount
+                    lines[id_] = self.format_line(comp, amount)
+                order.append(id_)
+                subset.append((amount, comp))
+
+            report = [[comp.sid, comp.group, comp.name, amount] for amount, comp in subset]
             print(tabulate(report))
-            total = sum(money for money, _ in subset)
+            total = sum(amount for amount, _ in subset)
             print(f"Всього: {total}")
             ans = input('Прийняти [Y/n/q]? ').strip().lower()
             if ans in ('q', 'quit'):
                 break
             if ans in ('', 'y', 'yes', 'т', 'так'):
                 try:
-                    with Printer() as p:
-                        for money, comp in subset:
-                            p.bold_on()
-                            p.text(f'{comp.sid:>3}')
-                            p.bold_off()
-                            p.text(f' {comp.group:<8}')
-                            name = comp.name
-                            p.text(f' {name:<21}')
-                            p.text(f' {money:>5}')
-                            p.text('\n')
-                        p.text('\n')
-                        summary = f"Всього: {total}"
-                        p.bold_on()
-                        p.text(f"{summary:>40}")
-                        p.bold_off()
-                        p.feed(3)
-                        p.cut()
+                    self.print_slip(subset, total)
                 except Exception as ex:
                     print(ex)
-                for money, comp in subset:
-                    comp.money_paid = money
+                if subset:
+                    self.db.execute(
+                        update(Competitor),
+                        [{"id": comp.id, "money_paid": amount} for amount, comp in subset],
+                    )
+                    ChangeCounter.bump(self.db, ChangeCounter.COMPETITORS)
                 self.db.commit()
                 break
@@ -0,0 +1,137 @@
+import statistics
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from o_event.card_processor import PunchReadout
+from o_event.course_index import course_index
+from o_event.models import Card, ChangeCounter, Competitor, Run
+
+
+class RunMatcher:
+    """
+    Guesses whose run an unknown card is, for assigning it by hand.
+
+    Only open runs are candidates: no result and no card yet. They're
+    indexed by course (the competitor's group) and by start window, the
+    expected start being the start slot in minutes past the first slot.
+    The first slot's time isn't stored, it's taken from the runs already
+    read out (median of card start minus slot). A card's candidates are
+    the open runs on the courses its punches match and the runs starting
+    within a window of the card's start; each is scored by how well the
+    course matches and how close the start is.
+    """
+
+    WINDOW = 300          # seconds
+    COURSE_WEIGHT = 0.6
+    TOP = 10
+
+    @dataclass
+    class Suggestion:
+        run_id: int
+        score: float
+        course: float        # course match, 0..1
+        start_delta: Optional[int]   # seconds off the expected start, None if unknown
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.day = None
+        self.zero: int = None                         # time of slot 0, seconds
+        self.starts: Dict[int, int] = {}              # run id -> expected start
+        self.by_course: Dict[str, List[int]] = {}     # group -> open run ids
+        self.by_window: Dict[int, List[int]] = {}     # start // WINDOW -> open run ids
+        self.courses: Dict[int, str] = {}             # run id -> group
+        self.stamp = None
+
+    # ------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------
+    def _stamp(self, db, day: int):
+        # Start slots are summed with their run ids so that swapping two
+        # runs' slots changes the stamp too; groups are competitor
+        # fields, covered by the competitors' change counter
+        runs = db.execute(
+            select(func.count(Run.id), func.max(Run.id), func.count(Run.result),
+                   func.sum(Run.start_slot), func.sum(Run.start_slot * Run.id))
+            .where(Run.day == day)
+        ).one()
+        cards = db.execute(select(func.count(Card.id), func.max(Card.id), func.count(Card.run_id))).one()
+        return tuple(runs) + tuple(cards) + (ChangeCounter.get(db, ChangeCounter.COMPETITORS),)
+
+    def _slot_zero(self, db, day: int):
+        offsets = [
+            start - 60 * slot
+            for start, slot in db.execute(
+                select(Card.start_time, Run.start_slot)
+                .join(Run, Run.id == Card.run_id)
+                .where(Run.day == day, Run.start_slot.is_not(None), Card.start_time != 0xeeee)
+            )
+        ]
+        return int(statistics.median(offsets)) if offsets else None
+
+    def build(self, db, day: int):
+        self._reset()
+        self.day = day
+        self.zero = self._slot_zero(db, day)
+        assigned = select(Card.run_id).where(Card.run_id.is_not(None))
+        rows = db.execute(
+            select(Run.id, Run.start_slot, Competitor.group)
+            .join(Competitor, Competitor.id == Run.competitor_id)
+            .where(Run.day == day, Run.result.is_(None), Run.id.not_in(assigned))
+        )
+        for run_id, slot, group in rows:
+            self.courses[run_id] = group
+            self.by_course.setdefault(group, []).append(run_id)
+            if slot is not None and self.zero is not None:
+                start = self.starts[run_id] = self.zero + 60 * slot
+                self.by_window.setdefault(start // self.WINDOW, []).append(run_id)
+        self.stamp = self._stamp(db, day)
+
+    def ensure(self, db, day: int):
+        """
+        (Re)build the index if runs or cards changed.
+        """
+        if self.stamp is None or self.day != day or self.stamp != self._stamp(db, day):
+            self.build(db, day)
+
+    # ------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------
+    def match(self, db, card: Card, day: int, top: int = TOP) -> List["RunMatcher.Suggestion"]:
+        """
+        Open runs of the day the card likely belongs to, best first.
+        """
+        self.ensure(db, day)
+        readout = PunchReadout.model_validate(card.raw_json)
+
+        start = readout.startTime if readout.startTime != 0xeeee else None
+
+        # Course match of every candidate course
+        punches = [(p.code, p.time - (start or 0)) for p in readout.punches]
+        course_scores: Dict[str, float] = {
+            s.name: 1.0 if s.ok else s.score
+            for s in course_index(db, day).suggest(punches)
+        }
+
+        candidates = set()
+        for group in course_scores:
+            candidates.update(self.by_course.get(group, ()))
+        if start is not None:
+            window = start // self.WINDOW
+            for w in (window - 1, window, window + 1):
+                candidates.update(self.by_window.get(w, ()))
+
+        suggestions = []
+        for run_id in candidates:
+            course = course_scores.get(self.courses[run_id], 0.0)
+            expected = self.starts.get(run_id)
+            delta = None if start is None or expected is None else start - expected
+            timing = 0.0 if delta is None else max(0.0, 1 - abs(delta) / self.WINDOW)
+            score = self.COURSE_WEIGHT * course + (1 - self.COURSE_WEIGHT) * timing
+            if score > 0:
+                suggestions.append(RunMatcher.Suggestion(run_id, score, course, delta))
+        suggestions.sort(key=lambda s: (-s.score, s.run_id))
+        return suggestions[:top]
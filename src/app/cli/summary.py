@@ -1,4 +1,4 @@
-from o_event.models import Config, Competitor
+from o_event.models import Config
 from o_event.ranking import Ranking
 from o_event.printer import Printer
 from app.cli.time_utils import TimeUtils
@@ -13,28 +13,10 @@ class Summary:
     def summary(self, max_place):
         day = Config.get_current_day(self.db)
 
-        groups = (
-            self.db.query(Competitor.group)
-            .distinct()
-            .order_by(Competitor.group)
-            .all()
-        )
-        groups = [g[0] for g in groups]
-
         # List of tuples: (group_name, rows)
         report_groups = []
 
-        for group in groups:
-            competitors = (
-                self.db.query(Competitor)
-                .filter(Competitor.group == group)
-                .all()
-            )
-            if not competitors:
-                continue
-
-            ranked = Ranking().rank_multiday(day, competitors)
-
+        for group, ranked in Ranking().rank_multiday_all(self.db, day).items():
             rows = []
             for place, result in ranked:
                 c = result.competitor
@@ -0,0 +1,430 @@
+import contextlib
+import contextvars
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+from pydantic import ValidationError
+from sqlalchemy.exc import OperationalError
+
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.journal import Journal
+from o_event.metrics import gauge, span
+from o_event.models import Card, Config, JournalCheckpoint, Run
+from o_event.printer import PrinterMux
+from o_event.replay import JournalReplay
+
+
+class NullPrinter:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ...
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def get_output(self):
+        return []
+
+
+class PendingQueueFull(RuntimeError):
+    pass
+
+
+class DatabaseUnavailable(RuntimeError):
+    pass
+
+
+def database_unavailable(e: BaseException) -> bool:
+    """
+    Whether an error means another connection holds the database, so the
+    same writes will succeed later.
+    """
+    message = str(e).lower()
+    return isinstance(e, OperationalError) and ("locked" in message or "busy" in message)
+
+
+class ReadoutBatcher:
+    """
+    Group commit for the card service.
+
+    One worker thread owns the session and processes readouts in arrival
+    order. Each batch is appended to the journal and fsynced, then every
+    payload is processed with CardProcessor(defer_commit=True), so the
+    receipt sees the earlier readouts of the batch. When the batch window
+    (`interval`) closes, all the batch's writes are committed in one
+    transaction, together with the journal checkpoint, and the callers
+    are answered: a readout is acknowledged once it's committed to the
+    database (offline, see below, once it's fsynced to the journal).
+    Each readout is processed in the context of its submit() call, so
+    the caller's span and query logs see its statements.
+
+    The journal covers a crash between the fsync and the commit: start()
+    replays the journal past the checkpoint, skipping the readouts that
+    made it to the database. `journal_path` may contain "{day}" to keep a
+    journal per race day.
+
+    Each readout is processed in a savepoint: one that fails, e.g. a
+    competitor without a run today, is rolled back alone and its caller
+    gets the exception. If the database is locked, the batch is rolled
+    back and the batcher goes offline: the worker only journals readouts
+    and answers them with the provisional status PENDING, until it
+    manages to store the backlog (tried every `retry_interval`), then
+    prints the receipts of the readouts answered PENDING. At most
+    `max_pending` readouts are held back, more are refused.
+
+    Other writes of the card service go through the worker too, see
+    submit_call(), so the database has a single writer. A different
+    readout for a run that has a card is a DUP, unless lowest_digest_wins
+    resolves it like replicated ones (see card_processor.takes_over); the
+    services keep DUPs.
+    """
+
+    @dataclass
+    class Item:
+        payload: bytes
+        future: Future = field(default_factory=Future)
+        offset: int = 0           # journal offset past this readout
+        result: dict = None
+        output: List[str] = field(default_factory=list)
+        # The submitter's contextvars, e.g. the request's query count
+        context: contextvars.Context = field(default_factory=contextvars.copy_context)
+        call: Callable = None     # run call(db) instead of storing a readout
+
+    STOP = object()
+    REPORT_INTERVAL = 30.0    # seconds between "still unavailable" messages
+
+    def __init__(self, session_factory, journal_path, interval: float = 0.05,
+                 max_batch: int = 200, printer_factory=PrinterMux, profiler=None,
+                 retry_interval: float = 1.0, max_pending: int = 10000,
+                 lowest_digest_wins: bool = False):
+        self.session_factory = session_factory
+        self.journal_pattern = str(journal_path)
+        self.journal_path = None
+        self.interval = interval
+        self.max_batch = max_batch
+        self.printer_factory = printer_factory
+        self.profiler = profiler
+        self.retry_interval = retry_interval
+        self.max_pending = max_pending
+        self.lowest_digest_wins = lowest_digest_wins
+        self.queue = queue.Queue()
+        self.thread = None
+        self.journal = None
+        self.db = None
+        # Offline mode: (journal offset, arrival time) of the readouts
+        # acknowledged but not stored yet
+        self.lock = threading.Lock()
+        self.offline = False
+        self.pending = deque()
+        self.unprinted = []       # (journal offset, payload) answered PENDING
+        self.retry_at = 0.0       # monotonic time of the next store attempt
+        self.reported_at = None   # when "still unavailable" was last printed
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    def start(self):
+        self.db = self.session_factory()
+        JournalCheckpoint.__table__.create(self.db.get_bind(), checkfirst=True)
+        self._open_journal()
+        try:
+            self.recover()
+        except Exception:
+            traceback.print_exc()
+            self.db.rollback()
+            with self.lock:
+                self.offline = True
+                self.pending.append((self.journal.size, time.time()))
+        gauge("o_event_pending_readouts", "Readouts acknowledged but not stored yet",
+              lambda: len(self.pending))
+        gauge("o_event_pending_age_seconds", "Age of the oldest readout not stored yet",
+              self.pending_age)
+        self.thread = threading.Thread(target=self._run, name="readout-batcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(self.STOP)
+            self.thread.join()
+            self.thread = None
+        if self.journal is not None:
+            self.journal.close()
+        if self.db is not None:
+            self.db.close()
+
+    def submit(self, payload: bytes) -> Future:
+        """
+        Queue a raw readout payload; the future resolves to
+        (result dict, printed lines) once it's committed.
+        """
+        item = ReadoutBatcher.Item(payload)
+        with self.lock:
+            if self.offline and len(self.pending) >= self.max_pending:
+                item.future.set_exception(PendingQueueFull(f"{len(self.pending)} readouts pending already"))
+                return item.future
+        # Offline the worker only journals it and answers PENDING
+        self.queue.put(item)
+        return item.future
+
+    def submit_call(self, call: Callable) -> Future:
+        """
+        Run call(db) on the worker as part of a batch; the future resolves
+        to (its result, []) once committed. Offline it fails with
+        DatabaseUnavailable, nothing is kept to retry.
+        """
+        item = ReadoutBatcher.Item(b"", call=call)
+        self.queue.put(item)
+        return item.future
+
+    def pending_age(self) -> float:
+        with self.lock:
+            return time.time() - self.pending[0][1] if self.pending else 0
+
+    def _open_journal(self):
+        """
+        Switch to the journal of the current day.
+        """
+        path = self.journal_pattern.format(day=Config.get_current_day(self.db))
+        if path != self.journal_path:
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = Journal(path)
+            self.journal_path = path
+
+    # ------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------
+    def checkpoint(self) -> int:
+        row = self.db.get(JournalCheckpoint, self.journal_path)
+        return row.offset if row else 0
+
+    def recover(self) -> int:
+        """
+        Store the journal entries that were acknowledged but not committed.
+        """
+        entries = list(Journal.read(self.journal_path, self.checkpoint()))
+        if not entries:
+            return 0
+        day = Config.get_current_day(self.db)
+        stats = JournalReplay(self.db, day, self.lowest_digest_wins).run(payload for _, payload in entries)
+        self._commit(entries[-1][0])
+        print(f"Recovered {stats.processed} readouts from {self.journal_path}, "
+              f"{stats.skipped} were stored already")
+        return stats.processed
+
+    def _drain(self) -> bool:
+        """
+        Try to store the pending readouts, returns whether it's back online.
+        """
+        try:
+            self.recover()
+            checkpoint = self.checkpoint()
+        except Exception as e:
+            self.db.rollback()
+            self.retry_at = time.monotonic() + self.retry_interval
+            if self.reported_at is None or time.monotonic() - self.reported_at >= self.REPORT_INTERVAL:
+                self.reported_at = time.monotonic()
+                print(f"Database still unavailable ({e.__class__.__name__}), "
+                      f"{len(self.pending)} readouts pending")
+            return False
+        with self.lock:
+            while self.pending and self.pending[0][0] <= checkpoint:
+                self.pending.popleft()
+            stored = [payload for offset, payload in self.unprinted if offset <= checkpoint]
+            self.unprinted = [(offset, payload) for offset, payload in self.unprinted if offset > checkpoint]
+            if not self.pending:
+                self.offline = False
+                self.reported_at = None
+                print("Database available again, pending readouts stored")
+            online = not self.offline
+        if stored:
+            self._print_receipts(stored)
+        return online
+
+    def _print_receipts(self, payloads: List[bytes]):
+        """
+        Print the receipts of readouts answered PENDING, now that they're
+        stored. The cards left without a run (unknown, DUP, ...) or whose
+        receipt fails are listed for the secretary instead.
+        """
+        missing = []
+        for payload in payloads:
+            readout = PunchReadout.model_validate_json(payload)
+            try:
+                card = (
+                    self.db.query(Card)
+                    .filter(Card.card_number == readout.cardNumber, Card.raw_json == readout.model_dump())
+                    .first()
+                )
+                if card is None or card.run_id is None:
+                    missing.append(readout.cardNumber)
+                    continue
+                with self.printer_factory() as printer:
+                    run = self.db.get(Run, card.run_id)
+                    CardProcessor(defer_commit=True).handle_card(self.db, card, run, printer)
+                    print('\n'.join(printer.get_output()))
+                self.db.commit()
+            except Exception:
+                traceback.print_exc()
+                self.db.rollback()
+                missing.append(readout.cardNumber)
+        if missing:
+            print(f"No receipt printed for cards stored while offline: {', '.join(map(str, missing))}")
+
+    # ------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                timeout = max(0.0, self.retry_at - time.monotonic()) if self.offline else None
+                first = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._drain()
+                continue
+            if first is self.STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is self.STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process_batch(batch)
+
+    def _process_batch(self, batch: List["ReadoutBatcher.Item"]):
+        # Readouts that came in offline go first
+        online = not self.offline or (time.monotonic() >= self.retry_at and self._drain())
+        if online:
+            try:
+                self._open_journal()
+            except Exception:
+                traceback.print_exc()
+                self.db.rollback()
+                online = False
+
+        for item in batch:
+            item.offset = self.journal.size if item.call else self.journal.append(item.payload)
+        with span("journal_sync"):
+            self.journal.sync()
+        if not online:
+            self._go_offline(batch, [])
+            return
+
+        processed = []
+        for i, item in enumerate(batch):
+            try:
+                self._begin()
+                with self.db.begin_nested():
+                    if item.call:
+                        item.result = item.context.run(item.call, self.db)
+                    else:
+                        item.result, item.output = item.context.run(
+                            self._process, item.payload, self.printer_factory, profile=True)
+            except Exception as e:
+                traceback.print_exc()
+                if database_unavailable(e):
+                    self._go_offline(batch[i:], processed)
+                    return
+                # Only this readout is rolled back
+                item.future.set_exception(e)
+                continue
+            processed.append(item)
+        try:
+            self._commit(batch[-1].offset)
+        except Exception as e:
+            traceback.print_exc()
+            if database_unavailable(e):
+                self._go_offline([], processed)
+                return
+            self.db.rollback()
+            for item in processed:
+                item.future.set_exception(e)
+            return
+
+        for item in processed:
+            item.future.set_result((item.result, item.output))
+
+    def _go_offline(self, queued: List["ReadoutBatcher.Item"], processed: List["ReadoutBatcher.Item"]):
+        """
+        Roll back the batch and keep it pending. The processed readouts
+        got their receipts and are answered with their results, they'll
+        be stored the same way; the queued ones are answered PENDING and
+        get their receipts once stored.
+        Calls fail, see submit_call().
+        """
+        self.db.rollback()
+        now = time.time()
+        calls = [item for item in processed + queued if item.call]
+        processed = [item for item in processed if not item.call]
+        queued = [item for item in queued if not item.call]
+        with self.lock:
+            if not self.offline:
+                print(f"Database unavailable, readouts are kept in {self.journal_path}")
+            self.offline = True
+            self.retry_at = time.monotonic() + self.retry_interval
+            for item in processed + queued:
+                self.pending.append((item.offset, now))
+        for item in calls:
+            item.future.set_exception(DatabaseUnavailable("Database unavailable, try again later"))
+        for item in processed:
+            item.future.set_result((item.result, item.output))
+        for item in queued:
+            try:
+                sid = PunchReadout.model_validate_json(item.payload).cardNumber
+            except ValidationError as e:
+                item.future.set_result(({"error": "validation failed", "details": e.errors()}, []))
+                continue
+            with self.lock:
+                self.unprinted.append((item.offset, item.payload))
+            item.future.set_result(({"status": "PENDING", "sid": sid}, []))
+
+    def _process(self, payload: bytes, printer_factory, profile: bool = False):
+        """
+        Process a readout without committing, returns (result, printed lines).
+        """
+        profiler = self.profiler if profile else None
+        with profiler.capture(payload) if profiler else contextlib.nullcontext() as capture:
+            try:
+                with span("validate"):
+                    data = PunchReadout.model_validate_json(payload)
+            except ValidationError as e:
+                return {"error": "validation failed", "details": e.errors()}, []
+            if capture is not None:
+                capture.card_number = data.cardNumber
+            with printer_factory() as printer:
+                processor = CardProcessor(defer_commit=True, lowest_digest_wins=self.lowest_digest_wins)
+                result = processor.handle_readout(self.db, data, printer)
+                return result, printer.get_output()
+
+    def _begin(self):
+        """
+        Open the batch's transaction. pysqlite only begins one before DML,
+        a SAVEPOINT outside of it is a transaction of its own, committed
+        by its RELEASE.
+        """
+        conn = self.db.connection()
+        if not conn.connection.driver_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN")
+
+    def _commit(self, offset: int):
+        with span("commit"):
+            self.db.merge(JournalCheckpoint(journal=self.journal_path, offset=offset))
+            self.db.commit()
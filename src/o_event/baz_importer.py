@@ -1,10 +1,11 @@
 import re
+import time
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
-from sqlalchemy import select
+from sqlalchemy import delete, func, insert, select, update
 
-from o_event.models import Competitor, Run, Status, Club, Course
+from o_event.models import Card, ChangeCounter, Competitor, Run, Status, Club, Course
 
 
 class BazImporter:
@@ -67,12 +68,10 @@ class BazImporter:
 
         return base + 5 * days
 
-    def import_competitors(self, db, xml_path: Path):
+    def parse_runners(self, xml_path: Path) -> list[dict]:
         tree = ET.parse(xml_path)
         root = tree.getroot()
 
-        groups = set(db.execute(select(Course.name)).scalars())
-
         runners = []
 
         for s in root.findall("Sportsman"):
@@ -109,44 +108,215 @@ class BazImporter:
             })
 
         runners.sort(key=lambda r: self.get_reg(r["club"]))
+        return runners
+
+    def new_competitor(self, comp_id: int, sid: int, reg: str, runner: dict) -> dict:
+        return {
+            "id": comp_id,
+            "reg": reg,
+            "group": runner["group"],
+            "sid": sid,
+            "name": runner["name"],
+            "representative": runner["representative"],
+            "notes": runner["notes"] or None,
+            "money": self.calc_payment(runner["group"], len(runner["days"]),),
+            "money_paid": None,
+            "declared_days": runner["days"],
+        }
+
+    def new_run(self, comp_id: int, day: int) -> dict:
+        return {
+            "competitor_id": comp_id,
+            "day": day,
+            "start_slot": None,
+            "start": None,
+            "finish": None,
+            "result": None,
+            "status": Status.DNS,
+        }
+
+    def import_competitors(self, db, xml_path: Path, merge: bool = False):
+        """
+        Import all entries at once: ids are assigned up front, so that
+        clubs, competitors and runs go in with one executemany each.
+
+        With merge=True the entries are merged into the existing ones
+        instead, see merge_competitors().
+        """
+        if merge:
+            return self.merge_competitors(db, xml_path)
+
+        started = time.perf_counter()
+
+        runners = self.parse_runners(xml_path)
+
+        groups = set(db.execute(select(Course.name)).scalars())
+        known_clubs = set(db.execute(select(Club.reg)).scalars())
+        next_id = (db.scalar(select(func.max(Competitor.id))) or 0) + 1
+
+        clubs = []
+        competitors = []
+        runs = []
 
         for sid, runner in enumerate(runners, start=1):
             reg = self.get_reg(runner["club"])
 
-            if runner["club"]:
-                exists = db.scalar(
-                    select(Club).where(Club.reg == reg)
-                )
-                if exists is None:
-                    db.add(Club(reg=reg, name=runner["club"]))
+            if runner["club"] and reg not in known_clubs:
+                known_clubs.add(reg)
+                clubs.append({"reg": reg, "name": runner["club"]})
 
             if runner["group"] not in groups:
                 print(f"{sid} {runner['name']}: невідома група {runner['group']}")
 
-            comp = Competitor(
-                reg=reg,
-                group=runner["group"],
-                sid=sid,
-                name=runner["name"],
-                representative=runner["representative"],
-                notes=runner["notes"] or None,
-                money=self.calc_payment(runner["group"], len(runner["days"]),),
-                declared_days=runner["days"],
+            competitors.append(self.new_competitor(next_id, sid, reg, runner))
+            runs.extend(self.new_run(next_id, day) for day in runner["days"])
+            next_id += 1
+
+        if clubs:
+            db.execute(insert(Club), clubs)
+        if competitors:
+            db.execute(insert(Competitor), competitors)
+            ChangeCounter.bump(db, ChangeCounter.COMPETITORS)
+        if runs:
+            db.execute(insert(Run), runs)
+
+        db.commit()
+
+        elapsed = time.perf_counter() - started
+        rate = len(competitors) / elapsed if elapsed > 0 else 0
+        print(f"Імпортовано {len(competitors)} учасників, {len(runs)} стартів за {elapsed:.2f} с ({rate:.0f} рядків/с)")
+
+    def merge_competitors(self, db, xml_path: Path):
+        """
+        Idempotently merge a fresh entries file into the database.
+
+        Competitors are matched by (name, club reg), falling back to the
+        name alone when it is unique. Matched competitors keep their id and
+        sid, only changed fields are updated, and runs are added or removed
+        to follow declared_days. Runs that already have a result, a card
+        or a start slot are never removed. New entries get sids after the
+        current maximum; competitors missing from the file are left alone.
+        """
+        started = time.perf_counter()
+
+        # Known clubs take part in reg allocation for the new ones
+        for reg, name in db.execute(select(Club.reg, Club.name)):
+            self.clubs[name] = reg
+            self.regs[reg] = name
+        known_clubs = set(self.regs)
+
+        runners = self.parse_runners(xml_path)
+
+        groups = set(db.execute(select(Course.name)).scalars())
+
+        existing = db.execute(
+            select(
+                Competitor.id,
+                Competitor.sid,
+                Competitor.name,
+                Competitor.reg,
+                Competitor.group,
+                Competitor.representative,
+                Competitor.notes,
+                Competitor.money,
+                Competitor.declared_days,
             )
+        ).all()
+
+        by_key = {(c.name, c.reg or ""): c for c in existing}
+        by_name = {}
+        for c in existing:
+            by_name.setdefault(c.name, []).append(c)
+
+        runs_by_comp = {}
+        for r in db.execute(select(Run.id, Run.competitor_id, Run.day, Run.result, Run.start_slot)):
+            runs_by_comp.setdefault(r.competitor_id, {})[r.day] = r
+        with_cards = set(db.execute(select(Card.run_id).where(Card.run_id.is_not(None))).scalars())
 
-            db.add(comp)
-            db.flush()
+        next_id = max((c.id for c in existing), default=0) + 1
+        next_sid = max((c.sid or 0 for c in existing), default=0) + 1
 
+        clubs = []
+        new_competitors = []
+        changed = []
+        new_runs = []
+        stale_runs = []
+        matched = set()
+
+        for runner in runners:
+            reg = self.get_reg(runner["club"])
+
+            if runner["club"] and reg not in known_clubs:
+                known_clubs.add(reg)
+                clubs.append({"reg": reg, "name": runner["club"]})
+
+            comp = by_key.get((runner["name"], reg))
+            if comp is None and len(by_name.get(runner["name"], [])) == 1:
+                comp = by_name[runner["name"]][0]
+            if comp is not None and comp.id in matched:
+                comp = None
+
+            if comp is None:
+                if runner["group"] not in groups:
+                    print(f"{next_sid} {runner['name']}: невідома група {runner['group']}")
+                new_competitors.append(self.new_competitor(next_id, next_sid, reg, runner))
+                new_runs.extend(self.new_run(next_id, day) for day in runner["days"])
+                next_id += 1
+                next_sid += 1
+                continue
+
+            matched.add(comp.id)
+
+            row = self.new_competitor(comp.id, comp.sid, reg, runner)
+            del row["money_paid"]
+            if comp.group == row["group"] and comp.declared_days == row["declared_days"]:
+                # Keep a manually adjusted fee unless the entry itself changed
+                row["money"] = comp.money
+            diff = {
+                k: v for k, v in row.items()
+                if k != "id" and getattr(comp, k) != v
+            }
+            if diff:
+                if "group" in diff and diff["group"] not in groups:
+                    print(f"{comp.sid} {runner['name']}: невідома група {diff['group']}")
+                changed.append(dict(diff, id=comp.id))
+
+            runs = runs_by_comp.get(comp.id, {})
             for day in runner["days"]:
-                db.add(
-                    Run(
-                        competitor_id=comp.id,
-                        day=day,
-                        start=None,
-                        finish=None,
-                        result=None,
-                        status=Status.DNS,
-                    )
-                )
+                if day not in runs:
+                    new_runs.append(self.new_run(comp.id, day))
+            for day, r in runs.items():
+                if day in runner["days"]:
+                    continue
+                if r.result is not None:
+                    print(f"{comp.sid} {comp.name}: E{day} вже має результат, залишено")
+                    continue
+                if r.id in with_cards:
+                    print(f"{comp.sid} {comp.name}: E{day} вже має зчитаний чип, залишено")
+                    continue
+                if r.start_slot is not None:
+                    print(f"{comp.sid} {comp.name}: E{day} вже має стартовий час, залишено")
+                    continue
+                stale_runs.append(r.id)
+
+        if clubs:
+            db.execute(insert(Club), clubs)
+        if new_competitors:
+            db.execute(insert(Competitor), new_competitors)
+        if changed:
+            db.execute(update(Competitor), changed)
+        if new_competitors or changed:
+            ChangeCounter.bump(db, ChangeCounter.COMPETITORS)
+        if stale_runs:
+            db.execute(delete(Run).where(Run.id.in_(stale_runs)))
+        if new_runs:
+            db.execute(insert(Run), new_runs)
 
         db.commit()
+
+        elapsed = time.perf_counter() - started
+        print(
+            f"Об'єднано {len(runners)} заявок за {elapsed:.2f} с: "
+            f"{len(new_competitors)} нових, {len(changed)} змінено, "
+            f"{len(new_runs)} стартів додано, {len(stale_runs)} стартів видалено"
+        )
@@ -1,6 +1,8 @@
 from o_event.receipt import Receipt
+from o_event.metrics import span
 from o_event.printer import Printer
 from o_event.analysis import Analysis
+from o_event.course_index import course_index
 from o_event.models import (
     Card,
     Competitor,
@@ -14,8 +16,11 @@ from o_event.models import (
 )
 
 from pydantic import BaseModel
+from sqlalchemy import insert
 from datetime import datetime
 from typing import Optional
+import hashlib
+import json
 
 
 class PunchItem(BaseModel):
@@ -46,6 +51,114 @@ def get_current_run(db, day, competitor):
     return run
 
 
+def split_rows(run_id: int, course_id: int, visited, run_time: int) -> list[dict]:
+    """
+    RunSplit rows of a run: one per visited control [(code, time)], time
+    None for a missing one, then the finish.
+    """
+    rows = []
+    prev_time = 0
+
+    for seq, (code, time) in enumerate(visited):
+        if time is not None and time >= 0:
+            # Normal punch
+            leg_time = time - prev_time
+            prev_time = time
+        else:
+            # Missing control
+            leg_time = None
+
+        rows.append(dict(
+            run_id=run_id,
+            course_id=course_id,
+            seq=seq,
+            control_code=code,
+            leg_time=leg_time,
+            cum_time=time,
+        ))
+
+    if visited:
+        last_time = visited[-1][1]
+        rows.append(dict(
+            run_id=run_id,
+            course_id=course_id,
+            seq=len(visited),
+            control_code='F',
+            leg_time=None if last_time is None else run_time - last_time,
+            cum_time=run_time,
+        ))
+    return rows
+
+
+def card_digest(raw_json: dict) -> str:
+    """
+    Identity of a readout: the same card read out twice, on any laptop,
+    gives the same digest.
+    """
+    return hashlib.sha256(json.dumps(raw_json, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def takes_over(readout: PunchReadout, digest: str, other_digests) -> bool:
+    """
+    Conflict rule with lowest_digest_wins: a complete readout takes the run
+    from the other cards on it if its digest is the lowest, so the outcome
+    doesn't depend on the order readouts arrive in (see replication).
+    """
+    return incomplete(readout) is None and digest < min(other_digests)
+
+
+def card_values(readout: PunchReadout, readout_datetime: datetime) -> dict:
+    """
+    Card columns of a readout, not assigned to a run yet.
+    """
+    return dict(
+        run_id=None,
+        card_number=readout.cardNumber,
+        readout_datetime=readout_datetime,
+        start_time=readout.startTime,
+        finish_time=readout.finishTime,
+        check_time=readout.checkTime,
+        raw_json=readout.model_dump(),
+    )
+
+
+def incomplete(readout: PunchReadout) -> Optional[str]:
+    """
+    NO_START or NO_FINISH for a readout without a start or finish punch.
+    """
+    if readout.startTime == 0xeeee:
+        return "NO_START"
+    if readout.finishTime == 0xeeee:
+        return "NO_FINISH"
+    return None
+
+
+def actual_punches(readout: PunchReadout) -> list[tuple]:
+    """
+    Punches as (code, seconds since the start).
+    """
+    return [(item.code, item.time - readout.startTime) for item in readout.punches]
+
+
+def required_codes(control_codes) -> list[int]:
+    """
+    Codes of a course's controls to check, without start and finish.
+    """
+    return [int(code) for code in control_codes if code.isdigit()]
+
+
+def run_values(readout: PunchReadout, result) -> dict:
+    """
+    Run columns of a complete readout checked against its course.
+    """
+    return dict(
+        start=readout.startTime,
+        finish=readout.finishTime,
+        result=readout.finishTime - readout.startTime,
+        status=Status.OK if result.all_visited and result.order_correct else Status.MP,
+    )
+
+
 def get_course_for_card(db, day, competitor):
     """
     Given a card number (competitor.sid) and day (1-based),
@@ -66,58 +179,86 @@ def get_course_for_card(db, day, competitor):
 
 
 class CardProcessor:
+    def __init__(self, defer_commit: bool = False, lowest_digest_wins: bool = False):
+        # With defer_commit changes are only flushed and the caller
+        # commits them, see ReadoutBatcher
+        self.defer_commit = defer_commit
+        # A different readout for a run that has a card is a DUP, unless
+        # it takes the run over, see takes_over()
+        self.lowest_digest_wins = lowest_digest_wins
+
+    def commit(self, db):
+        if self.defer_commit:
+            db.flush()
+        else:
+            db.commit()
+
     def handle_readout(self, db, readout: PunchReadout, printer: Printer):
-        # build storage object
-        card = Card(
-            run_id=None,
-            card_number=readout.cardNumber,
-            readout_datetime=datetime.now(),
-            start_time=readout.startTime,
-            finish_time=readout.finishTime,
-            check_time=readout.checkTime,
-            raw_json=readout.model_dump(),
-        )
-        db.add(card)
-        db.flush()  # create card.id for details
-
-        # competitor lookup
-        competitor = (
-            db.query(Competitor)
-            .filter(Competitor.sid == readout.cardNumber)
-            .first()
-        )
+        with span("store_card"):
+            # A re-read gives the same readout, it's stored once
+            card = (
+                db.query(Card)
+                .filter(Card.card_number == readout.cardNumber, Card.raw_json == readout.model_dump())
+                .first()
+            )
+            if card is None:
+                card = Card(**card_values(readout, datetime.now()))
+                db.add(card)
+                db.flush()  # create card.id for details
+
+        with span("lookup"):
+            # competitor lookup
+            competitor = (
+                db.query(Competitor)
+                .filter(Competitor.sid == readout.cardNumber)
+                .first()
+            )
+
+            if competitor is not None:
+                day = Config.get_current_day(db)
+                run = get_current_run(db, day, competitor)
+
+                # Check for duplicate for this competitor on this stage
+                existing = (
+                    db.query(Card)
+                    .filter(Card.run_id == run.id, Card.raw_json != card.raw_json)
+                    .all()
+                )
 
         # CASE 1: Unknown card → leave unassigned
         if competitor is None:
-            db.commit()
+            with span("commit"):
+                self.commit(db)
             return {"status": "UNK", "sid": card.card_number}
 
-        day = Config.get_current_day(db)
-        run = get_current_run(db, day, competitor)
-
-        # Check for duplicate for this competitor on this stage
-        existing = (
-            db.query(Card)
-            .filter(Card.run_id == run.id, Card.raw_json != card.raw_json)
-            .first()
-        )
-
         if existing:
-            # card.run_id = run.id
-            db.commit()
-            return {"status": "DUP", "sid": card.card_number}
+            if not (self.lowest_digest_wins
+                    and takes_over(readout, card_digest(card.raw_json),
+                                   [card_digest(other.raw_json) for other in existing])):
+                with span("commit"):
+                    self.commit(db)
+                return {"status": "DUP", "sid": card.card_number}
+            self.release(db, run, existing)
 
         return self.handle_card(db, card, run, printer, readout)
 
+    def release(self, db, run: Run, cards):
+        """
+        Take the run away from its cards, they become unassigned.
+        """
+        for card in cards:
+            card.run_id = None
+        run.start = run.finish = run.result = None
+        run.status = Status.DNS
+        db.query(RunSplit).filter(RunSplit.run_id == run.id).delete()
+
     def handle_card(self, db, card: Card, run: Run, printer: Printer, readout: PunchReadout = None):
         if readout is None:
             readout = PunchReadout.model_validate(card.raw_json)
-        if readout.startTime == 0xeeee:
-            print("No start time!")
-            return {"status": "NO_START", "sid": card.card_number}
-        if readout.finishTime == 0xeeee:
-            print("No finish time!")
-            return {"status": "NO_FINISH", "sid": card.card_number}
+        missing = incomplete(readout)
+        if missing:
+            print("No start time!" if missing == "NO_START" else "No finish time!")
+            return {"status": missing, "sid": card.card_number}
 
         competitor = run.competitor
         day = run.day
@@ -125,81 +266,70 @@ class CardProcessor:
         # Assign competitor & run
         card.run_id = run.id
 
-        actual_punches = []
-        for item in readout.punches:
-            actual_punches.append((item.code, item.time - readout.startTime))
+        punches = actual_punches(readout)
 
-        # calculate OK/MP
-        course = get_course_for_card(db, day, competitor)
-        if not course:
-            db.commit()
-            return {"status": "UNK_COURSE", "sid": card.card_number}
-
-        # fetch required controls
-        controls = (
-            db.query(CourseControl)
-            .filter(CourseControl.course_id == course.id)
-            .order_by(CourseControl.seq)
-            .all()
-        )
-        required_codes = [int(c.control_code) for c in controls if c.control_code.isdigit()]
-
-        result = Analysis().analyse_order(required_codes, actual_punches)
-
-        run.start = card.start_time
-        run.finish = card.finish_time
-        run.result = card.finish_time - card.start_time
-        if result.all_visited and result.order_correct:
-            run.status = Status.OK
-            card.status = Status.OK
-        else:
-            run.status = Status.MP
-            card.status = Status.MP
-
-        self.store_run_splits(db, run, card, course, result)
-
-        db.commit()
-
-        printer.logo()
-        Receipt(db, result, card, course, controls).print(printer)
+        with span("course"):
+            # calculate OK/MP
+            course = get_course_for_card(db, day, competitor)
+            if course:
+                # fetch required controls
+                controls = (
+                    db.query(CourseControl)
+                    .filter(CourseControl.course_id == course.id)
+                    .order_by(CourseControl.seq)
+                    .all()
+                )
 
+        if not course:
+            with span("commit"):
+                self.commit(db)
+            status = {"status": "UNK_COURSE", "sid": card.card_number}
+            with span("course_suggestion"):
+                suggestions = course_index(db, day).suggest(punches)
+            if suggestions:
+                status["suggested"] = suggestions[0].name
+            return status
+
+        with span("analysis"):
+            required = required_codes(c.control_code for c in controls)
+            result = Analysis().analyse_order(required, punches)
+
+        for column, value in run_values(readout, result).items():
+            setattr(run, column, value)
+        card.status = run.status
+
+        with span("store_splits"):
+            self.store_run_splits(db, run, card, course, result)
+
+        # A clean run of another course, e.g. a wrong group or map
+        suggestion = None
+        if run.status == Status.MP:
+            with span("course_suggestion"):
+                suggestion = next(
+                    (s.name for s in course_index(db, day).suggest(punches)
+                     if s.ok and s.course_id != course.id),
+                    None,
+                )
+
+        with span("commit"):
+            self.commit(db)
+
+        with span("receipt"):
+            receipt = Receipt(db, result, card, course, controls, suggestion)
+
+        with span("print"):
+            printer.logo()
+            receipt.print(printer)
+
+        if suggestion:
+            return {"status": card.status.value, "suggested": suggestion}
         return {"status": card.status.value}
 
     def store_run_splits(self, db, run, card, course, result):
         # Delete previous splits for this run
         db.query(RunSplit).filter(RunSplit.run_id == run.id).delete()
 
-        prev_time = 0
-
-        for seq, (code, time) in enumerate(result.visited):
-            if time is not None and time >= 0:
-                # Normal punch
-                leg_time = time - prev_time
-                prev_time = time
-            else:
-                # Missing control
-                leg_time = None
-
-            split = RunSplit(
-                run_id=run.id,
-                course_id=course.id,
-                seq=seq,
-                control_code=code,
-                leg_time=leg_time,
-                cum_time=time,
-            )
-            db.add(split)
-
-        if result.visited:
-            last_time = result.visited[-1][1]
-            run_time = card.finish_time - card.start_time
-            leg_time = None if last_time is None else run_time - last_time
-            split = RunSplit(
-                run_id=run.id,
-                course_id=course.id,
-                seq=len(result.visited),
-                control_code='F',
-                leg_time=leg_time,
-                cum_time=run_time,
-            )
-            db.add(split)
+        rows = split_rows(run.id, course.id, result.visited, card.finish_time - card.start_time)
+        if rows:
+            # render_nulls keeps missing controls in the same executemany
+            db.execute(insert(RunSplit).execution_options(render_nulls=True), rows)
@@ -0,0 +1,133 @@
+import weakref
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, select
+
+from o_event.analysis import Analysis, ControlList
+from o_event.models import Course, CourseControl, Stage
+
+
+class CourseIndex:
+    """
+    Inverted index of a stage's courses, for guessing which course a
+    card was run on.
+
+    Each control code maps to the (course, position) pairs it appears at.
+    Ranking a punch list only touches the courses sharing its controls:
+    every punch that continues a course in order counts as a hit, the
+    score is 2 * hits / (course length + punch count). Only the best few
+    courses are then checked with the full Analysis.
+    """
+
+    TOP = 3
+
+    @dataclass
+    class Suggestion:
+        course_id: int
+        name: str
+        score: float
+        result: Analysis.Result
+
+        @property
+        def ok(self) -> bool:
+            return self.result.all_visited and self.result.order_correct
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.courses: List[Tuple[int, str, List[int]]] = []   # (id, name, required codes)
+        self.postings: Dict[int, List[Tuple[int, int]]] = {}   # code -> [(course pos, control pos)]
+        self.stamp = None
+
+    # ------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------
+    def _stamp(self, db, day: int):
+        return tuple(db.execute(
+            select(func.count(CourseControl.id), func.max(CourseControl.id))
+            .join(Course, Course.id == CourseControl.course_id)
+            .join(Stage, Stage.id == Course.stage_id)
+            .where(Stage.day == day)
+        ).one())
+
+    def build(self, db, day: int):
+        self._reset()
+        rows = db.execute(
+            select(Course.id, Course.name, CourseControl.control_code)
+            .join(CourseControl, CourseControl.course_id == Course.id)
+            .join(Stage, Stage.id == Course.stage_id)
+            .where(Stage.day == day)
+            .order_by(Course.id, CourseControl.seq)
+        )
+        positions = {}
+        for course_id, name, code in rows:
+            pos = positions.get(course_id)
+            if pos is None:
+                pos = positions[course_id] = len(self.courses)
+                self.courses.append((course_id, name, []))
+            if not code.isdigit():
+                continue   # start and finish
+            required = self.courses[pos][2]
+            self.postings.setdefault(int(code), []).append((pos, len(required)))
+            required.append(int(code))
+        self.stamp = self._stamp(db, day)
+
+    def ensure(self, db, day: int):
+        """
+        (Re)build the index if the stage's courses changed.
+        """
+        if self.stamp is None or self.stamp != self._stamp(db, day):
+            self.build(db, day)
+
+    # ------------------------------------------------------------
+    # Searching
+    # ------------------------------------------------------------
+    def rank(self, codes: List[int]) -> List[Tuple[float, int]]:
+        """
+        Returns [(score, course position)], best first.
+        """
+        last: Dict[int, int] = {}
+        hits: Dict[int, int] = {}
+        for code in codes:
+            seen = set()
+            for pos, control in self.postings.get(code, ()):
+                if pos not in seen and control > last.get(pos, -1):
+                    seen.add(pos)
+                    last[pos] = control
+                    hits[pos] = hits.get(pos, 0) + 1
+        ranked = [
+            (2 * n / (len(self.courses[pos][2]) + len(codes)), pos)
+            for pos, n in hits.items()
+        ]
+        ranked.sort(key=lambda x: (-x[0], x[1]))
+        return ranked
+
+    def suggest(self, punches: ControlList, top: int = TOP) -> List["CourseIndex.Suggestion"]:
+        """
+        Analyse the `top` ranked courses for punches [(code, time)];
+        complete courses first, then by fewest missing controls.
+        """
+        suggestions = []
+        for score, pos in self.rank([code for code, _ in punches])[:top]:
+            course_id, name, required = self.courses[pos]
+            result = Analysis().analyse_order(required, punches)
+            suggestions.append(CourseIndex.Suggestion(course_id, name, score, result))
+        suggestions.sort(key=lambda s: (not s.ok, len(s.result.missing), -s.score))
+        return suggestions
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def course_index(db, day: int) -> CourseIndex:
+    """
+    The up-to-date index of the day's courses, kept per engine.
+    """
+    indexes = _indexes.setdefault(db.get_bind(), {})
+    index = indexes.get(day)
+    if index is None:
+        index = indexes[day] = CourseIndex()
+    index.ensure(db, day)
+    return index
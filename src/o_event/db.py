@@ -1,7 +1,40 @@
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 
-DB_PATH = "race.db"
+# O_EVENT_DB lets export workers run against a snapshot, see export-all.py
+DB_PATH = os.environ.get("O_EVENT_DB", "race.db")
 ENGINE = create_engine(f"sqlite:///{DB_PATH}", future=True, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(bind=ENGINE, autoflush=False, autocommit=False, future=True)
+
+
+def backup(dest: sqlite3.Connection, source: str = DB_PATH):
+    """
+    Copy a point-in-time state of the `source` database into `dest` with
+    SQLite's online backup API. The copy is done in one step: the live
+    file is only read locked for as long as copying its pages takes, the
+    card service's writes wait at most that long.
+    """
+    with closing(sqlite3.connect(source)) as src:
+        src.backup(dest)
+
+
+@contextmanager
+def snapshot(source: str = DB_PATH):
+    """
+    Session on an in-memory snapshot of the database, for exports that
+    shouldn't hold locks on the live file.
+    """
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.connect() as conn:
+        backup(conn.connection.driver_connection, source)
+    try:
+        with sessionmaker(bind=engine, future=True)() as session:
+            yield session
+    finally:
+        engine.dispose()
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 
-from o_event.models import Competitor, Run, RunSplit, Stage, Course, Status, Config
+from o_event.models import Club, Competitor, Run, RunSplit, Stage, Course, Status, Config
 from o_event.ranking import Ranking
 from datetime import datetime, time
 from dataclasses import dataclass
 from typing import List, Optional
 import xml.etree.ElementTree as ET
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, selectinload
+from sqlalchemy.orm import selectinload
 
 
 # --- DTOs ---
@@ -182,36 +181,59 @@ class IOFExporter:
     def load_result_data(self, db, day: int):
         """
         Load all data for a given stage/day for result export.
+
+        Only the runs of this day that have a result are fetched, as flat
+        rows together with the competitor and club columns; their splits
+        come in a single extra query. Returns (stage, runs, splits_by_run).
         """
         stage = (
             db.query(Stage)
-            .options(
-                selectinload(Stage.courses).selectinload(Course.controls),
-                selectinload(Stage.controls),
-            )
+            .options(selectinload(Stage.courses).selectinload(Course.controls))
             .filter(Stage.day == day)
             .first()
         )
         if not stage:
             return None
 
-        # All competitors that declared this day
-        competitors = (
-            db.query(Competitor)
-            .options(
-                selectinload(Competitor.runs)
-                .selectinload(Run.splits)
-                .selectinload(RunSplit.course),
+        runs = (
+            db.query(
+                Run.id.label("run_id"),
+                Run.start,
+                Run.finish,
+                Run.result,
+                Run.status,
+                Competitor.id.label("competitor_id"),
+                Competitor.sid,
+                Competitor.name,
+                Competitor.reg,
+                Competitor.group,
+                Club.name.label("club_name"),
+            )
+            .join(Competitor, Run.competitor_id == Competitor.id)
+            .outerjoin(Club, Club.reg == Competitor.reg)
+            .filter(Run.day == day, Run.result.isnot(None))
+            .all()
+        )
+
+        splits = (
+            db.query(
+                RunSplit.run_id,
+                RunSplit.seq,
+                RunSplit.control_code,
+                RunSplit.leg_time,
+                RunSplit.cum_time,
             )
+            .join(Run, RunSplit.run_id == Run.id)
+            .filter(Run.day == day, Run.result.isnot(None))
+            .order_by(RunSplit.run_id, RunSplit.seq)
             .all()
         )
 
-        # Filter competitors who actually have runs on this day
-        competitors = [
-            c for c in competitors if any(r.day == day and r.result is not None for r in c.runs)
-        ]
+        splits_by_run = {}
+        for sp in splits:
+            splits_by_run.setdefault(sp.run_id, []).append(sp)
 
-        return stage, competitors
+        return stage, runs, splits_by_run
 
     def map_event(self, config: dict, stage: Stage) -> EventDTO:
         """
@@ -223,6 +245,9 @@ class IOFExporter:
             "place": "..."
         }
         """
+        # Officials are stored as "Family Given", e.g. "Сахнік А.М."
+        judge = config["judge"].split() or [""]
+        secretary = config["secretary"].split() or [""]
         return EventDTO(
             # name=config["name"],
             eventId=0,
@@ -230,28 +255,28 @@ class IOFExporter:
             startDate=stage.date.date().isoformat(),
             startTime=stage.date.time().isoformat(),
             # place=config["place"],
-            directorFamily=config["judge"].split()[1:],
-            directorGiven=" ".join(config["judge"].split()[0]),
-            refereeFamily=config["secretary"].split()[1:],
-            refereeGiven=" ".join(config["secretary"].split()[0]),
+            directorFamily=judge[0],
+            directorGiven=" ".join(judge[1:]),
+            refereeFamily=secretary[0],
+            refereeGiven=" ".join(secretary[1:]),
         )
 
-    def map_split(self, s: RunSplit) -> SplitDTO:
+    def map_split(self, s) -> SplitDTO:
         return SplitDTO(
             code=s.control_code,
             time=s.cum_time,
             status=None if s.leg_time is not None else "Missing",
         )
 
-    def map_person(self, c: Competitor) -> PersonDTO:
-        name = c.name.split()
+    def map_person(self, row) -> PersonDTO:
+        name = row.name.split()
 
         return PersonDTO(
-            ids={"O-Event": str(c.id)},
+            ids={"O-Event": str(row.competitor_id)},
             family=name[0] if name else '',
             given=' '.join(name[1:]) if name else '',
-            clubShort=c.reg,
-            clubName=c.club_name,
+            clubShort=row.reg,
+            clubName=row.club_name or "",
         )
 
     def map_status_string(self, status: Status):
@@ -261,26 +286,26 @@ class IOFExporter:
             return 'MissingPunch'
         return status.value
 
-    def map_result(self, run: Run, position: int, time_behind: int) -> ResultDTO:
+    def map_result(self, row, splits: list, position: int, time_behind: int) -> ResultDTO:
         return ResultDTO(
-            bib=run.competitor.sid,
-            start=run.start,
-            finish=run.finish,
-            time=run.result,
+            bib=row.sid,
+            start=row.start,
+            finish=row.finish,
+            time=row.result,
             timeBehind=time_behind,
             position=position,
-            status=self.map_status_string(run.status),
-            splits=[self.map_split(s) for s in sorted(run.splits, key=lambda x: x.seq) if s.control_code.isdigit()],
-            controlCard=run.competitor.sid,
+            status=self.map_status_string(row.status),
+            splits=[self.map_split(s) for s in splits if s.control_code.isdigit()],
+            controlCard=row.sid,
         )
 
-    def map_class(self, group_name: str, course: Course, runs: list[Run]) -> ClassResultDTO:
+    def map_class(self, group_name: str, course: Course, runs: list, splits_by_run: dict) -> ClassResultDTO:
         persons = []
-        for position, time_behind, run in Ranking().rank(runs):
+        for position, time_behind, row in Ranking().rank(runs):
             persons.append(
                 PersonResultDTO(
-                    person=self.map_person(run.competitor),
-                    result=self.map_result(run, position, time_behind),
+                    person=self.map_person(row),
+                    result=self.map_result(row, splits_by_run.get(row.run_id, []), position, time_behind),
                 )
             )
 
@@ -297,7 +322,7 @@ class IOFExporter:
 
     def map_result_list(self, db, day: int) -> ResultListDTO:
 
-        stage, competitors = self.load_result_data(db, day)
+        stage, runs, splits_by_run = self.load_result_data(db, day)
 
         # Load Config into a dict
         config = {
@@ -313,21 +338,20 @@ class IOFExporter:
         # Build classes based on group names
         group_to_runs = {}
 
-        for c in competitors:
-            for run in c.runs:
-                if run.day == day:
-                    group_to_runs.setdefault(c.group, []).append(run)
+        for row in runs:
+            group_to_runs.setdefault(row.group, []).append(row)
 
+        courses = {co.name: co for co in stage.courses}
         classes = []
 
-        for group, runs in group_to_runs.items():
+        for group, group_runs in group_to_runs.items():
             # Find course for this group
             # Your data implies course name == group
-            course = next((co for co in stage.courses if co.name == group), None)
+            course = courses.get(group)
             if not course:
                 continue  # competitor in group without a course (skip)
 
-            classes.append(self.map_class(group, course, runs))
+            classes.append(self.map_class(group, course, group_runs, splits_by_run))
 
         return ResultListDTO(
             createTime=datetime.now(),
@@ -337,10 +361,12 @@ class IOFExporter:
 
 
 if __name__ == "__main__":
-    engine = create_engine("sqlite:///race.db")
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    iof_exporter = IOFExporter()
-    result = iof_exporter.map_result_list(session, 1)
-    xml = iof_exporter.export_iof(result)
+    import sys
+    from o_event.db import snapshot
+
+    with snapshot() as session:
+        day = int(sys.argv[1]) if len(sys.argv) > 1 else Config.get_current_day(session)
+        iof_exporter = IOFExporter()
+        result = iof_exporter.map_result_list(session, day)
+        xml = iof_exporter.export_iof(result)
     print(xml)
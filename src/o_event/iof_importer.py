@@ -1,86 +1,260 @@
 import xml.etree.ElementTree as ET
-from o_event.models import Stage, MapInfo, Control, Course, CourseControl
+from dataclasses import dataclass, field
+from typing import List
+
+from sqlalchemy import delete, insert, select, update
+
+from o_event.models import Stage, MapInfo, Control, Course, CourseControl, RunSplit
+
+
+NS = "{http://www.orienteering.org/datastandard/3.0}"
 
 
 class IOFImporter:
     def __init__(self, session):
         self.session = session
-        self.ns = {"iof": "http://www.orienteering.org/datastandard/3.0"}
 
-    def import_stage(self, filename, day, stage_name=None):
-        tree = ET.parse(filename)
-        root = tree.getroot()
+    @dataclass
+    class Update:
+        stage: Stage
+        added_courses: List[int] = field(default_factory=list)
+        changed_courses: List[int] = field(default_factory=list)
+        removed_courses: List[int] = field(default_factory=list)
+        changed_controls: List[str] = field(default_factory=list)
+
+        @property
+        def affected_courses(self) -> List[int]:
+            return self.added_courses + self.changed_courses + self.removed_courses
+
+    # ------------------------------------------------------------
+    # Streaming parser
+    # ------------------------------------------------------------
+    def _float(self, elem, attr):
+        return float(elem.get(attr)) if elem is not None else None
+
+    def parse(self, filename):
+        """
+        Stream <RaceCourseData> of an IOF 3.0 CourseData file.
+
+        Yields ("map", dict), ("control", dict) and ("course", dict) items
+        in document order, clearing each element once it's been consumed.
+        """
+        path = []
+        for event, elem in ET.iterparse(filename, events=("start", "end")):
+            if event == "start":
+                path.append(elem.tag)
+                continue
+            path.pop()
+
+            # Only direct children of RaceCourseData are of interest
+            if not path or path[-1] != NS + "RaceCourseData":
+                continue
+
+            if elem.tag == NS + "Map":
+                top_left = elem.find(NS + "MapPositionTopLeft")
+                bottom_right = elem.find(NS + "MapPositionBottomRight")
+                yield "map", {
+                    "scale": int(elem.findtext(NS + "Scale")),
+                    "top_left_x": self._float(top_left, "x"),
+                    "top_left_y": self._float(top_left, "y"),
+                    "bottom_right_x": self._float(bottom_right, "x"),
+                    "bottom_right_y": self._float(bottom_right, "y"),
+                }
+
+            elif elem.tag == NS + "Control":
+                pos = elem.find(NS + "Position")
+                mpos = elem.find(NS + "MapPosition")
+                yield "control", {
+                    "code": elem.findtext(NS + "Id").strip(),
+                    "type": elem.get("type"),
+                    "modify_time": elem.get("modifyTime"),
+                    "lng": self._float(pos, "lng"),
+                    "lat": self._float(pos, "lat"),
+                    "map_x": self._float(mpos, "x"),
+                    "map_y": self._float(mpos, "y"),
+                }
+
+            elif elem.tag == NS + "Course":
+                controls = []
+                for seq, cc in enumerate(elem.iterfind(NS + "CourseControl")):
+                    leg = cc.findtext(NS + "LegLength")
+                    controls.append({
+                        "seq": seq,
+                        "type": cc.get("type"),
+                        "control_code": cc.findtext(NS + "Control").strip(),
+                        "leg_length": int(leg) if leg is not None else None,
+                    })
+                yield "course", {
+                    "name": elem.findtext(NS + "Name").strip().replace(' ', ''),
+                    "length": int(elem.findtext(NS + "Length")),
+                    "climb": int(elem.findtext(NS + "Climb")),
+                    "modify_time": elem.get("modifyTime"),
+                    "controls": controls,
+                }
+
+            else:
+                continue
+
+            elem.clear()
+
+    # ------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------
+    def import_stage(self, filename, day, stage_name=None, update=False):
+        """
+        Import course data for a stage.
+
+        With update=True an existing stage for the day is updated in place
+        (see update_stage) instead of creating a new one.
+        """
+        if update:
+            stage = self.session.scalar(select(Stage).where(Stage.day == day))
+            if stage is not None:
+                return self.update_stage(stage, filename, stage_name).stage
 
         stage = Stage(day=day, name=stage_name)
         self.session.add(stage)
+        self.session.flush()
 
-        # Stage date from <Event>/<Name>
-        # event_name = root.find("iof:Event/iof:Name", self.ns)
-        # if event_name is not None:
-        #    stage.date = event_name.text.strip()
-
-        # ----- Map -----
-        map_elem = root.find("iof:RaceCourseData/iof:Map", self.ns)
-        if map_elem is not None:
-            stage.map = MapInfo(
-                scale=int(map_elem.find("iof:Scale", self.ns).text),
-                top_left_x=float(map_elem.find(
-                    "iof:MapPositionTopLeft", self.ns).get("x")),
-                top_left_y=float(map_elem.find(
-                    "iof:MapPositionTopLeft", self.ns).get("y")),
-                bottom_right_x=float(map_elem.find(
-                    "iof:MapPositionBottomRight", self.ns).get("x")),
-                bottom_right_y=float(map_elem.find(
-                    "iof:MapPositionBottomRight", self.ns).get("y")),
-            )
+        controls = []
+        courses = []
+        for kind, data in self.parse(filename):
+            if kind == "map":
+                stage.map = MapInfo(**data)
+            elif kind == "control":
+                controls.append(data)
+            else:
+                courses.append(data)
 
-        # ----- Controls -----
-        for ctrl in root.findall("iof:RaceCourseData/iof:Control", self.ns):
-            c = Control(
-                code=ctrl.find("iof:Id", self.ns).text.strip(),
-                type=ctrl.get("type"),
-                modify_time=ctrl.get("modifyTime"),
-                stage=stage
+        if controls:
+            self.session.execute(
+                insert(Control),
+                [dict(c, stage_id=stage.id) for c in controls],
             )
+        self._insert_courses(stage, courses)
 
-            pos = ctrl.find("iof:Position", self.ns)
-            if pos is not None:
-                c.lng = float(pos.get("lng"))
-                c.lat = float(pos.get("lat"))
-
-            mpos = ctrl.find("iof:MapPosition", self.ns)
-            if mpos is not None:
-                c.map_x = float(mpos.get("x"))
-                c.map_y = float(mpos.get("y"))
-
-            stage.controls.append(c)
-
-        # ----- Courses -----
-        for course_elem in root.findall("iof:RaceCourseData/iof:Course", self.ns):
-            course = Course(
-                name=course_elem.find("iof:Name", self.ns).text.strip().replace(' ', ''),
-                length=int(course_elem.find("iof:Length", self.ns).text),
-                climb=int(course_elem.find("iof:Climb", self.ns).text),
-                modify_time=course_elem.get("modifyTime"),
-                stage=stage
-            )
-            self.session.add(course)
-
-            seq = 0
-            for cc in course_elem.findall("iof:CourseControl", self.ns):
-                control_code = cc.find("iof:Control", self.ns).text.strip()
-                leg = cc.find("iof:LegLength", self.ns)
-                leg_length = int(leg.text) if leg is not None else None
-
-                course.controls.append(
-                    CourseControl(
-                        seq=seq,
-                        type=cc.get("type"),
-                        control_code=control_code,
-                        leg_length=leg_length,
+        self.session.commit()
+        return stage
+
+    def _insert_courses(self, stage, courses) -> List[int]:
+        if not courses:
+            return []
+
+        ids = self.session.scalars(
+            insert(Course).returning(Course.id, sort_by_parameter_order=True),
+            [
+                {k: v for k, v in c.items() if k != "controls"} | {"stage_id": stage.id}
+                for c in courses
+            ],
+        ).all()
+
+        course_controls = [
+            dict(cc, course_id=course_id)
+            for course_id, c in zip(ids, courses)
+            for cc in c["controls"]
+        ]
+        if course_controls:
+            self.session.execute(insert(CourseControl), course_controls)
+
+        return list(ids)
+
+    def update_stage(self, stage: Stage, filename, stage_name=None) -> Update:
+        """
+        Diff a corrected course file against an existing stage.
+
+        Controls are matched by code and courses by name; only those whose
+        modifyTime differs are rewritten. Courses missing from the file are
+        removed unless some run splits still refer to them.
+        """
+        if stage_name is not None:
+            stage.name = stage_name
+
+        result = IOFImporter.Update(stage)
+
+        existing_controls = {
+            c.code: c
+            for c in self.session.scalars(select(Control).where(Control.stage_id == stage.id))
+        }
+        existing_courses = {
+            c.name: c
+            for c in self.session.scalars(select(Course).where(Course.stage_id == stage.id))
+        }
+
+        new_controls = []
+        new_courses = []
+        seen_controls = set()
+        seen_courses = set()
+
+        for kind, data in self.parse(filename):
+            if kind == "map":
+                if stage.map is None:
+                    stage.map = MapInfo(**data)
+                else:
+                    for k, v in data.items():
+                        setattr(stage.map, k, v)
+
+            elif kind == "control":
+                seen_controls.add(data["code"])
+                ctrl = existing_controls.get(data["code"])
+                if ctrl is None:
+                    new_controls.append(dict(data, stage_id=stage.id))
+                    result.changed_controls.append(data["code"])
+                elif ctrl.modify_time is None or ctrl.modify_time != data["modify_time"]:
+                    for k, v in data.items():
+                        setattr(ctrl, k, v)
+                    result.changed_controls.append(data["code"])
+
+            else:
+                seen_courses.add(data["name"])
+                course = existing_courses.get(data["name"])
+                if course is None:
+                    new_courses.append(data)
+                elif course.modify_time is None or course.modify_time != data["modify_time"]:
+                    self.session.execute(
+                        update(Course)
+                        .where(Course.id == course.id)
+                        .values(length=data["length"], climb=data["climb"],
+                                modify_time=data["modify_time"])
+                    )
+                    self.session.execute(
+                        delete(CourseControl).where(CourseControl.course_id == course.id)
                     )
-                )
-                seq += 1
+                    if data["controls"]:
+                        self.session.execute(
+                            insert(CourseControl),
+                            [dict(cc, course_id=course.id) for cc in data["controls"]],
+                        )
+                    result.changed_courses.append(course.id)
+
+        # Courses were updated with Core statements, don't keep stale ORM
+        # copies (flushing the control edits first)
+        self.session.flush()
+        self.session.expire_all()
+
+        if new_controls:
+            self.session.execute(insert(Control), new_controls)
+
+        removed_controls = [c for code, c in existing_controls.items() if code not in seen_controls]
+        for ctrl in removed_controls:
+            result.changed_controls.append(ctrl.code)
+            self.session.delete(ctrl)
+
+        result.added_courses = self._insert_courses(stage, new_courses)
+
+        for name, course in existing_courses.items():
+            if name in seen_courses:
+                continue
+            used = self.session.scalar(
+                select(RunSplit.id).where(RunSplit.course_id == course.id).limit(1)
+            )
+            if used is not None:
+                print(f"Course {name} already has results, not removed")
+                continue
+            self.session.execute(
+                delete(CourseControl).where(CourseControl.course_id == course.id)
+            )
+            self.session.execute(delete(Course).where(Course.id == course.id))
+            result.removed_courses.append(course.id)
 
         self.session.commit()
-        return stage
+        return result
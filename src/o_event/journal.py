@@ -0,0 +1,84 @@
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator, Tuple
+
+
+class Journal:
+    """
+    Append-only file of raw readout payloads.
+
+    Each record is a little-endian (length, crc32) header followed by the
+    payload. Appends are buffered; sync() makes everything appended so far
+    durable, so callers batch several appends per fsync. A record torn by
+    a crash is detected by its length or checksum and cut off on open.
+    """
+
+    HEADER = struct.Struct("<II")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.size = self._recover()
+        self.f = open(self.path, "ab")
+
+    def _recover(self) -> int:
+        if not self.path.exists():
+            return 0
+        end = 0
+        for end, _ in Journal.read(self.path):
+            pass
+        if end != self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        return end
+
+    def append(self, payload: bytes) -> int:
+        """
+        Append a record, returns the offset just past it.
+        """
+        with self.lock:
+            self.f.write(self.HEADER.pack(len(payload), zlib.crc32(payload)))
+            self.f.write(payload)
+            self.size += self.HEADER.size + len(payload)
+            return self.size
+
+    def sync(self):
+        with self.lock:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        with self.lock:
+            if not self.f.closed:
+                self.f.flush()
+                os.fsync(self.f.fileno())
+                self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def read(path, offset: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yields (offset past the record, payload) of the intact records
+        from `offset` on.
+        """
+        header = Journal.HEADER
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                head = f.read(header.size)
+                if len(head) < header.size:
+                    return
+                length, crc = header.unpack(head)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return
+                offset += header.size + length
+                yield offset, payload
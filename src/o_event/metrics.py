@@ -0,0 +1,173 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+from o_event.querylog import log_queries
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with a fixed set of buckets, one series
+    per label value.
+    """
+
+    def __init__(self, name: str, help: str, label: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series: Dict[str, list] = {}   # label value -> [bucket counts..., count, sum]
+
+    def observe(self, label: str, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(label)
+            if s is None:
+                s = self.series[label] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                s[idx] += 1
+            s[-2] += 1
+            s[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {k: list(v) for k, v in sorted(self.series.items())}
+        for label, s in series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, s):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{self.label}="{label}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{label}",le="+Inf"}} {s[-2]}')
+            lines.append(f'{self.name}_count{{{self.label}="{label}"}} {s[-2]}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label}"}} {s[-1]:.6f}')
+        return "\n".join(lines)
+
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+STAGE_SECONDS = Histogram(
+    "o_event_stage_seconds", "Time spent in each stage of the readout path", "stage", SECONDS)
+REQUEST_SECONDS = Histogram(
+    "o_event_request_seconds", "HTTP request latency", "path", SECONDS)
+REQUEST_QUERIES = Histogram(
+    "o_event_request_queries", "SQL statements executed per HTTP request", "path", QUERIES)
+
+HISTOGRAMS = [STAGE_SECONDS, REQUEST_SECONDS, REQUEST_QUERIES]
+
+
+class Gauge:
+    """
+    Prometheus-style gauge, its value is read when the metrics are rendered.
+    """
+
+    def __init__(self, name: str, help: str, value: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.value = value
+
+    def render(self) -> str:
+        return "\n".join([
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.value():g}",
+        ])
+
+
+GAUGES: Dict[str, Gauge] = {}
+
+
+def gauge(name: str, help: str, value: Callable[[], float]):
+    """
+    Register a gauge, replacing one of the same name.
+    """
+    GAUGES[name] = Gauge(name, help, value)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a stage of the readout path, e.g.
+
+        with span("analysis"):
+            result = Analysis().analyse_order(...)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(stage, elapsed)
+        log = _stage_log.get()
+        if log is not None:
+            log.append((stage, elapsed))
+
+
+_stage_log: contextvars.ContextVar = contextvars.ContextVar("o_event_stage_log", default=None)
+
+
+@contextmanager
+def record_stages():
+    """
+    Collect the [(stage, seconds)] of spans run in this context, on top
+    of the histograms.
+    """
+    log = []
+    token = _stage_log.set(log)
+    try:
+        yield log
+    finally:
+        _stage_log.reset(token)
+
+
+# ------------------------------------------------------------
+# SQL statement counting
+# ------------------------------------------------------------
+@contextmanager
+def count_queries():
+    """
+    Count SQL statements executed in this context (including threads
+    the work is handed to with a copied context, as FastAPI does for
+    sync endpoints). Yields a QueryLog, see its `count`.
+    """
+    with log_queries(details=False) as log:
+        yield log
+
+
+# ------------------------------------------------------------
+# FastAPI integration
+# ------------------------------------------------------------
+def render() -> str:
+    metrics = HISTOGRAMS + list(GAUGES.values())
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+def instrument(app):
+    """
+    Record latency and SQL statement count of every request and serve
+    all metrics in Prometheus text format on /metrics.
+    """
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    @app.middleware("http")
+    async def measure(request: Request, call_next):
+        if request.url.path == "/metrics":
+            return await call_next(request)
+        started = time.perf_counter()
+        with count_queries() as queries:
+            response = await call_next(request)
+        REQUEST_SECONDS.observe(request.url.path, time.perf_counter() - started)
+        REQUEST_QUERIES.observe(request.url.path, queries.count)
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+    return app
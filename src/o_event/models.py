@@ -1,9 +1,12 @@
 from datetime import date
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, ForeignKey, Enum, JSON
+    Column, Integer, String, Float, DateTime, ForeignKey, Enum, JSON, cast, select, update
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, relationship, object_session
 import enum
+import time
+import weakref
 
 Base = declarative_base()
 
@@ -22,26 +25,25 @@ class Config(Base):
     KEY_SECRETARY = "secretary"
     KEY_PLACE = "place"
     KEY_START_SEEDS = "start_seeds"
+    KEY_VERSION = "version"
 
     @staticmethod
     def set(db, key, value):
-        # Check if key exists
-        c = db.query(Config).filter_by(key=key).first()
-        if c:
-            # Update existing
-            c.value = value
-        else:
-            # Insert new
-            c = Config(key=key, value=value)
-            db.add(c)
-        db.commit()
+        Config.set_many(db, {key: value})
+
+    @staticmethod
+    def set_many(db, values: dict):
+        ConfigCache.of(db).set_many(db, values)
 
     @staticmethod
     def get(db, key, default=None):
-        c = db.query(Config).filter_by(key=key).first()
-        if not c:
-            return default
-        return c.value
+        return ConfigCache.of(db).get_all(db).get(key, default)
+
+    @staticmethod
+    def get_all(db) -> dict:
+        values = dict(ConfigCache.of(db).get_all(db))
+        values.pop(Config.KEY_VERSION, None)
+        return values
 
     @staticmethod
     def get_current_day(db):
@@ -50,13 +52,95 @@ class Config(Base):
             return day
         return int(day)
 
+    @staticmethod
+    def subscribe(db, listener):
+        """
+        Call listener({key: value}) whenever config values change.
+        """
+        ConfigCache.of(db).listeners.append(listener)
+
     @staticmethod
     def create(db, name: str, start_date: str, judge: str, secretary: str, place: str):
-        Config.set(db, Config.KEY_NAME, name)
-        Config.set(db, Config.KEY_DATE, start_date)
-        Config.set(db, Config.KEY_JUDGE, judge)
-        Config.set(db, Config.KEY_SECRETARY, secretary)
-        Config.set(db, Config.KEY_PLACE, place)
+        Config.set_many(db, {
+            Config.KEY_NAME: name,
+            Config.KEY_DATE: start_date,
+            Config.KEY_JUDGE: judge,
+            Config.KEY_SECRETARY: secretary,
+            Config.KEY_PLACE: place,
+        })
+
+
+class ConfigCache:
+    """
+    In-memory copy of the config table, one per engine.
+
+    Every write bumps the version row, other processes re-check it at most
+    every CHECK_INTERVAL seconds and reload the table only when it changed.
+    """
+
+    CHECK_INTERVAL = 1.0
+
+    _instances = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def of(cls, db) -> "ConfigCache":
+        bind = db.get_bind()
+        cache = cls._instances.get(bind)
+        if cache is None:
+            cache = cls._instances[bind] = cls()
+        return cache
+
+    def __init__(self):
+        self.values = None
+        self.version = None
+        self.checked = 0.0
+        self.listeners = []
+
+    def _load(self, db):
+        old = self.values
+        self.values = dict(db.execute(select(Config.key, Config.value)).all())
+        self.version = self.values.get(Config.KEY_VERSION)
+        self.checked = time.monotonic()
+
+        if old is not None:
+            changed = {k: v for k, v in self.values.items() if old.get(k) != v}
+            if changed:
+                for listener in self.listeners:
+                    listener(changed)
+
+    def get_all(self, db) -> dict:
+        if self.values is None:
+            self._load(db)
+        elif time.monotonic() - self.checked >= self.CHECK_INTERVAL:
+            version = db.scalar(select(Config.value).where(Config.key == Config.KEY_VERSION))
+            self.checked = time.monotonic()
+            if version != self.version:
+                self._load(db)
+        return self.values
+
+    def set_many(self, db, values: dict):
+        # Bump the version in place first: the UPDATE takes the write lock,
+        # so concurrent writers can't both write the same version
+        bumped = db.execute(
+            update(Config)
+            .where(Config.key == Config.KEY_VERSION)
+            .values(value=cast(cast(Config.value, Integer) + 1, String))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        values = {k: v for k, v in values.items() if k != Config.KEY_VERSION}
+        if not bumped:
+            values[Config.KEY_VERSION] = 1
+
+        existing = {c.key: c for c in db.query(Config).filter(Config.key.in_(list(values)))}
+        for key, value in values.items():
+            c = existing.get(key)
+            if c:
+                c.value = str(value)
+            else:
+                db.add(Config(key=key, value=str(value)))
+        db.commit()
+
+        self._load(db)
 
 
 class Stage(Base):
@@ -220,3 +304,46 @@ class Card(Base):
     readout_datetime = Column(DateTime)
 
     raw_json = Column(JSON)
+
+
+class JournalCheckpoint(Base):
+    __tablename__ = "journal_checkpoints"
+
+    # Offset in the readout journal up to which readouts are committed,
+    # updated in the same transaction as the readouts themselves
+    journal = Column(String, primary_key=True)
+    offset = Column(Integer, nullable=False)
+
+
+class ReplicatedCard(Base):
+    __tablename__ = "replicated_cards"
+
+    # Card pushed to the central node at `url` with its run at the time,
+    # see replication: the card is pushed again when its run changes
+    url = Column(String, primary_key=True)
+    card_id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, nullable=True)
+
+
+class ChangeCounter(Base):
+    __tablename__ = "change_counters"
+
+    # Bumped in the same transaction as the writes to the tracked table,
+    # so that in-memory copies in other processes can tell they're stale
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False)
+
+    COMPETITORS = "competitors"
+
+    @staticmethod
+    def bump(db, name: str):
+        table = ChangeCounter.__table__
+        db.execute(
+            sqlite_insert(table)
+            .values(name=name, value=1)
+            .on_conflict_do_update(index_elements=[table.c.name], set_={"value": table.c.value + 1})
+        )
+
+    @staticmethod
+    def get(db, name: str) -> int:
+        return db.scalar(select(ChangeCounter.value).where(ChangeCounter.name == name)) or 0
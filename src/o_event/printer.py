@@ -1,3 +1,98 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import io
+import os
+
+
+# ------------------------
+# Images → ESC/POS raster
+# ------------------------
+RASTER_CACHE_SIZE = 32
+
+_rasters = OrderedDict()   # (sha256, max_width) → raster bytes
+_logos = {}                # path → ((mtime, size), raster bytes)
+_INVERT = bytes(255 - b for b in range(256))
+
+
+def render_raster(data: bytes, max_width: int = 576) -> bytes:
+    """
+    Convert image file contents to a GS v 0 raster bit image.
+
+    Pillow packs mode "1" rows MSB first with 1 for white, so the bits
+    only need inverting; rows are padded to whole bytes with white.
+    """
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data)).convert("L")  # grayscale
+    w, h = img.size
+
+    # resize to printer width
+    if w > max_width:
+        new_h = int(h * (max_width / w))
+        img = img.resize((max_width, new_h), Image.LANCZOS)
+
+    # dither
+    img = img.convert("1", dither=Image.FLOYDSTEINBERG)
+
+    width, height = img.size
+    bytes_per_row = (width + 7) // 8
+
+    if width % 8:
+        padded = Image.new("1", (bytes_per_row * 8, height), 1)
+        padded.paste(img, (0, 0))
+        img = padded
+
+    out = bytearray()
+
+    # GS v 0: raster bit image
+    out += b'\x1D\x76\x30\x00'  # GS v 0 m=0
+    out += bytes([bytes_per_row & 0xFF, bytes_per_row >> 8])
+    out += bytes([height & 0xFF, height >> 8])
+    out += img.tobytes().translate(_INVERT)
+
+    return bytes(out)
+
+
+def image_to_raster(data: bytes, max_width: int = 576) -> bytes:
+    """
+    render_raster() with results cached by image content.
+    """
+    key = (hashlib.sha256(data).hexdigest(), max_width)
+    raster = _rasters.get(key)
+    if raster is None:
+        raster = render_raster(data, max_width)
+        _rasters[key] = raster
+        if len(_rasters) > RASTER_CACHE_SIZE:
+            _rasters.popitem(last=False)
+    else:
+        _rasters.move_to_end(key)
+    return raster
+
+
+def load_logo(path: str) -> bytes:
+    """
+    Raster bytes for a logo file, re-read only when the file changes.
+    A .raw file is taken as prepared ESC/POS data, anything else is
+    converted with image_to_raster().
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return b""
+
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _logos.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not path.endswith(".raw"):
+        data = image_to_raster(data)
+
+    _logos[path] = (stamp, data)
+    return data
 
 
 class Printer:
@@ -13,6 +108,7 @@ class Printer:
         self.device = device
         self.encoding = encoding
         self.fd = None
+        self.buffer = None
 
     # ------------------------
     # Context manager
@@ -36,10 +132,27 @@ class Printer:
     # ESC/POS low-level send
     # ------------------------
     def _raw(self, data: bytes):
+        if self.buffer is not None:
+            self.buffer += data
+            return
         if self.fd is None:
             raise RuntimeError("Printer is not open")
         self.fd.write(data)
 
+    @contextmanager
+    def buffered(self):
+        """
+        Collect everything printed inside the block and send it
+        to the device in a single write.
+        """
+        self.buffer = bytearray()
+        try:
+            yield self
+            data = bytes(self.buffer)
+        finally:
+            self.buffer = None
+        self._raw(data)
+
     def _init_printer(self):
         self._raw(b"\x1b@\n")     # ESC @  – initialize
         self._raw(b"\x1c\x2e\x1b\x52\x00\x1bt\x17")  # Windows-1251
@@ -87,12 +200,13 @@ class Printer:
         else:
             self._raw(b"\x1d\x56\x00")      # full cut
 
-    def logo(self):
-        try:
-            with open('logo.raw', 'rb') as f:
-                self._raw(f.read())
-        except FileNotFoundError:
-            ...
+    def image(self, data: bytes, max_width: int = 576):
+        self._raw(image_to_raster(data, max_width))
+
+    def logo(self, path: str = 'logo.raw'):
+        data = load_logo(path)
+        if data:
+            self._raw(data)
 
 
 class PrinterMux:
@@ -0,0 +1,120 @@
+import cProfile
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from o_event.metrics import record_stages
+from o_event.querylog import log_queries
+
+
+class SlowReadoutProfiler:
+    """
+    Opt-in capture of slow readouts.
+
+    Every readout runs under cProfile with its SQL statements and stage
+    timings recorded; when one takes longer than the budget, all of it
+    is saved along with the raw payload to a directory of its own:
+
+        profiles/20251115-112233.456789-1234/
+            readout.json   the payload as received
+            profile.pstats cProfile dump (python -m pstats, snakeviz, ...)
+            sql.txt        statements with their durations, in order
+            summary.json   total time, stage timings, statement count
+
+    Only the newest `keep` captures are kept. Enabled in the services by
+    setting O_EVENT_PROFILE_BUDGET_MS; see profile-readout.py to inspect
+    or replay a capture.
+    """
+
+    @dataclass
+    class Capture:
+        card_number: int | None = None   # for naming, set by the caller
+        path: Path | None = None         # where it was saved, if it was
+
+    def __init__(self, budget: float | None, directory="profiles", keep: int = 50):
+        self.budget = budget
+        self.directory = Path(directory)
+        self.keep = keep
+
+    @classmethod
+    def from_env(cls):
+        budget = os.environ.get("O_EVENT_PROFILE_BUDGET_MS")
+        return cls(
+            float(budget) / 1000 if budget else None,
+            os.environ.get("O_EVENT_PROFILE_DIR", "profiles"),
+            int(os.environ.get("O_EVENT_PROFILE_KEEP", "50")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget is not None
+
+    @contextmanager
+    def capture(self, payload: bytes | str):
+        """
+        Profile the block and save a capture if it ran over budget.
+        """
+        capture = SlowReadoutProfiler.Capture()
+        if not self.enabled:
+            yield capture
+            return
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            with record_stages() as stages, log_queries() as queries:
+                profile.enable()
+                try:
+                    yield capture
+                finally:
+                    profile.disable()
+        finally:
+            elapsed = time.perf_counter() - started
+
+            if elapsed > self.budget:
+                try:
+                    capture.path = self.save(payload, capture.card_number, elapsed, profile, queries, stages)
+                except OSError as ex:
+                    print(f"Failed to save the profile: {ex}")
+
+    def save(self, payload, card_number, elapsed, profile, queries, stages) -> Path:
+        name = datetime.now().strftime("%Y%m%d-%H%M%S.%f")
+        if card_number is not None:
+            name += f"-{card_number}"
+        path = self.directory / name
+        path.mkdir(parents=True, exist_ok=True)
+
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        (path / "readout.json").write_bytes(payload)
+        profile.dump_stats(path / "profile.pstats")
+
+        with open(path / "sql.txt", "w", encoding="utf-8") as f:
+            for seconds, (statement, parameters) in zip(queries.seconds, queries.statements):
+                duration = "failed" if seconds is None else f"{seconds * 1000:.2f} ms"
+                f.write(f"-- {duration} {parameters}\n{statement};\n\n")
+
+        summary = {
+            "card_number": card_number,
+            "elapsed_ms": elapsed * 1000,
+            "budget_ms": self.budget * 1000,
+            "statements": queries.count,
+            "sql_ms": queries.total_seconds * 1000,
+            "stages_ms": [(stage, seconds * 1000) for stage, seconds in stages],
+        }
+        with open(path / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"Slow readout ({elapsed * 1000:.0f} ms), saved to {path}")
+        self.rotate()
+        return path
+
+    def rotate(self):
+        captures = sorted(p for p in self.directory.iterdir() if p.is_dir())
+        for old in captures[:-self.keep] if self.keep else captures:
+            shutil.rmtree(old, ignore_errors=True)
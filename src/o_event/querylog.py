@@ -0,0 +1,118 @@
+import contextvars
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# The one statement hook of the project: request metrics, slow readout
+# captures and query budgets all read QueryLogs
+_active: contextvars.ContextVar = contextvars.ContextVar("o_event_querylogs", default=())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    logs = _active.get()
+    if not logs:
+        return
+    recorded = []
+    for log in logs:
+        log.count += 1
+        if log.details:
+            log.statements.append((statement, repr(parameters)))
+            log.seconds.append(None)
+            recorded.append((log, len(log.seconds) - 1))
+    if recorded and context is not None:
+        context._o_event_querylog = (recorded, time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    recorded = getattr(context, "_o_event_querylog", None)
+    if recorded is not None:
+        logs, started = recorded
+        elapsed = time.perf_counter() - started
+        for log, i in logs:
+            log.seconds[i] = elapsed
+
+
+@dataclass
+class QueryLog:
+    """
+    SQL statements executed during one logical operation, in order,
+    as (statement, parameters) pairs with their durations in `seconds`
+    (None if it failed). An executemany counts once. With details=False
+    only the count is kept.
+    """
+    name: str = ""
+    details: bool = True
+    count: int = 0
+    statements: List[Tuple[str, str]] = field(default_factory=list)
+    seconds: List[float] = field(default_factory=list)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(s for s in self.seconds if s is not None)
+
+    def repeated(self, threshold: int = 5) -> List[Tuple[str, int]]:
+        """
+        N+1 suspects: identical statements run at least `threshold` times
+        with different parameters, i.e. a query issued per row.
+        Returns [(statement, times)], most frequent first.
+        """
+        params = {}
+        for statement, parameters in self.statements:
+            params.setdefault(statement, set()).add(parameters)
+        counts = Counter(statement for statement, _ in self.statements)
+        return [
+            (statement, n)
+            for statement, n in counts.most_common()
+            if n >= threshold and len(params[statement]) > 1
+        ]
+
+    def report(self, threshold: int = 5) -> str:
+        lines = [f"{self.name or 'operation'}: {self.count} statements"]
+        for statement, n in self.repeated(threshold):
+            first_line = " ".join(statement.split())
+            if len(first_line) > 160:
+                first_line = first_line[:157] + "..."
+            lines.append(f"  {n:5}x {first_line}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def log_queries(name: str = "", details: bool = True):
+    """
+    Record the SQL statements executed in this context (any engine).
+    Contexts nest: an outer log also sees the inner one's statements.
+
+        with log_queries("export") as log:
+            exporter.map_result_list(db, 1)
+        print(log.report())
+    """
+    log = QueryLog(name, details)
+    token = _active.set(_active.get() + (log,))
+    try:
+        yield log
+    finally:
+        _active.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def max_queries(limit: int, name: str = "", threshold: int = 5):
+    """
+    Fail when the block executes more than `limit` statements, listing
+    the repeated ones that most likely caused it.
+    """
+    with log_queries(name) as log:
+        yield log
+    if log.count > limit:
+        raise QueryBudgetExceeded(f"Query budget of {limit} exceeded\n{log.report(threshold)}")
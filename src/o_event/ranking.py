@@ -1,7 +1,8 @@
 from o_event.models import Run, Status, Competitor
 
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 from dataclasses import dataclass
+from sqlalchemy import and_
 
 
 class Ranking:
@@ -50,34 +51,77 @@ class Ranking:
            2) sum of scores
            3) sum of times (lower is better)
         """
+        entries = [
+            (c, {r.day: (r.status, r.result) for r in c.runs if 1 <= r.day <= days_to_calculate})
+            for c in competitors
+        ]
+        return self._rank_entries(days_to_calculate, entries)
 
-        # -------------------------------------------
-        # 1) Group runs day→[run] and determine winners per day
-        # -------------------------------------------
-        runs_by_day = {day: [] for day in range(1, days_to_calculate + 1)}
+    def rank_multiday_all(self, db, days_to_calculate: int) -> Dict[str, List[Tuple[int | None, Result]]]:
+        """
+        Same as rank_multiday(), but for all groups at once: competitors and
+        their runs come in one flat query and every group is ranked in a
+        single pass. Returns {group: ranking}, ordered by group name.
+        """
+        rows = (
+            db.query(Competitor, Run.day, Run.status, Run.result)
+            .outerjoin(
+                Run,
+                and_(
+                    Run.competitor_id == Competitor.id,
+                    Run.day >= 1,
+                    Run.day <= days_to_calculate,
+                ),
+            )
+            .order_by(Competitor.group, Competitor.id)
+            .all()
+        )
 
-        for c in competitors:
-            for r in c.runs:
-                if 1 <= r.day <= days_to_calculate:
-                    runs_by_day[r.day].append(r)
+        groups: Dict[str, list] = {}
+        entries = {}
+        for c, day, status, result in rows:
+            entry = entries.get(c.id)
+            if entry is None:
+                entry = entries[c.id] = (c, {})
+                groups.setdefault(c.group, []).append(entry)
+            if day is not None:
+                entry[1][day] = (status, result)
+
+        return {
+            group: self._rank_entries(days_to_calculate, group_entries)
+            for group, group_entries in groups.items()
+        }
+
+    def _rank_entries(
+        self,
+        days_to_calculate: int,
+        entries: List[Tuple[Competitor, Dict[int, Tuple[Status, int | None]]]],
+    ) -> List[Tuple[int | None, Result]]:
+        """
+        entries: [(competitor, {day: (status, result)}), ...]
+        """
 
-        # winners (fastest OK run) needed to compute "time behind"
+        # -------------------------------------------
+        # 1) Determine winners (fastest OK run) per day, needed for "time behind"
+        # -------------------------------------------
         winners = {}  # day → fastest time
-        for day, runs in runs_by_day.items():
-            ok_times = [r.result for r in runs if r.status == Status.OK and r.result is not None]
-            winners[day] = min(ok_times) if ok_times else None
+        for _, runs in entries:
+            for day, (status, result) in runs.items():
+                if status == Status.OK and result is not None:
+                    best = winners.get(day)
+                    if best is None or result < best:
+                        winners[day] = result
 
         # -------------------------------------------
         # 2) Compute score for each run
         # -------------------------------------------
-        def score_for_run(run: Run) -> float:
-            if run.status != Status.OK:
+        def score_for_run(day: int, status: Status, time: int) -> float:
+            if status != Status.OK:
                 return 0
-            winner_time = winners.get(run.day)
+            winner_time = winners.get(day)
             if not winner_time:
                 return 0  # no winner that day
 
-            time = run.result
             time_behind = time - winner_time
 
             s = 100 * (2.0 - time_behind / (time - time_behind))
@@ -88,34 +132,29 @@ class Ranking:
         # -------------------------------------------
         aggregated: List[Ranking.Result] = []
 
-        for c in competitors:
-            # Collect runs in order of day
-            runs = {r.day: r for r in c.runs if 1 <= r.day <= days_to_calculate}
-
+        for c, runs in entries:
             scores = []
-            used_runs = []
+            ok_runs = []  # (score, result)
 
             for day in range(1, days_to_calculate + 1):
                 run = runs.get(day)
                 if run:
-                    s = score_for_run(run)
+                    status, result = run
+                    s = score_for_run(day, status, result)
                     scores.append(s)
-                    used_runs.append(run)
+                    if status == Status.OK:
+                        ok_runs.append((s, result))
                 else:
                     scores.append(0)
 
             # sort runs by score desc + time asc
-            ok_runs_sorted = sorted(
-                [r for r in used_runs if r.status == Status.OK],
-                key=lambda r: (score_for_run(r), -(r.result or 9999999)),
-                reverse=True,
-            )
+            ok_runs.sort(key=lambda r: (r[0], -(r[1] or 9999999)), reverse=True)
 
             # Take 3 best
-            best = ok_runs_sorted[:3]
+            best = ok_runs[:3]
 
-            total_score = sum(score_for_run(r) for r in best)
-            total_time = sum(r.result for r in best) if best else None
+            total_score = sum(s for s, _ in best)
+            total_time = sum(result for _, result in best) if best else None
 
             aggregated.append(Ranking.Result(c, scores, len(best), total_score, total_time))
 
@@ -1,20 +1,23 @@
 from o_event.analysis import Analysis
+from o_event.metrics import span
 from o_event.printer import Printer
 from o_event.models import Card, Competitor, Config, Course, CourseControl, Run, RunSplit
 from datetime import date
 from typing import List
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 
 class Receipt:
     WIDTH = 48
 
-    def __init__(self, db, result: Analysis.Result, card: Card, course: Course, controls: List[CourseControl]):
+    def __init__(self, db, result: Analysis.Result, card: Card, course: Course, controls: List[CourseControl],
+                 suggestion: str = None):
         self.db = db
         self.result = result
         self.card = card
         self.course = course
         self.controls = controls
+        self.suggestion = suggestion   # name of the course the punches fit, if not this one
 
         self._load_all()
 
@@ -24,7 +27,9 @@ class Receipt:
     def _load_all(self):
         card = self.card
 
-        competitor = (
+        # A card assigned by hand (e.g. rented) isn't registered under its number
+        run = self.db.get(Run, card.run_id) if card.run_id else None
+        competitor = run.competitor if run else (
             self.db.query(Competitor)
             .filter_by(sid=card.card_number)
             .first()
@@ -47,7 +52,8 @@ class Receipt:
         self.place = Config.get(self.db, Config.KEY_PLACE, "")
         self.race_date = Config.get(self.db, Config.KEY_DATE, date.today())
 
-        self._compute_times()
+        with span("receipt_times"):
+            self._compute_times()
 
     # ------------------------------------------------------------
     # Time calculations
@@ -71,24 +77,33 @@ class Receipt:
         last = 0
         self.cum_loss = 0
 
+        # Best leg times and leg lengths of the course, one query each
+        course_id = self.course.id
+        best_legs = dict(self.db.execute(
+            select(RunSplit.seq, func.min(RunSplit.leg_time))
+            .where(RunSplit.course_id == course_id)
+            .group_by(RunSplit.seq)
+        ).all())
+        leg_lengths = self.db.execute(
+            select(CourseControl.leg_length)
+            .where(CourseControl.course_id == course_id)
+            .order_by(CourseControl.seq)
+        ).scalars().all()
+
         def calc_leg_loss_pace(seq, time):
             if time is None:
                 return None, None, None
             leg = time - last if last is not None else None
 
-            best = (
-                self.db.query(func.min(RunSplit.leg_time))
-                .filter_by(course_id=self.course.id, seq=seq)
-                .scalar()
-            )
+            best = best_legs.get(seq)
 
             loss = 0 if leg is None or best is None or best >= leg else leg - best
             self.cum_loss += loss
 
-            control = self.controls[seq + 1]   # skip start
+            leg_length = leg_lengths[seq + 1]   # skip start
             pace_sec = None
-            if control.leg_length and leg is not None:
-                pace_sec = round(leg * 1000.0 / control.leg_length)
+            if leg_length and leg is not None:
+                pace_sec = round(leg * 1000.0 / leg_length)
             else:
                 pace_sec = None
             return leg, loss, pace_sec
@@ -197,6 +212,9 @@ class Receipt:
             p.text('пропуск: ' + ', '.join(f'{c}' for c in self.result.missing))
             p.text('\n')
 
+        if self.suggestion:
+            p.text(f'схоже на дистанцію: {self.suggestion}\n')
+
         # Footer
         cum_loss_s = f"+{self._fmt(self.cum_loss)}"
         p.text(f"поточне відставання: {cum_loss_s:>16}{'хв/км':>10}\n")
@@ -0,0 +1,209 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, update
+
+from o_event.analysis import Analysis
+from o_event.card_processor import (
+    PunchReadout,
+    actual_punches,
+    card_digest,
+    card_values,
+    incomplete,
+    required_codes,
+    run_values,
+    split_rows,
+    takes_over,
+)
+from o_event.metrics import span
+from o_event.models import Card, Competitor, Course, CourseControl, Run, RunSplit, Stage, Status
+
+
+class JournalReplay:
+    """
+    Bulk version of CardProcessor.handle_readout for a whole day.
+
+    Competitors, runs and courses are loaded once, readouts are analysed
+    in memory with the same helpers handle_readout uses and cards, splits
+    and run results are written with a few executemany statements. No
+    receipts are printed. Readouts already stored in `cards` are skipped,
+    like a re-read in handle_readout, so the same journal can be replayed
+    repeatedly; with reset=True the day's results are cleared first and
+    rebuilt from scratch.
+
+    A different readout for a run that already has a card is a DUP, like
+    in handle_readout, with lowest_digest_wins unless it takes the run
+    over (see card_processor.takes_over).
+
+    The caller commits.
+    """
+
+    @dataclass
+    class Stats:
+        processed: int = 0
+        skipped: int = 0      # stored already, or read out twice
+        errors: int = 0       # invalid payloads, competitors without a run
+        statuses: Counter = field(default_factory=Counter)
+
+    def __init__(self, db, day: int, lowest_digest_wins: bool = False):
+        self.db = db
+        self.day = day
+        self.lowest_digest_wins = lowest_digest_wins
+
+    def run(self, payloads: Iterable[bytes], reset: bool = False) -> "JournalReplay.Stats":
+        stats = JournalReplay.Stats()
+        readouts = []
+        for payload in payloads:
+            try:
+                readouts.append(PunchReadout.model_validate_json(payload))
+            except ValidationError:
+                stats.errors += 1
+
+        with span("replay_load"):
+            if reset:
+                self._reset({card_digest(r.model_dump()) for r in readouts})
+            self._load()
+
+        now = datetime.now()
+        with span("replay_analysis"):
+            for readout in readouts:
+                card = card_values(readout, now)
+                digest = card_digest(card["raw_json"])
+                if digest in self.present:
+                    stats.skipped += 1
+                    continue
+                try:
+                    status = self._assign(readout, card, digest)
+                except RuntimeError:
+                    stats.errors += 1
+                    continue
+                self.present.add(digest)
+                self.cards.append(card)
+                stats.processed += 1
+                stats.statuses[status] += 1
+
+        with span("replay_store"):
+            self._store()
+        return stats
+
+    def _reset(self, digests):
+        # Nothing's loaded into the session, no need to synchronize it
+        options = {"synchronize_session": False}
+        day_runs = select(Run.id).where(Run.day == self.day)
+        self.db.execute(delete(RunSplit).where(RunSplit.run_id.in_(day_runs)), execution_options=options)
+        self.db.execute(delete(Card).where(Card.run_id.in_(day_runs)), execution_options=options)
+        self.db.execute(
+            update(Run)
+            .where(Run.day == self.day)
+            .values(start=None, finish=None, result=None, status=Status.DNS),
+            execution_options=options,
+        )
+        # Unassigned cards don't know their day, only drop the replayed ones
+        unassigned = [
+            card_id
+            for card_id, raw_json in self.db.execute(select(Card.id, Card.raw_json).where(Card.run_id.is_(None)))
+            if card_digest(raw_json) in digests
+        ]
+        if unassigned:
+            self.db.execute(delete(Card).where(Card.id.in_(unassigned)), execution_options=options)
+
+    def _load(self):
+        db = self.db
+        # First match wins, like the queries in card_processor
+        self.competitors: Dict[int, tuple] = {}
+        for row in db.execute(select(Competitor.sid, Competitor.id, Competitor.group, Competitor.declared_days)
+                              .order_by(Competitor.id)):
+            self.competitors.setdefault(row.sid, row)
+
+        self.runs: Dict[int, int] = {}
+        for run_id, competitor_id in db.execute(select(Run.id, Run.competitor_id)
+                                                .where(Run.day == self.day).order_by(Run.id)):
+            self.runs.setdefault(competitor_id, run_id)
+
+        self.courses: Dict[str, tuple] = {}
+        stage_id = db.execute(select(Stage.id).where(Stage.day == self.day).order_by(Stage.id)).scalar()
+        if stage_id is not None:
+            codes = {}
+            for course_id, code in db.execute(
+                select(CourseControl.course_id, CourseControl.control_code)
+                .join(Course, Course.id == CourseControl.course_id)
+                .where(Course.stage_id == stage_id)
+                .order_by(CourseControl.course_id, CourseControl.seq)
+            ):
+                codes.setdefault(course_id, []).append(code)
+            for course_id, name in db.execute(select(Course.id, Course.name)
+                                              .where(Course.stage_id == stage_id).order_by(Course.id)):
+                self.courses.setdefault(name, (course_id, required_codes(codes.get(course_id, []))))
+
+        self.present = set()
+        # run id -> {digest: stored card id, or the new card's row}
+        self.assigned: Dict[int, dict] = {}
+        for card_id, run_id, raw_json in db.execute(select(Card.id, Card.run_id, Card.raw_json)):
+            digest = card_digest(raw_json)
+            self.present.add(digest)
+            if run_id is not None:
+                self.assigned.setdefault(run_id, {})[digest] = card_id
+
+        self.cards: List[dict] = []
+        self.released: List[int] = []
+        self.results: Dict[int, dict] = {}
+        self.splits: Dict[int, List[dict]] = {}
+
+    def _assign(self, readout: PunchReadout, card: dict, digest: str) -> str:
+        competitor = self.competitors.get(readout.cardNumber)
+        if competitor is None:
+            return "UNK"
+        run_id = self.runs.get(competitor.id)
+        if run_id is None:
+            raise RuntimeError("No run configured for current race day")
+        others = {d: c for d, c in self.assigned.get(run_id, {}).items() if d != digest}
+        if others:
+            if not (self.lowest_digest_wins and takes_over(readout, digest, others)):
+                return "DUP"
+            self._release(run_id, others.values())
+        missing = incomplete(readout)
+        if missing:
+            return missing
+
+        card["run_id"] = run_id
+        self.assigned.setdefault(run_id, {})[digest] = card
+
+        if self.day not in (competitor.declared_days or []) or competitor.group not in self.courses:
+            return "UNK_COURSE"
+        course_id, required = self.courses[competitor.group]
+
+        result = Analysis().analyse_order(required, actual_punches(readout))
+        values = self.results[run_id] = dict(id=run_id, **run_values(readout, result))
+        self.splits[run_id] = split_rows(run_id, course_id, result.visited, values["result"])
+        return values["status"].value
+
+    def _release(self, run_id, cards):
+        """
+        Take the run away from its cards, they become unassigned.
+        """
+        for card in cards:
+            if isinstance(card, dict):
+                card["run_id"] = None
+            else:
+                self.released.append(card)
+        self.assigned[run_id] = {}
+        self.results[run_id] = dict(id=run_id, start=None, finish=None, result=None, status=Status.DNS)
+        self.splits[run_id] = []
+
+    def _store(self):
+        db = self.db
+        if self.released:
+            db.execute(update(Card).where(Card.id.in_(self.released)).values(run_id=None),
+                       execution_options={"synchronize_session": False})
+        if self.cards:
+            db.execute(insert(Card), self.cards)
+        if self.splits:
+            db.execute(delete(RunSplit).where(RunSplit.run_id.in_(list(self.splits))))
+            rows = [split for splits in self.splits.values() for split in splits]
+            if rows:
+                db.execute(insert(RunSplit).execution_options(render_nulls=True), rows)
+        if self.results:
+            db.execute(update(Run), list(self.results.values()))
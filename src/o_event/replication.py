@@ -0,0 +1,201 @@
+import asyncio
+import gzip
+import json
+import socket
+import time
+import traceback
+from collections import Counter
+
+from fastapi import APIRouter, HTTPException, Request
+from sqlalchemy import and_, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from o_event.batcher import DatabaseUnavailable, NullPrinter
+from o_event.card_processor import CardProcessor
+from o_event.models import Card, Competitor, Config, ReplicatedCard, Run
+from o_event.replay import JournalReplay, card_digest
+
+
+PUSH_PATH = "/replication/push"
+
+
+# ------------------------------------------------------------
+# Wire format: gzipped JSON {"node": name, "changes": [change]},
+# change = {"digest": card digest, "day": race day, "sid": competitor
+# of the card's run or None, "raw_json": readout}
+# ------------------------------------------------------------
+
+def encode_batch(node: str, changes: list) -> bytes:
+    return gzip.compress(json.dumps({"node": node, "changes": changes}).encode("utf-8"))
+
+
+def decode_batch(body: bytes, encoding: str = None) -> dict:
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def apply_changes(db, changes: list) -> dict:
+    """
+    Store readouts replicated from another laptop. Readouts already here
+    (same digest) are skipped, conflicting replicated readouts for one
+    run are resolved by the lowest card digest, so every node pushing in
+    any order ends up with the same results. The central node's own
+    readouts stay DUPs for the secretary, like on any laptop. Cards
+    assigned by hand on the laptop are assigned here too.
+
+    The caller commits.
+    """
+    stats = {"received": len(changes), "stored": 0, "duplicates": 0, "errors": 0, "assigned": 0}
+    statuses = Counter()
+    by_day = {}
+    for change in changes:
+        raw_json = change.get("raw_json")
+        if not isinstance(raw_json, dict) or card_digest(raw_json) != change.get("digest"):
+            stats["errors"] += 1
+            continue
+        by_day.setdefault(change.get("day"), []).append(change)
+
+    for day, day_changes in sorted(by_day.items()):
+        day_changes.sort(key=lambda change: change["digest"])
+        payloads = [json.dumps(change["raw_json"]) for change in day_changes]
+        replay = JournalReplay(db, day, lowest_digest_wins=True).run(payloads)
+        stats["stored"] += replay.processed
+        stats["duplicates"] += replay.skipped
+        stats["errors"] += replay.errors
+        statuses.update(replay.statuses)
+        stats["assigned"] += apply_assignments(db, day, day_changes)
+    stats["statuses"] = dict(statuses)
+    return stats
+
+
+def apply_assignments(db, day: int, changes: list) -> int:
+    """
+    Assign the cards that were assigned by hand on the laptop, i.e. to the
+    run of another competitor than the card number's, the way the CLI
+    does. Returns how many runs changed.
+    """
+    assigned = 0
+    for change in changes:
+        sid = change.get("sid")
+        card_number = change["raw_json"].get("cardNumber")
+        if sid is None or sid == card_number:
+            continue
+        card = next(
+            (c for c in db.query(Card).filter(Card.card_number == card_number)
+             if card_digest(c.raw_json) == change["digest"]),
+            None,
+        )
+        competitor = db.query(Competitor).filter(Competitor.sid == sid).first()
+        if card is None or competitor is None:
+            continue
+        run = db.query(Run).filter(Run.day == day, Run.competitor_id == competitor.id).first()
+        if run is None or card.run_id == run.id:
+            continue
+        CardProcessor(defer_commit=True).handle_card(db, card, run, NullPrinter())
+        assigned += 1
+    return assigned
+
+
+def replication_router(batcher) -> APIRouter:
+    """
+    Endpoint of the central node, included into the card service. Pushed
+    changes are stored by the service's ReadoutBatcher, in order with its
+    own readouts.
+    """
+    router = APIRouter()
+
+    @router.post(PUSH_PATH)
+    async def push(request: Request):
+        try:
+            batch = decode_batch(await request.body(), request.headers.get("content-encoding"))
+        except (OSError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Bad replication batch: {e}")
+        changes = batch.get("changes", [])
+        try:
+            stats, _ = await asyncio.wrap_future(batcher.submit_call(lambda db: apply_changes(db, changes)))
+        except DatabaseUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        print(f"Replication from {batch.get('node')}: {stats}")
+        return stats
+
+    return router
+
+
+class ReplicationClient:
+    """
+    Pushes the cards read out on this laptop to the central node, in
+    batches of at most `batch_size`, remembering each pushed card with its
+    run in `replicated_cards`: a card is pushed again when its run changes,
+    e.g. when it's assigned by hand. Runs and splits aren't sent: the
+    central node computes them from the readouts.
+
+    `send(body, headers) -> dict` posts a batch, over HTTP by default.
+    """
+
+    def __init__(self, session_factory, url: str, node: str = None, batch_size: int = 500, send=None):
+        self.session_factory = session_factory
+        self.url = url.rstrip("/")
+        self.node = node or socket.gethostname()
+        self.batch_size = batch_size
+        self.send = send or self._post
+
+    def _post(self, body: bytes, headers: dict) -> dict:
+        import requests
+        response = requests.post(self.url + PUSH_PATH, data=body, headers=headers, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def pending(self, db):
+        """
+        Returns (rows, changes) of the next batch to push: cards not pushed
+        yet or whose run changed since.
+        """
+        current_day = Config.get_current_day(db)
+        rows = db.execute(
+            select(Card.id, Card.run_id, Card.raw_json, Run.day, Competitor.sid)
+            .outerjoin(Run, Run.id == Card.run_id)
+            .outerjoin(Competitor, Competitor.id == Run.competitor_id)
+            .outerjoin(ReplicatedCard, and_(ReplicatedCard.url == self.url, ReplicatedCard.card_id == Card.id))
+            .where(or_(ReplicatedCard.card_id.is_(None), Card.run_id.is_distinct_from(ReplicatedCard.run_id)))
+            .order_by(Card.id)
+            .limit(self.batch_size)
+        ).all()
+        changes = [
+            {"digest": card_digest(row.raw_json), "day": row.day or current_day, "sid": row.sid,
+             "raw_json": row.raw_json}
+            for row in rows
+        ]
+        return rows, changes
+
+    def push(self) -> int:
+        """
+        Push everything not pushed yet, returns the number of cards sent.
+        """
+        sent = 0
+        table = ReplicatedCard.__table__
+        with self.session_factory() as db:
+            table.create(db.get_bind(), checkfirst=True)
+            while True:
+                rows, changes = self.pending(db)
+                if not changes:
+                    return sent
+                headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+                stats = self.send(encode_batch(self.node, changes), headers)
+                print(f"Pushed {len(changes)} cards to {self.url}: {stats}")
+                upsert = sqlite_insert(table)
+                db.execute(
+                    upsert.on_conflict_do_update(index_elements=[table.c.url, table.c.card_id],
+                                                 set_={"run_id": upsert.excluded.run_id}),
+                    [dict(url=self.url, card_id=row.id, run_id=row.run_id) for row in rows],
+                )
+                db.commit()
+                sent += len(changes)
+
+    def run(self, interval: float = 2.0):
+        while True:
+            try:
+                self.push()
+            except Exception:
+                traceback.print_exc()
+            time.sleep(interval)
@@ -3,6 +3,7 @@
 from o_event.models import Competitor, Run, Config, Status
 from o_event.db import SessionLocal
 from o_event.ranking import Ranking
+from o_event.metrics import instrument
 from fastapi import FastAPI
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
@@ -11,7 +12,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 import uvicorn
 
-app = FastAPI()
+app = instrument(FastAPI())
 
 # Allow frontend to fetch JSON from the same server
 app.add_middleware(
@@ -0,0 +1,311 @@
+import json
+import math
+import random
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from o_event.baz_importer import BazImporter
+from o_event.iof_importer import IOFImporter, NS
+from o_event.models import Base, Config
+
+
+class SyntheticEvent:
+    """
+    Deterministic generator of a multi-day event for scale testing.
+
+    The same seed always gives the same course data (IOF 3.0 XML, one file
+    per day), BAZ entries (windows-1251 XML) and card readouts (JSON lines
+    in the format card_service receives), so benchmarks can be compared
+    run to run. Readouts include mispunches, extra punches, re-reads of
+    the same card and DNFs; some declared runners never show up (DNS).
+    """
+
+    # group name, share of the field, number of controls
+    GROUPS = [
+        ("Ч10", 6, 6), ("Ж10", 5, 6), ("Ч12", 8, 8), ("Ж12", 6, 8),
+        ("Ч14", 8, 11), ("Ж14", 7, 10), ("Ч16", 6, 14), ("Ж16", 5, 12),
+        ("Ч18", 4, 16), ("Ж18", 3, 14), ("Ч21Е", 8, 22), ("Ж21Е", 5, 18),
+        ("Ч21А", 6, 18), ("Ж21А", 4, 15), ("Ч35", 4, 16), ("Ж35", 3, 13),
+        ("Ч45", 4, 14), ("Ж45", 3, 12), ("Ч55", 3, 12), ("Ж55", 2, 10),
+        ("Чстуденти", 2, 14), ("Жстуденти", 2, 12),
+    ]
+
+    FIRST_NAMES = [
+        "Олександр", "Андрій", "Богдан", "Владислав", "Дмитро", "Іван", "Максим",
+        "Микола", "Олег", "Петро", "Роман", "Сергій", "Тарас", "Юрій", "Ярослав",
+        "Анна", "Вікторія", "Галина", "Дарина", "Ірина", "Катерина", "Марія",
+        "Наталія", "Оксана", "Олена", "Софія", "Тетяна", "Христина", "Юлія",
+    ]
+    LAST_NAMES = [
+        "Бондаренко", "Бойко", "Гнатюк", "Данилюк", "Захарченко", "Іваненко",
+        "Климчук", "Коваленко", "Кравець", "Левченко", "Литвиненко", "Мельник",
+        "Мороз", "Олійник", "Петренко", "Поліщук", "Руденко", "Савчук",
+        "Сидоренко", "Ткаченко", "Шевченко", "Шевчук", "Яковенко", "Ярошенко",
+    ]
+    CLUBS = [
+        "Азимут", "Вертикаль", "Вітрило", "Горизонт", "Дніпро", "Еверест",
+        "Компас", "Легенда", "Меридіан", "Навігатор", "Орієнтир", "Планета",
+        "Поділля", "Полісся", "Світанок", "Січ", "Сокіл", "Стріла", "Темп",
+        "Тур", "Фортуна", "Хвиля", "Чайка", "Юність",
+    ]
+    REGIONS = ["м.Київ", "Київська", "Житомирська", "Львівська", "Харківська", "Одеська"]
+
+    CONTROLS_PER_DAY = 60
+    AREA = (600.0, 450.0)   # map extent, metres
+
+    # share of runs with each kind of anomaly
+    DNS_RATE = 0.03
+    DNF_RATE = 0.01
+    MISPUNCH_RATE = 0.03
+    EXTRA_RATE = 0.05
+    REREAD_RATE = 0.02
+
+    @dataclass
+    class Files:
+        courses: Dict[int, Path] = field(default_factory=dict)
+        entries: Path = None
+        readouts: Dict[int, Path] = field(default_factory=dict)
+
+    def __init__(self, runners: int = 3000, days: int = 4, seed: int = 0):
+        self.runners = runners
+        self.days = days
+        self.seed = seed
+
+    def _random(self, *salt) -> random.Random:
+        # Independent stream per part, so e.g. changing the number of
+        # runners doesn't reshuffle the courses.
+        return random.Random("/".join(str(s) for s in (self.seed,) + salt))
+
+    # ------------------------------------------------------------
+    # Courses
+    # ------------------------------------------------------------
+    def controls(self, day: int) -> Dict[str, tuple]:
+        """
+        Returns {code: (x, y)} for start, controls and finish of a day.
+        """
+        rnd = self._random("controls", day)
+        w, h = self.AREA
+        points = {"S": (w / 2, 0.0)}
+        for i in range(self.CONTROLS_PER_DAY):
+            points[str(31 + i)] = (round(rnd.uniform(0, w), 2), round(rnd.uniform(0, h), 2))
+        points["F"] = (w / 2 + 10, 5.0)
+        return points
+
+    def courses(self, day: int) -> Dict[str, List[str]]:
+        """
+        Returns {course name: [control codes]}, start and finish excluded.
+        """
+        rnd = self._random("courses", day)
+        codes = [str(31 + i) for i in range(self.CONTROLS_PER_DAY)]
+        return {name: rnd.sample(codes, count) for name, _, count in self.GROUPS}
+
+    def course_xml(self, day: int) -> bytes:
+        ET.register_namespace("", NS.strip("{}"))
+
+        def sub(parent, tag, text=None, **attrs):
+            elem = ET.SubElement(parent, NS + tag, {k: str(v) for k, v in attrs.items()})
+            if text is not None:
+                elem.text = str(text)
+            return elem
+
+        stamp = f"2025-11-{10 + day:02}T12:00:00"
+        points = self.controls(day)
+
+        root = ET.Element(NS + "CourseData", iofVersion="3.0", createTime=stamp, creator="o-event synthetic")
+        sub(sub(root, "Event"), "Name", f"Synthetic day {day}")
+        data = sub(root, "RaceCourseData")
+
+        map_ = sub(data, "Map")
+        sub(map_, "Scale", 4000)
+        sub(map_, "MapPositionTopLeft", x=0, y=self.AREA[1])
+        sub(map_, "MapPositionBottomRight", x=self.AREA[0], y=0)
+
+        for code, (x, y) in points.items():
+            type_ = {"S": "Start", "F": "Finish"}.get(code, "Control")
+            control = sub(data, "Control", type=type_, modifyTime=stamp)
+            sub(control, "Id", code)
+            sub(control, "Position", lng=f"{30.3 + x / 70000:.10f}", lat=f"{50.4 + y / 111000:.10f}")
+            sub(control, "MapPosition", x=x, y=y)
+
+        for name, codes in self.courses(day).items():
+            legs = []
+            prev = points["S"]
+            for code in codes + ["F"]:
+                legs.append(round(math.dist(prev, points[code])))
+                prev = points[code]
+
+            course = sub(data, "Course", modifyTime=stamp)
+            sub(course, "Name", name)
+            sub(course, "Length", sum(legs))
+            sub(course, "Climb", 0)
+            sub(sub(course, "CourseControl", type="Start"), "Control", "S")
+            for code, leg in zip(codes + ["F"], legs):
+                cc = sub(course, "CourseControl", type="Finish" if code == "F" else "Control")
+                sub(cc, "Control", code)
+                sub(cc, "LegLength", leg)
+
+        ET.indent(root, "\t")
+        return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+    # ------------------------------------------------------------
+    # Entries
+    # ------------------------------------------------------------
+    def entries(self) -> List[dict]:
+        rnd = self._random("entries")
+        groups = [g for g, _, _ in self.GROUPS]
+        weights = [w for _, w, _ in self.GROUPS]
+        all_days = list(range(1, self.days + 1))
+
+        entries = []
+        for i in range(self.runners):
+            if rnd.random() < 0.7:
+                days = all_days
+            else:
+                days = sorted(rnd.sample(all_days, rnd.randint(1, self.days)))
+            group = rnd.choices(groups, weights)[0]
+            digits = "".join(ch for ch in group if ch.isdigit())
+            age = int(digits) - rnd.randint(0, 1) if digits else rnd.randint(18, 23)
+            entries.append({
+                "name": f"{rnd.choice(self.LAST_NAMES)} {rnd.choice(self.FIRST_NAMES)}",
+                "representative": f"{rnd.choice(self.LAST_NAMES)} {rnd.choice(self.FIRST_NAMES)}",
+                "code": 20000 + i,
+                "birthday": f"{rnd.randint(1, 28):02}.{rnd.randint(1, 12):02}.{2025 - age}",
+                "group": group,
+                "region": rnd.choice(self.REGIONS),
+                "club": f"{rnd.choice(self.CLUBS)}{'' if rnd.random() < 0.5 else ' ' + str(rnd.randint(1, 9))}",
+                "days": days,
+            })
+        return entries
+
+    def baz_xml(self) -> bytes:
+        root = ET.Element("UOFData")
+        for tag, text in (
+            ("UOFVersion", "0.1.0"),
+            ("CreateProgram", "o-event synthetic"),
+            ("Names", "Synthetic event"),
+            ("Period", f"11.11.2025 - {10 + self.days}.11.2025"),
+        ):
+            ET.SubElement(root, tag).text = text
+
+        for e in self.entries():
+            s = ET.SubElement(root, "Sportsman")
+            for tag, text in (
+                ("Predst", e["representative"]),
+                ("FIO", e["name"]),
+                ("FOUCode", e["code"]),
+                ("FSOU", 0),
+                ("Birthday", e["birthday"]),
+                ("Group", e["group"]),
+                ("Region", e["region"]),
+                ("Club", e["club"]),
+                ("RelayLeg", 0),
+                ("ProgEvent", ",".join(str(d) for d in e["days"])),
+            ):
+                ET.SubElement(s, tag).text = str(text)
+
+        ET.indent(root, "")
+        return ET.tostring(root, encoding="windows-1251", xml_declaration=True)
+
+    # ------------------------------------------------------------
+    # Readouts
+    # ------------------------------------------------------------
+    def readouts(self, day: int, runners: List[dict]) -> List[dict]:
+        """
+        Card readouts for a day in finish order. `runners` is the parsed
+        entry list in import order, i.e. runners[i] gets card number i + 1
+        (see BazImporter.import_competitors).
+        """
+        rnd = self._random("readouts", day)
+        points = self.controls(day)
+        courses = self.courses(day)
+        codes = [c for c in points if c.isdigit()]
+
+        reads = []
+        for sid, runner in enumerate(runners, start=1):
+            if day not in runner["days"] or runner["group"] not in courses:
+                continue
+            roll = rnd.random()
+            if roll < self.DNS_RATE:
+                continue
+
+            course = list(courses[runner["group"]])
+            pace = rnd.uniform(0.35, 1.2)   # seconds per metre
+            start = 36000 + 60 * rnd.randint(0, 180)
+
+            dnf = roll < self.DNS_RATE + self.DNF_RATE
+            if dnf:
+                course = course[:rnd.randint(0, len(course) - 1)]
+            elif rnd.random() < self.MISPUNCH_RATE:
+                del course[rnd.randrange(len(course))]
+
+            visits = []
+            t = start
+            prev = points["S"]
+            for code in course:
+                t += int(math.dist(prev, points[code]) * pace * rnd.uniform(0.9, 1.4)) + 3
+                visits.append((int(code), t))
+                prev = points[code]
+            if visits and rnd.random() < self.EXTRA_RATE:
+                pos = rnd.randrange(len(visits))
+                visits.insert(pos, (int(rnd.choice(codes)), visits[pos][1] - rnd.randint(1, 10)))
+            finish = 0xeeee if dnf else t + int(math.dist(prev, points["F"]) * pace) + 3
+
+            readout = {
+                "stationNumber": 1,
+                "cardNumber": sid,
+                "startTime": start,
+                "finishTime": finish,
+                "checkTime": start - 120,
+                "punches": [{"cardNumber": sid, "code": code, "time": t} for code, t in visits],
+            }
+            reads.append((finish if not dnf else t + 1800, readout))
+            if rnd.random() < self.REREAD_RATE:
+                reads.append((reads[-1][0] + rnd.randint(5, 600), readout))
+
+        reads.sort(key=lambda r: r[0])
+        return [r for _, r in reads]
+
+    # ------------------------------------------------------------
+    # Files and database
+    # ------------------------------------------------------------
+    def write(self, directory) -> "SyntheticEvent.Files":
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        files = SyntheticEvent.Files()
+
+        for day in range(1, self.days + 1):
+            files.courses[day] = directory / f"courses-{day}.xml"
+            files.courses[day].write_bytes(self.course_xml(day))
+
+        files.entries = directory / "entries.xml"
+        files.entries.write_bytes(self.baz_xml())
+
+        # Card numbers follow the importer's ordering of the entries
+        runners = BazImporter().parse_runners(files.entries)
+        for day in range(1, self.days + 1):
+            files.readouts[day] = directory / f"readouts-{day}.jsonl"
+            with open(files.readouts[day], "w", encoding="utf-8") as f:
+                for readout in self.readouts(day, runners):
+                    f.write(json.dumps(readout) + "\n")
+
+        return files
+
+    def load(self, db, files: "SyntheticEvent.Files"):
+        """
+        Create the schema and import the generated courses and entries
+        with the regular importers. Readouts are left for the caller.
+        """
+        Base.metadata.create_all(db.get_bind())
+        Config.create(db, "Synthetic event", "2025-11-11", "Головний суддя", "Головний секретар", "Київ")
+        Config.set(db, Config.KEY_CURRENT_DAY, 1)
+
+        importer = IOFImporter(db)
+        for day, path in sorted(files.courses.items()):
+            stage = importer.import_stage(str(path), day=day, stage_name=f"День {day}")
+            stage.date = datetime(2025, 11, 10 + day)
+        db.commit()
+
+        BazImporter().import_competitors(db, files.entries)
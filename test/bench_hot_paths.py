@@ -0,0 +1,234 @@
+"""
+Benchmarks of the hot paths on synthetic events of several sizes.
+
+Not collected by the regular test run; use `make bench` to compare with
+the saved baseline and `make bench-baseline` to record a new one.
+Sizes (number of runners) can be overridden, e.g. BENCH_SIZES=3000 for
+a full-scale event (preparing it takes a few minutes).
+"""
+import importlib.util
+import json
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from o_event.analysis import Analysis
+from o_event.card_processor import CardProcessor, PunchReadout, get_course_for_card
+from o_event.course_index import course_index
+from o_event.iof_exporter import IOFExporter
+from o_event.iof_importer import IOFImporter
+from o_event.models import Base, Card, Competitor, Config, CourseControl, Run
+from o_event.ranking import Ranking
+from o_event.receipt import Receipt
+from o_event.show_service import compute_group_results
+from o_event.synthetic import SyntheticEvent
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from test_all import MockPrinter
+
+
+SIZES = [int(s) for s in os.environ.get("BENCH_SIZES", "200,1000").split(",")]
+DAYS = 2
+SAMPLE = 20
+
+
+def load_arrange_start():
+    path = Path(__file__).parent.parent / "arrange-start.py"
+    spec = importlib.util.spec_from_file_location("arrange_start", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Event:
+    """
+    A synthetic event imported into an in-memory database, with the
+    readouts of every day already processed.
+    """
+
+    def __init__(self, runners, directory):
+        self.runners = runners
+        self.synthetic = SyntheticEvent(runners=runners, days=DAYS, seed=runners)
+        self.files = self.synthetic.write(directory)
+
+        self.db = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+        self.synthetic.load(self.db, self.files)
+
+        self.readouts = {}
+        for day in range(1, DAYS + 1):
+            Config.set(self.db, Config.KEY_CURRENT_DAY, day)
+            lines = self.files.readouts[day].read_text(encoding="utf-8").splitlines()
+            self.readouts[day] = [PunchReadout.model_validate_json(line) for line in lines]
+            for readout in self.readouts[day]:
+                CardProcessor().handle_readout(self.db, readout, MockPrinter())
+        Config.set(self.db, Config.KEY_CURRENT_DAY, 1)
+
+    def sample(self, day=1):
+        return random.Random(self.runners).sample(self.readouts[day], SAMPLE)
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda n: f"{n}runners")
+def event(request, tmp_path_factory):
+    return Event(request.param, tmp_path_factory.mktemp(f"event{request.param}"))
+
+
+# ------------------------------------------------------------
+# Readout path
+# ------------------------------------------------------------
+@pytest.mark.parametrize("controls", [10, 25, 60])
+def test_analyse_order(benchmark, controls):
+    rnd = random.Random(controls)
+    courses = []
+    for _ in range(50):
+        required = rnd.sample(range(31, 131), controls)
+        punches = [(code, 30 * i) for i, code in enumerate(required) if rnd.random() > 0.05]
+        for _ in range(controls // 10):
+            pos = rnd.randrange(len(punches) + 1)
+            punches.insert(pos, (rnd.randrange(31, 131), 30 * pos - 1))
+        courses.append((required, punches))
+
+    def run():
+        for required, punches in courses:
+            Analysis().analyse_order(required, punches)
+
+    benchmark(run)
+
+
+def test_handle_readout(benchmark, event):
+    sample = event.sample()
+
+    def run():
+        for readout in sample:
+            CardProcessor().handle_readout(event.db, readout, MockPrinter())
+
+    benchmark.pedantic(run, rounds=5, warmup_rounds=1)
+
+
+def test_course_rank(benchmark, event):
+    index = course_index(event.db, 1)
+    punches = [[(p.code, p.time - r.startTime) for p in r.punches] for r in event.sample()]
+
+    def run():
+        for card in punches:
+            index.rank([code for code, _ in card])
+
+    benchmark(run)
+
+
+def test_receipt(benchmark, event):
+    inputs = []
+    for readout in event.sample():
+        card = (
+            event.db.query(Card)
+            .filter(Card.card_number == readout.cardNumber, Card.run_id != None)   # noqa: E711
+            .order_by(Card.id.desc())
+            .first()
+        )
+        if card is None:
+            continue
+        competitor = event.db.query(Competitor).filter_by(sid=card.card_number).one()
+        course = get_course_for_card(event.db, 1, competitor)
+        controls = (
+            event.db.query(CourseControl)
+            .filter(CourseControl.course_id == course.id)
+            .order_by(CourseControl.seq)
+            .all()
+        )
+        required = [int(c.control_code) for c in controls if c.control_code.isdigit()]
+        punches = [(p.code, p.time - readout.startTime) for p in readout.punches]
+        inputs.append((Analysis().analyse_order(required, punches), card, course, controls))
+
+    def run():
+        for result, card, course, controls in inputs:
+            Receipt(event.db, result, card, course, controls).print(MockPrinter())
+
+    benchmark.pedantic(run, rounds=5, warmup_rounds=1)
+
+
+# ------------------------------------------------------------
+# Results
+# ------------------------------------------------------------
+def test_rank(benchmark, event):
+    groups = {}
+    for run in event.db.query(Run).join(Competitor).filter(Run.day == 1):
+        groups.setdefault(run.competitor.group, []).append(run)
+
+    def run():
+        for runs in groups.values():
+            Ranking().rank(runs)
+
+    benchmark(run)
+
+
+def test_rank_multiday(benchmark, event):
+    competitors = (
+        event.db.query(Competitor)
+        .options(selectinload(Competitor.runs))
+        .all()
+    )
+    groups = {}
+    for c in competitors:
+        groups.setdefault(c.group, []).append(c)
+
+    def run():
+        for members in groups.values():
+            Ranking().rank_multiday(DAYS, members)
+
+    benchmark(run)
+
+
+def test_rank_multiday_all(benchmark, event):
+    benchmark(lambda: Ranking().rank_multiday_all(event.db, DAYS))
+
+
+def test_compute_group_results(benchmark, event):
+    benchmark(lambda: compute_group_results(event.db, 1))
+
+
+def test_export_iof(benchmark, event):
+    exporter = IOFExporter()
+
+    def run():
+        event.db.expire_all()
+        return exporter.export_iof(exporter.map_result_list(event.db, 1))
+
+    benchmark.pedantic(run, rounds=5, warmup_rounds=1)
+
+
+# ------------------------------------------------------------
+# Preparation
+# ------------------------------------------------------------
+def test_import_stage(benchmark, tmp_path):
+    path = tmp_path / "courses.xml"
+    path.write_bytes(SyntheticEvent().course_xml(1))
+
+    def setup():
+        db = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+        Base.metadata.create_all(db.get_bind())
+        return (db,), {}
+
+    def run(db):
+        IOFImporter(db).import_stage(str(path), day=1)
+        db.commit()
+
+    benchmark.pedantic(run, setup=setup, rounds=10)
+
+
+def test_assign_start_slots(benchmark, event, capsys):
+    arrange_start = load_arrange_start()
+
+    def run():
+        arrange_start.assign_start_slots(event.db, 1, parallel_starts=4, seed=1)
+        event.db.commit()
+
+    benchmark.pedantic(run, rounds=3)
+
+    slots = [r.start_slot for r in event.db.query(Run).filter(Run.day == 1)]
+    assert all(s is not None for s in slots)
+    assert json.loads(Config.get(event.db, Config.KEY_START_SEEDS))["1"] == [1]
@@ -0,0 +1,15 @@
+import pytest
+
+from o_event import querylog
+
+
+@pytest.fixture
+def max_queries():
+    """
+    Pin the SQL statement budget of a block:
+
+        def test_export(max_queries):
+            with max_queries(5, "export"):
+                IOFExporter().map_result_list(db, 1)
+    """
+    return querylog.max_queries
@@ -3,6 +3,7 @@ from o_event.iof_importer import IOFImporter
 from o_event.baz_importer import BazImporter
 from o_event.card_processor import CardProcessor, PunchReadout
 from o_event.iof_exporter import IOFExporter
+from o_event.ranking import Ranking
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -32,7 +33,7 @@ class MockPrinter:
         return ''.join(self.parts).split('\n')
 
 
-def test_all():
+def test_all(max_queries):
     engine = create_engine("sqlite:///:memory:")
     Base.metadata.create_all(engine)
     Session = sessionmaker(bind=engine)
@@ -73,7 +74,9 @@ def test_all():
         ]}"""
     readout = PunchReadout.model_validate_json(runner16)
     with MockPrinter() as printer:
-        assert CardProcessor().handle_readout(session, readout, printer) == {"status": "OK"}
+        # Including the lookup of an identical stored card (a re-read)
+        with max_queries(20, "readout"):
+            assert CardProcessor().handle_readout(session, readout, printer) == {"status": "OK"}
         receipt16 = [
             '================================================',
             'E1 - O-Halloween',
@@ -158,7 +161,9 @@ def test_all():
         ]}"""
     readout = PunchReadout.model_validate_json(runner149)
     with MockPrinter() as printer:
-        assert CardProcessor().handle_readout(session, readout, printer) == {"status": "MP"}
+        # MP: two more to build the course index for the suggestion
+        with max_queries(22, "readout"):
+            assert CardProcessor().handle_readout(session, readout, printer) == {"status": "MP"}
         receipt149 = [
             '================================================',
             'E1 - O-Halloween',
@@ -246,7 +251,8 @@ def test_all():
         ]}"""
     readout = PunchReadout.model_validate_json(runner32)
     with MockPrinter() as printer:
-        assert CardProcessor().handle_readout(session, readout, printer) == {"status": "OK"}
+        with max_queries(20, "readout"):
+            assert CardProcessor().handle_readout(session, readout, printer) == {"status": "OK"}
         #with open("/tmp/c.txt", "w") as f:
         #    f.write(printer.get_output())
         receipt32 = [
@@ -313,7 +319,8 @@ def test_all():
         assert printer.get_output() == receipt32
 
         iof_exporter = IOFExporter()
-        result = iof_exporter.map_result_list(session, day=1)
+        with max_queries(5, "export"):
+            result = iof_exporter.map_result_list(session, day=1)
         assert result.event.name == 'O-Halloween'
         assert len(result.classes) == 1
         cl = result.classes[0]
@@ -349,3 +356,13 @@ def test_all():
         assert r.timeBehind is None
         assert r.position is None
         assert r.status == 'MissingPunch'
+
+    with max_queries(1, "rank_multiday_all"):
+        ranked = Ranking().rank_multiday_all(session, 2)
+    assert list(ranked) == sorted(ranked)
+    top = [(place, r.competitor.name, r.best_count, round(r.total_score, 2), r.total_time) for place, r in ranked['Ч21Е'][:3]]
+    assert top == [
+        (1, 'Король Артур', 1, 200.0, 1906),
+        (2, 'Лисенко Віктор', 1, 197.43, 1955),
+        (None, 'Савченко Ігор', 0, 0, None),
+    ]
@@ -0,0 +1,202 @@
+import sqlite3
+import time
+
+import pytest
+
+from o_event import metrics
+from o_event.batcher import ReadoutBatcher
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.journal import Journal
+from o_event.models import Card, Competitor, JournalCheckpoint, Run
+from o_event.synthetic import SyntheticEvent
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from test_all import MockPrinter
+
+
+def make_event(tmp_path, name):
+    event = SyntheticEvent(runners=100, days=1, seed=3)
+    files = event.write(tmp_path / "event")
+    Session = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / name}"))
+    with Session() as session:
+        event.load(session, files)
+    lines = files.readouts[1].read_text(encoding="utf-8").splitlines()
+    return Session, [line.encode("utf-8") for line in lines]
+
+
+def test_journal_torn_tail(tmp_path):
+    path = tmp_path / "readouts.journal"
+    with Journal(path) as journal:
+        first = journal.append(b"one")
+        second = journal.append(b"two")
+    assert list(Journal.read(path)) == [(first, b"one"), (second, b"two")]
+    assert list(Journal.read(path, first)) == [(second, b"two")]
+
+    # A crash in the middle of a record
+    with open(path, "ab") as f:
+        f.write(Journal.HEADER.pack(5, 0) + b"th")
+    with Journal(path) as journal:
+        assert path.stat().st_size == second
+        third = journal.append(b"three")
+    assert [payload for _, payload in Journal.read(path)] == [b"one", b"two", b"three"]
+    assert third == path.stat().st_size
+
+
+def test_batched_like_sequential(tmp_path):
+    Session, payloads = make_event(tmp_path, "sequential.db")
+    with Session() as session:
+        expected = [
+            CardProcessor().handle_readout(session, PunchReadout.model_validate_json(p), MockPrinter())
+            for p in payloads
+        ]
+        runs = sorted((r.competitor_id, r.status) for r in session.query(Run))
+
+    Session, payloads = make_event(tmp_path, "batched.db")
+    journal = tmp_path / "readouts.journal"
+    batcher = ReadoutBatcher(Session, journal, interval=0.01, max_batch=16, printer_factory=MockPrinter)
+    batcher.start()
+    futures = [batcher.submit(p) for p in payloads]
+    results = [f.result(timeout=60) for f in futures]
+    batcher.stop()
+
+    assert [result for result, _ in results] == expected
+    assert any("=====" in line for _, output in results for line in output)
+    with Session() as session:
+        assert sorted((r.competitor_id, r.status) for r in session.query(Run)) == runs
+        assert session.get(JournalCheckpoint, str(journal)).offset == journal.stat().st_size
+
+    # The worker's statements count for the submitter, e.g. the request
+    batcher = ReadoutBatcher(Session, journal, printer_factory=MockPrinter)
+    batcher.start()
+    with metrics.count_queries() as queries:
+        batcher.submit(payloads[-1]).result(timeout=60)
+    batcher.stop()
+    assert queries.count > 0
+
+
+def test_recover(tmp_path):
+    Session, payloads = make_event(tmp_path, "race.db")
+    journal = tmp_path / "readouts.journal"
+
+    batcher = ReadoutBatcher(Session, journal, printer_factory=MockPrinter)
+    batcher.start()
+    batcher.submit(payloads[0]).result(timeout=60)
+    batcher.stop()
+
+    # Acknowledged, then the process died before the commit
+    with Journal(journal) as j:
+        for p in payloads[1:5]:
+            j.append(p)
+
+    batcher = ReadoutBatcher(Session, journal, printer_factory=MockPrinter)
+    batcher.start()
+    batcher.stop()
+    with Session() as session:
+        assert session.query(Card).count() == 5
+        assert session.get(JournalCheckpoint, str(journal)).offset == journal.stat().st_size
+
+    # Nothing left to recover, even without the checkpoint
+    with Session() as session:
+        session.query(JournalCheckpoint).delete()
+        session.commit()
+    batcher = ReadoutBatcher(Session, journal)
+    batcher.start()
+    batcher.stop()
+    with Session() as session:
+        assert session.query(Card).count() == 5
+
+
+def test_offline_while_locked(tmp_path):
+    Session, payloads = make_event(tmp_path, "race.db")
+    Session.configure(bind=create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={"timeout": 0.1}))
+    journal = tmp_path / "readouts.journal"
+    printers = []
+
+    def printer_factory():
+        printers.append(MockPrinter())
+        return printers[-1]
+
+    batcher = ReadoutBatcher(Session, journal, interval=0.01, printer_factory=printer_factory,
+                             retry_interval=0.05)
+    batcher.start()
+    assert "error" not in batcher.submit(payloads[0]).result(timeout=60)[0]
+
+    # An exporter or the CLI holds the database
+    lock = sqlite3.connect(tmp_path / "race.db")
+    lock.execute("BEGIN EXCLUSIVE")
+    results = [batcher.submit(p).result(timeout=60)[0] for p in payloads[1:4]]
+    assert [r["status"] for r in results] == ["PENDING"] * 3
+    assert "o_event_pending_readouts 3" in metrics.render()
+    receipts = len(printers)
+
+    lock.rollback()
+    deadline = time.monotonic() + 10
+    while batcher.offline and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not batcher.offline
+    assert "o_event_pending_readouts 0" in metrics.render()
+    assert batcher.submit(payloads[4]).result(timeout=60)[0]["status"] != "PENDING"
+    batcher.stop()
+
+    with Session() as session:
+        assert session.query(Card).count() == 5
+        # The PENDING ones got their receipts once stored, before the next readout
+        pending = [PunchReadout.model_validate_json(p).cardNumber for p in payloads[1:4]]
+        assigned = session.query(Card).filter(Card.card_number.in_(pending), Card.run_id.is_not(None)).count()
+    printed = [p.get_output() for p in printers[receipts:-1]]
+    assert len(printed) == assigned > 0
+    assert all(any("=====" in line for line in output) for output in printed)
+
+
+def test_failed_readout(tmp_path):
+    Session, payloads = make_event(tmp_path, "race.db")
+    readouts = [PunchReadout.model_validate_json(p) for p in payloads[:4]]
+    with Session() as session:
+        # A competitor without a run today
+        competitor = session.query(Competitor).filter(Competitor.sid == readouts[1].cardNumber).one()
+        session.query(Run).filter(Run.competitor_id == competitor.id).delete()
+        session.commit()
+
+    journal = tmp_path / "readouts.journal"
+    batcher = ReadoutBatcher(Session, journal, interval=0.5, printer_factory=MockPrinter)
+    batcher.start()
+    futures = [batcher.submit(p) for p in payloads[:4]]
+    with pytest.raises(RuntimeError):
+        futures[1].result(timeout=60)
+    results = [futures[i].result(timeout=60)[0] for i in (0, 2, 3)]
+    assert not batcher.offline
+    batcher.stop()
+
+    assert all(r["status"] != "PENDING" for r in results)
+    with Session() as session:
+        numbers = {c.card_number for c in session.query(Card)}
+        assert readouts[1].cardNumber not in numbers
+        assert {readouts[i].cardNumber for i in (0, 2, 3)} <= numbers
+
+
+def test_one_commit_per_batch(tmp_path):
+    Session, payloads = make_event(tmp_path, "race.db")
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    Session.configure(bind=engine)
+    statements = []
+
+    @event.listens_for(engine, "connect")
+    def trace(dbapi_connection, record):
+        # What SQLite runs, including pysqlite's own BEGIN and COMMIT
+        dbapi_connection.set_trace_callback(lambda sql: statements.append(sql.split()[0].upper()))
+
+    batcher = ReadoutBatcher(Session, tmp_path / "readouts.journal", interval=0.5, printer_factory=MockPrinter)
+    batcher.start()
+    statements.clear()
+    futures = [batcher.submit(p) for p in payloads[:30]]
+    for future in futures:
+        future.result(timeout=60)
+    batcher.stop()
+
+    # The readouts' savepoints are nested in the batch's transaction
+    assert statements.count("SAVEPOINT") == 30
+    assert statements.count("BEGIN") == statements.count("COMMIT") == 1
+    begin, commit = statements.index("BEGIN"), statements.index("COMMIT")
+    assert all(begin < i < commit for i, sql in enumerate(statements) if sql in ("SAVEPOINT", "RELEASE"))
@@ -0,0 +1,80 @@
+from o_event.models import Base, Card, Competitor, Run, Status
+from o_event.baz_importer import BazImporter
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from pathlib import Path
+
+
+DATA_PATH = Path(__file__).parent / "data" / "baz.xml"
+
+
+def make_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_merge(tmp_path):
+    session = make_session()
+    BazImporter().import_competitors(session, DATA_PATH)
+    assert session.query(Competitor).count() == 156
+    assert session.query(Run).count() == 273
+
+    # Merging the same file changes nothing
+    BazImporter().import_competitors(session, DATA_PATH, merge=True)
+    assert session.query(Competitor).count() == 156
+    assert session.query(Run).count() == 273
+
+    # Лисенко Віктор (sid 16) already finished day 1, Гончар Кирило (sid 6)
+    # has a card assigned for it, Король Артур (sid 32) has a start slot
+    runs = {c.sid: next(r for r in c.runs if r.day == 1)
+            for c in session.query(Competitor).filter(Competitor.sid.in_([5, 6, 16, 32]))}
+    runs[16].result = 1955
+    runs[16].status = Status.OK
+    session.add(Card(card_number=6, run_id=runs[6].id, raw_json={}))
+    runs[32].start_slot = 12
+    session.commit()
+
+    text = DATA_PATH.read_text(encoding="cp1251")
+
+    def edit(name, old, new):
+        nonlocal text
+        head, tail = text.split(f"<FIO>{name}</FIO>", 1)
+        text = head + f"<FIO>{name}</FIO>" + tail.replace(old, new, 1)
+
+    # Runners 5, 6, 16 and 32 drop day 1, Король Артур also changes group
+    for name in ("Мороз Уляна", "Гончар Кирило", "Лисенко Віктор", "Король Артур"):
+        edit(name, "<ProgEvent>1,2</ProgEvent>", "<ProgEvent>2</ProgEvent>")
+    edit("Король Артур", "<Group>Ч21Е</Group>", "<Group>Ч21А</Group>")
+    # A late entry
+    text = text.replace("</UOFData>", """<Sportsman>
+<FIO>Новенький Петро</FIO>
+<Group>Ч21А</Group>
+<Club>Oxygen</Club>
+<ProgEvent>2</ProgEvent>
+</Sportsman>
+</UOFData>""")
+    fresh = tmp_path / "baz.xml"
+    fresh.write_text(text, encoding="cp1251")
+
+    BazImporter().import_competitors(session, fresh, merge=True)
+    session.expire_all()
+
+    assert session.query(Competitor).count() == 157
+    late = session.query(Competitor).filter_by(name="Новенький Петро").one()
+    assert late.sid == 157
+    assert [r.day for r in late.runs] == [2]
+
+    # Only the untouched run is removed: the finished run, the run with
+    # a card and the run with a start slot stay though day 1 is dropped
+    days = {c.sid: sorted(r.day for r in c.runs)
+            for c in session.query(Competitor).filter(Competitor.sid.in_([5, 6, 16, 32]))}
+    assert days == {5: [2], 6: [1, 2], 16: [1, 2], 32: [1, 2]}
+    runner16 = session.query(Competitor).filter_by(sid=16).one()
+    assert runner16.declared_days == [2]
+    assert sorted((r.day, r.result) for r in runner16.runs) == [(1, 1955), (2, None)]
+
+    runner32 = session.query(Competitor).filter_by(sid=32).one()
+    assert runner32.name == "Король Артур"
+    assert runner32.group == "Ч21А"
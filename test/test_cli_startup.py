@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Time budget from starting the import of cli.py to the first prompt
+# rendered, in microseconds
+FIRST_PROMPT_BUDGET_US = 500_000
+
+# Modules that must only be loaded once a command needs them
+DEFERRED = ("sqlalchemy", "rapidfuzz", "requests", "yaml", "pydantic", "tabulate", "o_event", "app")
+
+# Starts the CLI on a pipe, reports the time to the first prompt render and
+# the top-level modules loaded by then, then quits
+FIRST_PROMPT = """
+import json, sys, time
+started = time.perf_counter()
+from prompt_toolkit.input import create_pipe_input
+from prompt_toolkit.output import DummyOutput
+import cli
+
+rendered = {"text": ""}
+
+class Output(DummyOutput):
+    def write(self, data):
+        rendered["text"] += data
+
+    def flush(self):
+        if "us" not in rendered:
+            rendered["us"] = int((time.perf_counter() - started) * 1e6)
+            rendered["modules"] = sorted({name.split(".")[0] for name in sys.modules})
+
+with create_pipe_input() as pipe:
+    pipe.send_text("quit\\n")
+    cli.Cli(input=pipe, output=Output()).run()
+print(json.dumps(rendered))
+"""
+
+
+def first_prompt(cwd) -> dict:
+    import json
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT / "src"), str(ROOT)]))
+    env.pop("O_EVENT_DB", None)
+    proc = subprocess.run(
+        [sys.executable, "-c", FIRST_PROMPT],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def test_cli_first_prompt(tmp_path):
+    from o_event.models import Base, Config
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        Config.set(db, Config.KEY_CURRENT_DAY, 2)
+
+    rendered = first_prompt(tmp_path)
+
+    assert not set(rendered["modules"]) & set(DEFERRED)
+    assert rendered["us"] < FIRST_PROMPT_BUDGET_US
+    # The day is loaded right after
+    assert "E2>" in rendered["text"]
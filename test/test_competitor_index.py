@@ -0,0 +1,83 @@
+from o_event.models import Base, Competitor
+from o_event.baz_importer import BazImporter
+from app.cli.competitor_utils import CompetitorUtils
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from pathlib import Path
+
+
+def test_filter_competitors():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    BazImporter().import_competitors(session, Path(__file__).parent / "data" / "baz.xml")
+
+    utils = CompetitorUtils(session)
+
+    assert len(utils.filter_competitors()) == 156
+
+    # Exact card number
+    assert [c.name for _, c in utils.filter_competitors("16")] == ["Лисенко Віктор"]
+
+    # Exact club reg
+    assert {c.reg for _, c in utils.filter_competitors("zls")} == {"ZLS"}
+
+    # Fuzzy, both in Cyrillic and transliterated
+    names = [c.name for _, c in utils.filter_competitors("Лисенко")]
+    assert "Лисенко Віктор" in names
+    assert names == [c.name for _, c in utils.filter_competitors("lysenko")]
+
+    # Incremental update after an edit
+    comp = session.query(Competitor).filter_by(sid=16).one()
+    comp.name = "Лисенко-Шевчук Віктор"
+    session.commit()
+    utils.index.update(session, comp)
+    assert [c.name for _, c in utils.filter_competitors("шевчук")][-1] == "Лисенко-Шевчук Віктор"
+
+
+def test_competitor_lines():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    BazImporter().import_competitors(session, Path(__file__).parent / "data" / "baz.xml")
+    utils = CompetitorUtils(session)
+
+    # Without a query the rows are streamed newest first, no index needed
+    lines = utils.competitor_lines()
+    assert next(lines).split()[0] == "156"
+    assert utils.index.stamp is None
+    assert len(list(lines)) == 155
+
+    # Best match first
+    assert "Лисенко Віктор" in next(utils.competitor_lines("16"))
+
+
+def test_edited_elsewhere(tmp_path):
+    # Two engines stand for two processes sharing the same race.db
+    url = f"sqlite:///{tmp_path / 'race.db'}"
+    Base.metadata.create_all(create_engine(url))
+    session = sessionmaker(bind=create_engine(url))()
+    other = sessionmaker(bind=create_engine(url))()
+    BazImporter().import_competitors(other, Path(__file__).parent / "data" / "baz.xml")
+
+    utils = CompetitorUtils(session)
+    assert [c.name for _, c in utils.filter_competitors("16")] == ["Лисенко Віктор"]
+
+    # In-place edits, same count and ids: in the CLI...
+    edited = CompetitorUtils(other).competitor_to_dict(other.query(Competitor).filter_by(sid=16).one())
+    CompetitorUtils(other).update_competitor_from_dict(dict(edited, name="Лисенко-Шевчук Віктор"))
+    other.commit()
+    session.commit()
+    assert "Лисенко-Шевчук Віктор" in [c.name for _, c in utils.filter_competitors("шевчук")]
+
+    # ...and in bulk, by a merge re-import
+    data = Path(__file__).parent / "data" / "baz.xml"
+    text = data.read_text(encoding="cp1251")
+    head, tail = text.split("<FIO>Король Артур</FIO>", 1)
+    fresh = tmp_path / "baz.xml"
+    fresh.write_text(head + "<FIO>Король Артур</FIO>" + tail.replace("<Group>Ч21Е</Group>", "<Group>Ж99</Group>", 1),
+                     encoding="cp1251")
+    BazImporter().import_competitors(other, fresh, merge=True)
+    session.commit()
+    assert 32 in [c.sid for _, c in utils.filter_competitors("ж99")]
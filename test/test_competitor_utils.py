@@ -0,0 +1,58 @@
+from o_event.models import Base, Card, Competitor, Run, RunSplit, Status
+from o_event.baz_importer import BazImporter
+import app.cli.competitor_utils as competitor_utils
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from pathlib import Path
+
+
+class GroupMoveEditor:
+    def edit_yaml(self, comps):
+        for c in comps:
+            c["group"] = "Ч21А"
+            c["runs"] = [r for r in c["runs"] if r["day"] == 1]
+            for r in c["runs"]:
+                r["status"] = "OK"
+                r["result"] = 1000
+        return comps, True
+
+
+def test_bulk_edit(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    BazImporter().import_competitors(session, Path(__file__).parent / "data" / "baz.xml")
+
+    utils = competitor_utils.CompetitorUtils(session)
+    zls = [c.id for _, c in utils.filter_competitors("ZLS")]
+    assert len(zls) == 24
+    day2_runs = session.query(Run).filter(Run.competitor_id.in_(zls), Run.day != 1).all()
+
+    # Runs already used can't be removed: a result, a split, a card
+    finished, split, read_out = day2_runs[:3]
+    finished.result = 1500
+    session.add(RunSplit(run_id=split.id, course_id=1, seq=1, control_code="31", cum_time=100))
+    session.add(Card(card_number=1, run_id=read_out.id, raw_json={}))
+    session.commit()
+    kept = {finished.id, split.id, read_out.id}
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    monkeypatch.setattr(competitor_utils, "Editor", GroupMoveEditor)
+    utils.bulk_edit("ZLS")
+
+    # One executemany per kind of change
+    assert sum(s.startswith("UPDATE competitors") for s in statements) == 1
+    assert sum(s.startswith("UPDATE runs") for s in statements) == 1
+    assert sum(s.startswith("DELETE FROM runs") for s in statements) == 1
+
+    session.expire_all()
+    for comp in session.query(Competitor).filter(Competitor.id.in_(zls)):
+        assert comp.group == "Ч21А"
+        assert all((r.day, r.status, r.result) == (1, Status.OK, 1000) for r in comp.runs if r.id not in kept)
+    assert session.query(Run).count() == 273 - len(day2_runs) + len(kept)
+    assert {r.id for r in session.query(Run).filter(Run.id.in_(kept))} == kept
+
+    # The search index follows the edit
+    assert {c.id for _, c in utils.filter_competitors("ч21а")} >= set(zls)
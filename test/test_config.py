@@ -0,0 +1,75 @@
+import threading
+
+from o_event.models import Base, Config, ConfigCache
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+
+def test_config_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConfigCache, "CHECK_INTERVAL", 3600)
+    url = f"sqlite:///{tmp_path / 'race.db'}"
+
+    # Two engines stand for two processes sharing the same race.db
+    engine_a = create_engine(url)
+    engine_b = create_engine(url)
+    Base.metadata.create_all(engine_a)
+    db_a = sessionmaker(bind=engine_a)()
+    db_b = sessionmaker(bind=engine_b)()
+
+    statements = []
+    event.listen(engine_b, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    Config.create(db_a, "O-Halloween", "2025-11-15", "John Doe", "Jane Smith", "Kyiv")
+    Config.set(db_a, Config.KEY_CURRENT_DAY, 1)
+    assert Config.get(db_a, Config.KEY_NAME) == "O-Halloween"
+    assert Config.get(db_a, Config.KEY_VERSION) == "2"
+
+    # Reads are served from memory once loaded
+    assert Config.get_current_day(db_b) == 1
+    count = len(statements)
+    for _ in range(10):
+        assert Config.get_current_day(db_b) == 1
+    assert len(statements) == count
+
+    changes = []
+    Config.subscribe(db_b, changes.append)
+
+    # Another process changes the day: seen after the next version check
+    Config.set(db_a, Config.KEY_CURRENT_DAY, 2)
+    assert Config.get_current_day(db_a) == 2
+    assert Config.get_current_day(db_b) == 1
+    monkeypatch.setattr(ConfigCache, "CHECK_INTERVAL", 0)
+    assert Config.get_current_day(db_b) == 2
+    assert changes == [{Config.KEY_CURRENT_DAY: "2", Config.KEY_VERSION: "3"}]
+
+    # Nothing changed: only the version row is queried
+    count = len(statements)
+    assert Config.get(db_b, Config.KEY_PLACE) == "Kyiv"
+    assert len(statements) == count + 1
+    assert Config.KEY_VERSION not in Config.get_all(db_b)
+
+
+def test_concurrent_writers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'race.db'}"
+    Base.metadata.create_all(create_engine(url))
+    sessions = [sessionmaker(bind=create_engine(url))() for _ in range(4)]
+    Config.set(sessions[0], Config.KEY_CURRENT_DAY, 1)
+
+    # Every write gets a version of its own
+    errors = []
+
+    def write(db, n):
+        try:
+            for i in range(n):
+                Config.set(db, Config.KEY_PLACE, f"{id(db)}-{i}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(db, 10)) for db in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sessions[0].query(Config).filter_by(key=Config.KEY_VERSION).one().value == str(1 + 4 * 10)
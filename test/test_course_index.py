@@ -0,0 +1,73 @@
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.course_index import course_index
+from o_event.models import Competitor, Course, CourseControl
+from o_event.querylog import log_queries
+from o_event.synthetic import SyntheticEvent
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from test_all import MockPrinter
+
+
+def load(tmp_path):
+    event = SyntheticEvent(runners=300, days=1, seed=2)
+    files = event.write(tmp_path)
+    session = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+    event.load(session, files)
+    readouts = [PunchReadout.model_validate_json(line)
+                for line in files.readouts[1].read_text(encoding="utf-8").splitlines()]
+    return session, readouts
+
+
+def punches(readout):
+    return [(p.code, p.time - readout.startTime) for p in readout.punches]
+
+
+def test_suggests_own_course(tmp_path):
+    session, readouts = load(tmp_path)
+    index = course_index(session, 1)
+    groups = {c.sid: c.group for c in session.query(Competitor)}
+
+    # Lookups are in memory, an up-to-date index costs one stamp query
+    with log_queries() as log:
+        assert course_index(session, 1) is index
+        for readout in readouts:
+            suggestions = index.suggest(punches(readout))
+            if suggestions and suggestions[0].ok:
+                assert suggestions[0].name == groups[readout.cardNumber]
+    assert log.count == 1
+
+    # Kept up to date
+    session.add(CourseControl(course_id=index.courses[0][0], seq=99, type="Control", control_code="999"))
+    session.commit()
+    assert 999 in course_index(session, 1).postings
+
+
+def test_wrong_course(tmp_path):
+    session, readouts = load(tmp_path)
+    index = course_index(session, 1)
+    groups = {c.sid: c.group for c in session.query(Competitor)}
+    [readout, unknown, *_] = [
+        r for r in readouts
+        if (best := index.suggest(punches(r))[:1]) and best[0].ok and best[0].name == groups[r.cardNumber]
+    ]
+    competitor = session.query(Competitor).filter_by(sid=readout.cardNumber).one()
+    own = competitor.group
+    other = next(c.name for c in session.query(Course) if c.name != own and len(c.controls) > 4)
+
+    # Registered for the wrong group: MP, the receipt points to the course run
+    competitor.group = other
+    session.commit()
+    with MockPrinter() as printer:
+        result = CardProcessor().handle_readout(session, readout, printer)
+    assert result == {"status": "MP", "suggested": own}
+    assert f"схоже на дистанцію: {own}" in printer.get_output()
+
+    # No course at all for the group
+    competitor = session.query(Competitor).filter_by(sid=unknown.cardNumber).one()
+    own = competitor.group
+    competitor.group = "nonexistent"
+    session.commit()
+    assert CardProcessor().handle_readout(session, unknown, MockPrinter()) == {
+        "status": "UNK_COURSE", "sid": unknown.cardNumber, "suggested": own}
@@ -0,0 +1,69 @@
+from o_event.models import Base, Stage, Course, CourseControl, Control
+from o_event.iof_importer import IOFImporter
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from pathlib import Path
+
+
+DATA_PATH = Path(__file__).parent / "data" / "15.xml"
+
+
+def make_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_import():
+    session = make_session()
+    stage = IOFImporter(session).import_stage(DATA_PATH, day=1, stage_name="Спринт")
+
+    assert stage.map.scale == 1000
+    assert len(stage.controls) == 50
+    assert len(stage.courses) == 22
+
+    course = session.query(Course).filter_by(name="Ж10").one()
+    assert course.length == 525
+    codes = [cc.control_code for cc in course.controls]
+    assert codes[:6] == ["S", "70", "55", "72", "58", "71"]
+    assert codes[-1] == "F"
+    assert len(codes) == 19
+
+
+def test_update(tmp_path):
+    session = make_session()
+    importer = IOFImporter(session)
+    stage = importer.import_stage(DATA_PATH, day=1)
+    course_ids = {c.name: c.id for c in stage.courses}
+    loaded = session.get(Course, course_ids["Ж10"])
+
+    # Correct the course Ж10: drop control 72, bump modifyTime
+    text = DATA_PATH.read_text(encoding="utf-8")
+    head, tail = text.split('<Course modifyTime="2025-11-13T01:32:36">', 1)
+    tail = tail.replace(
+        "<CourseControl type=\"Control\">\n\t\t\t\t<Control>72</Control>\n\t\t\t\t<LegLength>86</LegLength>\n\t\t\t</CourseControl>\n\t\t\t",
+        "", 1)
+    corrected = tmp_path / "15.xml"
+    corrected.write_text(head + '<Course modifyTime="2025-11-14T10:00:00">' + tail, encoding="utf-8")
+
+    result = importer.update_stage(stage, corrected)
+    assert result.changed_courses == [course_ids["Ж10"]]
+    assert result.added_courses == []
+    assert result.removed_courses == []
+    assert result.changed_controls == []
+
+    assert session.query(Stage).count() == 1
+    assert session.query(Control).count() == 50
+    course = session.get(Course, course_ids["Ж10"])
+    assert course is loaded
+    assert course.modify_time == "2025-11-14T10:00:00"
+    codes = [cc.control_code for cc in course.controls]
+    assert codes[:5] == ["S", "70", "55", "58", "71"]
+    assert [cc.seq for cc in course.controls] == list(range(18))
+
+    # Re-importing the same file again changes nothing
+    again = importer.import_stage(corrected, day=1, update=True)
+    assert again.id == stage.id
+    assert session.query(Course).count() == 22
+    assert session.query(CourseControl).filter_by(course_id=course.id).count() == 18
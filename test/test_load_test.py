@@ -0,0 +1,80 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from o_event.synthetic import SyntheticEvent
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_test():
+    spec = importlib.util.spec_from_file_location("load_test", ROOT / "load-test.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_percentile():
+    percentile = load_test().percentile
+    values = list(range(1, 21))
+    assert percentile(values, 50) == 10
+    assert percentile(values, 95) == 19
+    assert percentile(values, 99) == 20
+    assert percentile(values, 100) == 20
+    assert percentile([7], 50) == 7
+    assert percentile([], 50) is None
+
+
+def test_refuses_race_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("O_EVENT_DB", "race.db")
+    monkeypatch.setenv("O_EVENT_JOURNAL", "")
+    with pytest.raises(SystemExit):
+        load_test().use_scratch("race.db")
+    with pytest.raises(SystemExit):
+        load_test().use_scratch(tmp_path / "race.db")
+    assert os.environ["O_EVENT_DB"] == "race.db"
+
+
+def test_in_process(tmp_path):
+    event = SyntheticEvent(runners=50, days=1, seed=7)
+    files = event.write(tmp_path / "event")
+    race = tmp_path / "race.db"
+    with sessionmaker(bind=create_engine(f"sqlite:///{race}"))() as session:
+        event.load(session, files)
+    before = race.read_bytes()
+
+    report = tmp_path / "report.json"
+    env = dict(os.environ, PYTHONPATH=str(ROOT / "src"))
+    env.pop("O_EVENT_DB", None)
+    env.pop("O_EVENT_JOURNAL", None)
+    subprocess.run(
+        [sys.executable, ROOT / "load-test.py", "--db", "scratch.db", "--count", "20", "--report", report],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+
+    result = json.loads(report.read_text(encoding="utf-8"))
+    assert result["requests"] == 20
+    assert result["errors"] == 0
+    assert result["outcomes"].get("OK")
+    # The load went to the scratch copy, not to the race
+    assert race.read_bytes() == before
+    assert (tmp_path / "scratch.db").exists()
+    assert not list(tmp_path.glob("*.journal"))
+
+    # Without a scratch database it doesn't start
+    proc = subprocess.run(
+        [sys.executable, ROOT / "load-test.py", "--count", "1", "--report", report],
+        cwd=tmp_path, env=env, capture_output=True, text=True,
+    )
+    assert proc.returncode != 0
+    assert race.read_bytes() == before
@@ -0,0 +1,84 @@
+import asyncio
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from o_event import metrics
+from o_event.metrics import Histogram, count_queries, instrument, span
+
+
+def call(app, path):
+    """Minimal ASGI GET, returns (status, body)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+    status = None
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    asyncio.run(app(scope, receive, send))
+    return status, b"".join(body).decode()
+
+
+def test_histogram():
+    h = Histogram("t_seconds", "test", "stage", (0.1, 1.0))
+    h.observe("a", 0.05)
+    h.observe("a", 0.1)
+    h.observe("a", 0.5)
+    h.observe("a", 7)
+
+    out = h.render()
+    assert 't_seconds_bucket{stage="a",le="0.1"} 2' in out
+    assert 't_seconds_bucket{stage="a",le="1"} 3' in out
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 4' in out
+    assert 't_seconds_count{stage="a"} 4' in out
+    assert 't_seconds_sum{stage="a"} 7.650000' in out
+
+
+def test_span_and_queries():
+    engine = create_engine("sqlite:///:memory:")
+    before = metrics.STAGE_SECONDS.series.get("test_stage", [0, 0])[-2]
+
+    with count_queries() as queries, span("test_stage"):
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("select 1"))
+    assert queries.count == 3
+    assert metrics.STAGE_SECONDS.series["test_stage"][-2] == before + 1
+
+    # Outside of a counting context nothing is counted
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+    assert queries.count == 3
+
+
+def test_metrics_endpoint():
+    engine = create_engine("sqlite:///:memory:")
+    app = instrument(FastAPI())
+
+    @app.get("/ping")
+    def ping():
+        with engine.connect() as conn:
+            conn.execute(text("select 1"))
+            conn.execute(text("select 2"))
+        return {"ok": True}
+
+    assert call(app, "/ping") == (200, '{"ok":true}')
+
+    status, body = call(app, "/metrics")
+    assert status == 200
+    assert 'o_event_request_seconds_count{path="/ping"}' in body
+    assert 'o_event_request_queries_bucket{path="/ping",le="2"} 1' in body
+    assert 'path="/metrics"' not in body
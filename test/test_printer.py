@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+from o_event.printer import Printer, image_to_raster, render_raster
+
+
+def png(width, height):
+    Image = pytest.importorskip("PIL.Image")
+    img = Image.new("L", (width, height))
+    img.putdata([(x * 7 + y * 13) % 256 for y in range(height) for x in range(width)])
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def reference_raster(data, max_width=576):
+    # The original per-pixel conversion from scripts/img2pos.py
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data)).convert("L")
+    w, h = img.size
+    if w > max_width:
+        img = img.resize((max_width, int(h * (max_width / w))), Image.LANCZOS)
+    img = img.convert("1", dither=Image.FLOYDSTEINBERG)
+
+    width, height = img.size
+    bytes_per_row = (width + 7) // 8
+    out = bytearray(b'\x1D\x76\x30\x00')
+    out += bytes([bytes_per_row & 0xFF, bytes_per_row >> 8])
+    out += bytes([height & 0xFF, height >> 8])
+    for y in range(height):
+        for x in range(0, width, 8):
+            byte = 0
+            for b in range(8):
+                if x + b < width and img.getpixel((x + b, y)) == 0:
+                    byte |= 1 << (7 - b)
+            out.append(byte)
+    return bytes(out)
+
+
+@pytest.mark.parametrize("size", [(64, 10), (61, 7), (700, 40)])
+def test_render_raster(size):
+    data = png(*size)
+    assert render_raster(data) == reference_raster(data)
+
+
+def test_logo(tmp_path):
+    data = png(61, 7)
+    assert image_to_raster(data) is image_to_raster(data)
+
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(data)
+
+    class Capture(Printer):
+        def __init__(self):
+            super().__init__()
+            self.buffer = bytearray()
+
+    p = Capture()
+    p.logo(str(logo))
+    p.logo(str(tmp_path / "missing.raw"))
+    assert bytes(p.buffer) == reference_raster(data)
@@ -0,0 +1,41 @@
+import json
+
+from sqlalchemy import create_engine, text
+
+from o_event.metrics import span
+from o_event.profiler import SlowReadoutProfiler
+
+
+def test_capture(tmp_path):
+    engine = create_engine("sqlite:///:memory:")
+    profiler = SlowReadoutProfiler(budget=0, directory=tmp_path, keep=2)
+
+    for card in (1, 2, 3):
+        with profiler.capture(b'{"cardNumber": %d}' % card) as capture:
+            capture.card_number = card
+            with span("lookup"), engine.connect() as conn:
+                conn.execute(text("select :x"), {"x": card})
+        assert capture.path.name.endswith(f"-{card}")
+
+    # Rotated down to the two newest
+    captures = sorted(p.name for p in tmp_path.iterdir())
+    assert len(captures) == 2
+    assert captures[-1] == capture.path.name
+
+    assert (capture.path / "readout.json").read_bytes() == b'{"cardNumber": 3}'
+    assert (capture.path / "profile.pstats").stat().st_size > 0
+    assert "select ?" in (capture.path / "sql.txt").read_text()
+
+    summary = json.loads((capture.path / "summary.json").read_text())
+    assert summary["card_number"] == 3
+    assert summary["statements"] == 1
+    assert [stage for stage, _ in summary["stages_ms"]] == ["lookup"]
+
+
+def test_under_budget_or_disabled(tmp_path):
+    for profiler in (SlowReadoutProfiler(budget=60, directory=tmp_path),
+                     SlowReadoutProfiler(budget=None, directory=tmp_path)):
+        with profiler.capture(b"{}") as capture:
+            pass
+        assert capture.path is None
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from o_event.baz_importer import BazImporter
+from o_event.models import Base, Competitor
+from o_event.querylog import QueryBudgetExceeded, log_queries
+from o_event.ranking import Ranking
+
+
+DATA_PATH = Path(__file__).parent / "data" / "baz.xml"
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    BazImporter().import_competitors(session, DATA_PATH)
+    yield session
+    session.close()
+
+
+def test_detects_lazy_loads(session):
+    competitors = session.query(Competitor).filter(Competitor.group == "Ч21Е").all()
+    assert len(competitors) == 9
+
+    # c.runs is loaded lazily, one query per competitor
+    with log_queries("rank_multiday") as log:
+        Ranking().rank_multiday(2, competitors)
+    assert log.count == 9
+    [(statement, times)] = log.repeated()
+    assert "FROM runs" in statement and times == 9
+    assert "9x" in log.report()
+
+    # ...unless it's eager loaded
+    session.expire_all()
+    with log_queries() as log:
+        competitors = (
+            session.query(Competitor)
+            .options(selectinload(Competitor.runs))
+            .filter(Competitor.group == "Ч21Е")
+            .all()
+        )
+        Ranking().rank_multiday(2, competitors)
+    assert log.count == 2
+    assert log.repeated() == []
+
+
+def test_nested_and_repeated_identical(session):
+    with log_queries("outer") as outer:
+        session.query(Competitor).count()
+        with log_queries("inner") as inner:
+            for _ in range(5):
+                session.query(Competitor).count()
+    assert (outer.count, inner.count) == (6, 5)
+    # Identical parameters: a repeated query, but not a per-row one
+    assert inner.repeated() == []
+
+
+def test_max_queries(session, max_queries):
+    with max_queries(200):
+        [c.club_name for c in session.query(Competitor)]
+
+    with pytest.raises(QueryBudgetExceeded, match=r"budget of 10 exceeded"):
+        with max_queries(10, "club names"):
+            [c.club_name for c in session.query(Competitor)]
+
+
+def test_one_hook_for_all(session):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from o_event.metrics import count_queries
+
+    with count_queries() as counted, log_queries() as log:
+        session.query(Competitor).count()
+        with pytest.raises(OperationalError):
+            session.execute(text("select * from nowhere"))
+        session.rollback()
+        session.query(Competitor).count()
+    assert counted.count == log.count == 3
+    assert counted.statements == []
+    # Durations of the statements, None for the failed one
+    assert [s is None for s in log.seconds] == [False, True, False]
@@ -0,0 +1,54 @@
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.models import Card, Run, RunSplit
+from o_event.replay import JournalReplay
+from o_event.synthetic import SyntheticEvent
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from test_all import MockPrinter
+
+
+def results(session):
+    runs = sorted((r.id, r.status, r.start, r.finish, r.result) for r in session.query(Run))
+    splits = sorted(
+        (s.run_id, s.course_id, s.seq, str(s.control_code), s.leg_time, s.cum_time)
+        for s in session.query(RunSplit)
+    )
+    return runs, splits
+
+
+def test_replay_like_handle_readout(tmp_path):
+    event = SyntheticEvent(runners=200, days=1, seed=5)
+    files = event.write(tmp_path)
+    payloads = files.readouts[1].read_bytes().splitlines()
+
+    sequential = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+    event.load(sequential, files)
+    statuses = {}
+    for payload in payloads:
+        result = CardProcessor().handle_readout(sequential, PunchReadout.model_validate_json(payload), MockPrinter())
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+
+    session = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+    event.load(session, files)
+    stats = JournalReplay(session, 1).run(payloads)
+    session.commit()
+
+    assert results(session) == results(sequential)
+    # Rereads are stored once, by both
+    assert stats.skipped == len(payloads) - stats.processed > 0
+    assert session.query(Card).count() == sequential.query(Card).count() == stats.processed
+    assert stats.statuses["OK"] == statuses["OK"] - stats.skipped
+    assert stats.statuses["MP"] == statuses["MP"]
+
+    # Replaying again only skips, rebuilding gives the same results
+    assert JournalReplay(session, 1).run(payloads).processed == 0
+    expected = results(session)
+    session.query(Run).filter(Run.id == 1).update({"result": 1})
+    session.commit()
+    stats = JournalReplay(session, 1).run(payloads, reset=True)
+    session.commit()
+    assert stats.skipped == len(payloads) - stats.processed
+    assert results(session) == expected
+    assert session.query(Card).count() == stats.processed
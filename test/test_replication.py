@@ -0,0 +1,143 @@
+import asyncio
+import json
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from o_event.batcher import ReadoutBatcher
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.models import Card, Competitor, Run, RunSplit
+from o_event.replay import card_digest
+from o_event.replication import PUSH_PATH, ReplicationClient, replication_router
+from o_event.synthetic import SyntheticEvent
+
+from test_all import MockPrinter
+
+
+def post(app, path, body, headers):
+    """Minimal ASGI POST, returns the JSON response."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+    status = None
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    asyncio.run(app(scope, receive, send))
+    assert status == 200
+    return json.loads(b"".join(chunks))
+
+
+def test_two_laptops(tmp_path):
+    event = SyntheticEvent(runners=100, days=1, seed=11)
+    files = event.write(tmp_path / "event")
+    readouts = [json.loads(line) for line in files.readouts[1].read_text(encoding="utf-8").splitlines()]
+
+    nodes = {}
+    for name in ("a", "b", "central1", "central2"):
+        Session = nodes[name] = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / name}.db"))
+        with Session() as db:
+            event.load(db, files)
+
+    # Each laptop reads out half of the runners, the first runner is read
+    # out on both with different results (e.g. the card wasn't cleared),
+    # and once more on the central node
+    conflict = dict(readouts[0], finishTime=readouts[0]["finishTime"] + 60)
+    local = dict(readouts[0], finishTime=readouts[0]["finishTime"] + 120)
+    for name, share in (("a", readouts[::2]), ("b", readouts[1::2] + [conflict])):
+        with nodes[name]() as db:
+            for readout in share:
+                CardProcessor().handle_readout(db, PunchReadout.model_validate(readout), MockPrinter())
+
+    def results(name):
+        with nodes[name]() as db:
+            return (
+                sorted((r.id, r.status, r.result) for r in db.query(Run)),
+                sorted((s.run_id, s.seq, s.cum_time) for s in db.query(RunSplit)),
+                db.query(Card).count(),
+            )
+
+    def clients(central, batcher):
+        app = FastAPI()
+        app.include_router(replication_router(batcher))
+        return {
+            name: ReplicationClient(nodes[name], f"http://{central}", node=name, batch_size=16,
+                                    send=lambda body, headers: post(app, PUSH_PATH, body, headers))
+            for name in "ab"
+        }
+
+    # A card assigned by hand on a laptop after it was pushed
+    with nodes["a"]() as db:
+        card = db.query(Card).filter(Card.card_number == readouts[2]["cardNumber"]).first()
+        competitor = (
+            db.query(Competitor).join(Run)
+            .filter(Run.id.not_in(db.query(Card.run_id).filter(Card.run_id.is_not(None))))
+            .first()
+        )
+        manual = (card.raw_json, competitor.sid)
+
+    for central, order in (("central1", "ab"), ("central2", "ba")):
+        batcher = ReadoutBatcher(nodes[central], tmp_path / f"{central}.journal", interval=0.01,
+                                 printer_factory=MockPrinter, lowest_digest_wins=False)
+        batcher.start()
+        pushers = clients(central, batcher)
+        for name in order:
+            assert pushers[name].push() > 0
+            assert pushers[name].push() == 0
+        # The central node's own readout is a DUP for the secretary
+        result, _ = batcher.submit(json.dumps(local).encode("utf-8")).result(timeout=60)
+        assert result["status"] == "DUP"
+        batcher.stop()
+
+    with nodes["a"]() as db:
+        card = db.query(Card).filter(Card.raw_json == manual[0]).one()
+        run = db.query(Run).join(Competitor).filter(Competitor.sid == manual[1]).one()
+        CardProcessor().handle_card(db, card, run, MockPrinter())
+    for central in ("central1", "central2"):
+        batcher = ReadoutBatcher(nodes[central], tmp_path / f"{central}.journal", printer_factory=MockPrinter,
+                                 lowest_digest_wins=False)
+        batcher.start()
+        pushers = clients(central, batcher)
+        assert pushers["a"].push() == 1
+        assert pushers["a"].push() == 0
+        batcher.stop()
+
+    # Same results whatever the order, every distinct readout is there once
+    assert results("central1") == results("central2")
+    digests = {card_digest(PunchReadout.model_validate(local).model_dump())}
+    for name in "ab":
+        with nodes[name]() as db:
+            digests |= {card_digest(c.raw_json) for c in db.query(Card)}
+    assert results("central1")[2] == len(digests)
+
+    with nodes["central1"]() as db:
+        # The conflicting replicated readout with the lowest digest takes the run
+        winner = min(
+            (PunchReadout.model_validate(r).model_dump() for r in (readouts[0], conflict)),
+            key=card_digest,
+        )
+        run = (
+            db.query(Run).join(Competitor)
+            .filter(Competitor.sid == conflict["cardNumber"], Run.day == 1)
+            .one()
+        )
+        assert run.result == winner["finishTime"] - winner["startTime"]
+        assert [c.raw_json for c in db.query(Card).filter(Card.run_id == run.id)] == [winner]
+
+        # The assignment by hand was replicated
+        card = db.query(Card).filter(Card.raw_json == manual[0]).one()
+        assert card.run_id == db.query(Run).join(Competitor).filter(Competitor.sid == manual[1]).one().id
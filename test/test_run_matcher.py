@@ -0,0 +1,73 @@
+from app.cli.card_utils import CardUtils
+from app.cli.competitor_utils import CompetitorUtils
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.models import Card, Competitor, Run
+from o_event.synthetic import SyntheticEvent
+
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from test_all import MockPrinter
+
+
+def test_unknown_cards(tmp_path):
+    event = SyntheticEvent(runners=300, days=1, seed=5)
+    files = event.write(tmp_path)
+    session = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+    event.load(session, files)
+    readouts = [PunchReadout.model_validate_json(line)
+                for line in files.readouts[1].read_text(encoding="utf-8").splitlines()]
+
+    # Start slots as in the start protocol: a minute each from 10:00
+    runs = {sid: run for sid, run in session.query(Competitor.sid, Run).join(Run)}
+    for readout in readouts:
+        runs[readout.cardNumber].start_slot = (readout.startTime - 36000) // 60
+    session.commit()
+
+    # Every tenth finisher runs with a rented card nobody registered
+    rented = {}   # card number -> owner's sid
+    seen = set()
+    for i, readout in enumerate(readouts):
+        if readout.cardNumber in seen:
+            continue    # read out again
+        seen.add(readout.cardNumber)
+        if i % 10 == 0 and readout.finishTime != 0xeeee:
+            rented[9000 + i] = readout.cardNumber
+            readout = readout.model_copy(update={"cardNumber": 9000 + i})
+        CardProcessor().handle_readout(session, readout, MockPrinter())
+
+    utils = CardUtils(session)
+    ranks = []
+    for card_number, sid in rented.items():
+        card = session.query(Card).filter_by(card_number=card_number).one()
+        assert card.run_id is None
+        suggested = [s.run_id for s in utils.suggest_runs(card)]
+        ranks.append(suggested.index(runs[sid].id) if runs[sid].id in suggested else None)
+    assert None not in ranks
+    assert ranks.count(0) >= 0.8 * len(ranks)
+
+    # Suggested runs go first in the picker, assigned runs drop out
+    [best, *_] = utils.suggest_runs(card)
+    lines = list(utils.run_lines(utils.suggest_runs(card)))
+    assert lines[0].split()[0] == str(best.run_id) and "%" in lines[0]
+    assert len(lines) == len(runs)
+    CardProcessor().handle_card(session, card, session.get(Run, best.run_id), MockPrinter())
+    assert best.run_id not in [s.run_id for s in utils.suggest_runs(card)]
+
+    # Start slots and groups edited in the CLI are picked up
+    card_number, sid = next((n, sid) for n, sid in rented.items()
+                            if session.query(Card).filter_by(card_number=n).one().run_id is None)
+    card = session.query(Card).filter_by(card_number=card_number).one()
+    run_id = runs[sid].id
+    before = next(s for s in utils.suggest_runs(card) if s.run_id == run_id)
+    session.execute(update(Run), [{"id": run_id, "start_slot": runs[sid].start_slot + 2}])
+    session.commit()
+    moved = next(s for s in utils.suggest_runs(card) if s.run_id == run_id)
+    assert moved.start_delta == before.start_delta - 120
+
+    competitors = CompetitorUtils(session)
+    edited = competitors.competitor_to_dict(session.query(Competitor).filter_by(sid=sid).one())
+    competitors.update_competitor_from_dict(dict(edited, group="Ж99"))
+    session.commit()
+    utils.suggest_runs(card)
+    assert utils.matcher.courses[run_id] == "Ж99"
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from o_event.baz_importer import BazImporter
+from o_event.db import snapshot
+from o_event.models import Base, Competitor
+
+
+DATA_PATH = Path(__file__).parent / "data" / "baz.xml"
+
+
+def test_snapshot(tmp_path):
+    path = tmp_path / "race.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 0.1})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as live:
+        BazImporter().import_competitors(live, DATA_PATH)
+        count = live.query(Competitor).count()
+
+    with snapshot(str(path)) as db:
+        assert db.query(Competitor).count() == count
+        # A read in progress on the snapshot doesn't hold up live writes
+        competitors = db.query(Competitor).yield_per(10)
+        next(iter(competitors))
+        with Session() as live:
+            live.query(Competitor).delete()
+            live.commit()
+        assert db.query(Competitor).count() == count
+
+    with snapshot(str(path)) as db:
+        assert db.query(Competitor).count() == 0
@@ -0,0 +1,50 @@
+import json
+
+from o_event.card_processor import CardProcessor, PunchReadout
+from o_event.models import Competitor, Course, Run, Stage
+from o_event.synthetic import SyntheticEvent
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from test_all import MockPrinter
+
+
+def test_deterministic(tmp_path):
+    a = SyntheticEvent(runners=200, days=2, seed=7).write(tmp_path / "a")
+    SyntheticEvent(runners=200, days=2, seed=7).write(tmp_path / "b")
+    c = SyntheticEvent(runners=200, days=2, seed=8).write(tmp_path / "c")
+
+    for name in ("courses-1.xml", "courses-2.xml", "entries.xml", "readouts-1.jsonl", "readouts-2.jsonl"):
+        assert (tmp_path / "a" / name).read_bytes() == (tmp_path / "b" / name).read_bytes()
+    assert a.entries.read_bytes() != c.entries.read_bytes()
+
+
+def test_import_and_readouts(tmp_path):
+    event = SyntheticEvent(runners=300, days=2, seed=1)
+    files = event.write(tmp_path)
+
+    session = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+    event.load(session, files)
+
+    assert session.query(Stage).count() == 2
+    assert session.query(Course).count() == 2 * len(SyntheticEvent.GROUPS)
+    assert session.query(Competitor).count() == 300
+
+    # Every entry has a course for its group
+    groups = {c.name for c in session.query(Course)}
+    assert {c.group for c in session.query(Competitor)} <= groups
+
+    lines = files.readouts[1].read_text(encoding="utf-8").splitlines()
+    runs = session.query(Run).filter(Run.day == 1).count()
+    assert len({json.loads(line)["cardNumber"] for line in lines}) < runs   # some DNS
+
+    statuses = {}
+    for line in lines:
+        readout = PunchReadout.model_validate_json(line)
+        result = CardProcessor().handle_readout(session, readout, MockPrinter())
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+
+    assert statuses["OK"] > 0.8 * len(lines)
+    assert statuses.get("MP", 0) > 0
+    assert statuses.get("NO_FINISH", 0) > 0